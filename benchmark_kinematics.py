@@ -0,0 +1,183 @@
+"""Throughput and accuracy benchmark for kinematics_ur5.py.
+
+Measures forward and inverse kinematics throughput for batch sizes from 1 up to 1e6 together with the peak
+memory of one call, and the FK -> IK -> FK round trip error over random and near singular configurations.
+The results are written as JSON and can be compared against a stored baseline, failing on regressions:
+    python benchmark_kinematics.py --output results.json
+    python benchmark_kinematics.py --baseline results.json
+"""
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import kinematics_ur5 as kinematics
+
+PERCENTILES = (50, 90, 99, 100)
+
+
+def _best_time(function, min_time: float) -> float:
+    """Returns the fastest of repeated calls of function, repeating until min_time seconds have passed"""
+    best = float("inf")
+    start = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - t0)
+        if time.perf_counter() - start >= min_time:
+            return best
+
+
+def _peak_memory(function) -> int:
+    """Returns the peak number of bytes allocated during one call of function"""
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_throughput(batch_sizes, min_time: float = 0.2, seed: int = 0) -> dict:
+    """Returns poses per second and peak memory for every kinematics function and batch size"""
+    rng = np.random.default_rng(seed)
+    results = {}
+    for batch in batch_sizes:
+        joints = rng.uniform(-np.pi, np.pi, (batch, 6))
+        poses = kinematics.forward_kinematics(joints)
+        initial = joints + rng.normal(0, 0.05, joints.shape)
+        cases = {
+            "forward_kinematics[generic]": lambda: kinematics.forward_kinematics(joints),
+            "forward_kinematics[generated]": lambda: kinematics.forward_kinematics(joints, backend="generated"),
+            "jacobian[generic]": lambda: kinematics.jacobian(joints),
+            "jacobian[generated]": lambda: kinematics.jacobian(joints, backend="generated"),
+            "inverse_kinematics": lambda: kinematics.inverse_kinematics(poses),
+            "numerical_inverse_kinematics": lambda: kinematics.numerical_inverse_kinematics(poses, initial),
+        }
+        for name, function in cases.items():
+            seconds = _best_time(function, min_time)
+            results.setdefault(name, {})[str(batch)] = {
+                "poses_per_second": batch / seconds,
+                "peak_memory_bytes": _peak_memory(function),
+            }
+    return results
+
+
+def _distribution(errors: np.ndarray) -> dict:
+    if errors.size == 0:
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": float(np.percentile(errors, p)) for p in PERCENTILES}
+
+
+def _round_trip(joints: np.ndarray, rng) -> dict:
+    """Returns the FK -> IK -> FK error distributions of the closed form and the numerical solver"""
+    poses = kinematics.forward_kinematics(joints)
+
+    solutions, valid = kinematics.inverse_kinematics(poses)
+    error = kinematics.pose_error(poses[:, None], kinematics.forward_kinematics(np.nan_to_num(solutions)))[valid]
+    closed_form = {
+        "solved_fraction": float(np.mean(np.any(valid, axis=1))),
+        "position_error_mm": _distribution(np.linalg.norm(error[:, :3], axis=-1)),
+        "rotation_error_rad": _distribution(np.linalg.norm(error[:, 3:], axis=-1)),
+    }
+
+    solved, converged = kinematics.numerical_inverse_kinematics(poses, joints + rng.normal(0, 0.05, joints.shape))
+    error = kinematics.pose_error(poses, kinematics.forward_kinematics(solved))[converged]
+    numerical = {
+        "solved_fraction": float(np.mean(converged)),
+        "position_error_mm": _distribution(np.linalg.norm(error[:, :3], axis=-1)),
+        "rotation_error_rad": _distribution(np.linalg.norm(error[:, 3:], axis=-1)),
+    }
+    return {"closed_form": closed_form, "numerical": numerical}
+
+
+def benchmark_accuracy(samples: int = 10000, seed: int = 0) -> dict:
+    """Returns round trip error distributions for random and near singular joint sets"""
+    rng = np.random.default_rng(seed)
+    random_joints = rng.uniform(-np.pi, np.pi, (samples, 6))
+
+    wrist = random_joints.copy()  # theta 5 close to zero aligns the axes of joint 4 and 6
+    wrist[:, 4] = rng.normal(0, 1e-6, samples)
+    elbow = random_joints.copy()  # theta 3 close to zero stretches the arm out
+    elbow[:, 2] = rng.normal(0, 1e-6, samples)
+
+    return {
+        "random": _round_trip(random_joints, rng),
+        "near_wrist_singularity": _round_trip(wrist, rng),
+        "near_elbow_singularity": _round_trip(elbow, rng),
+    }
+
+
+def compare(results: dict, baseline: dict, throughput_tolerance: float = 0.3, error_factor: float = 10.0,
+            error_floor: float = 1e-6, fraction_tolerance: float = 0.01, path: str = "") -> list[str]:
+    """Returns a description of every metric in results that regressed compared to baseline.
+
+    Args:
+        results (dict): Output of a benchmark run.
+        baseline (dict): Stored output of an earlier run.
+        throughput_tolerance (float, optional): Allowed relative drop of poses per second. Defaults to 0.3.
+        error_factor (float, optional): Allowed growth factor of round trip errors. Defaults to 10.
+        error_floor (float, optional): Errors below this are never a regression. Defaults to 1e-6.
+        fraction_tolerance (float, optional): Allowed drop of the solved fraction. Defaults to 0.01.
+    """
+
+    regressions = []
+    for key, expected in baseline.items():
+        name = f"{path}/{key}"
+        if key == "config":
+            continue
+        if key not in results:
+            regressions.append(f"{name}: missing")
+            continue
+        actual = results[key]
+        if isinstance(expected, dict):
+            regressions += compare(actual, expected, throughput_tolerance, error_factor, error_floor, fraction_tolerance, name)
+        elif expected is None or actual is None or key == "peak_memory_bytes":
+            continue
+        elif key == "poses_per_second" and actual < expected * (1 - throughput_tolerance):
+            regressions.append(f"{name}: {actual:.0f} < {expected:.0f}")
+        elif key == "solved_fraction" and actual < expected - fraction_tolerance:
+            regressions.append(f"{name}: {actual:.4f} < {expected:.4f}")
+        elif key.startswith("p") and actual > max(expected * error_factor, error_floor):
+            regressions.append(f"{name}: {actual:.3g} > {expected:.3g}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark throughput and accuracy of kinematics_ur5.py.")
+    parser.add_argument("--max-batch", type=int, default=1_000_000, help="largest batch size, powers of ten from 1")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds to repeat each measurement for")
+    parser.add_argument("--samples", type=int, default=10000, help="joint sets per accuracy case")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against this JSON file and exit with 1 on regressions")
+    parser.add_argument("--throughput-tolerance", type=float, default=0.3, help="allowed relative throughput drop")
+    args = parser.parse_args()
+
+    batch_sizes = [10**i for i in range(7) if 10**i <= args.max_batch]
+    results = {
+        "config": {"batch_sizes": batch_sizes, "samples": args.samples, "numpy": np.__version__},
+        "throughput": benchmark_throughput(batch_sizes, args.min_time),
+        "accuracy": benchmark_accuracy(args.samples),
+    }
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.throughput_tolerance)
+        for regression in regressions:
+            print("REGRESSION", regression, file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
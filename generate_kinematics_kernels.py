@@ -0,0 +1,115 @@
+"""Writes kinematics_ur5_kernels.py, closed form forward kinematics and jacobian kernels for the UR5.
+
+The MDH chain from kinematics_ur5.py is multiplied out symbolically, the known zeros and ones are
+removed and the remaining expressions share their sines, cosines and common subexpressions.
+Run it again whenever UR5_MDH changes. sympy is only needed here, not to use the generated kernels:
+    python generate_kinematics_kernels.py
+"""
+import math
+
+import sympy as sp
+
+from kinematics_ur5 import UR5_MDH
+
+OUTPUT = "kinematics_ur5_kernels.py"
+
+
+def _exact(value: float) -> sp.Expr:
+    """Returns the parameter as an exact sympy number, so that e.g. cos(pi / 2) becomes exactly 0"""
+    for k in range(-4, 5):
+        if math.isclose(value, k * math.pi / 4, abs_tol=1e-12):
+            return k * sp.pi / 4
+    return sp.Rational(repr(float(value)))
+
+
+def _T_mdh(alpha, a, d, theta) -> sp.Matrix:
+    c = sp.cos
+    s = sp.sin
+    return sp.Matrix([
+        [c(theta), -s(theta), 0, a],
+        [s(theta) * c(alpha), c(theta) * c(alpha), -s(alpha), -s(alpha) * d],
+        [s(theta) * s(alpha), c(theta) * s(alpha), c(alpha), c(alpha) * d],
+        [0, 0, 0, 1],
+    ])
+
+
+def symbolic_chain(q):
+    """Returns the simplified base to joint frame poses T_01 ... T_06 as sympy matrices"""
+    frames = []
+    T = sp.eye(4)
+    for i in range(UR5_MDH.joints):
+        T = T * _T_mdh(_exact(UR5_MDH.alpha[i]), _exact(UR5_MDH.a[i]), _exact(UR5_MDH.d[i]), q[i])
+        T = T.applyfunc(lambda e: sp.trigsimp(sp.expand(e)))
+        frames.append(T)
+    return frames
+
+
+def _trig_name(function, argument, q) -> str:
+    """Names sin(q2 + q3) as s23, cos(q1) as c1 and so on"""
+    indices = "".join(str(q.index(term) + 1) for term in sp.Add.make_args(argument))
+    return ("s" if function == sp.sin else "c") + indices
+
+
+def _emit_kernel(name: str, docstring: str, shape: tuple, entries: dict, q) -> list[str]:
+    """Returns the source lines of one kernel that fills an array with the given nonzero entries"""
+    expressions = list(entries.values())
+    trig = sorted(set().union(*(e.atoms(sp.sin, sp.cos) for e in expressions)), key=lambda t: _trig_name(t.func, t.args[0], q))
+    trig_symbols = {t: sp.Symbol(_trig_name(t.func, t.args[0], q)) for t in trig}
+    expressions = [e.xreplace(trig_symbols) for e in expressions]
+    shared, reduced = sp.cse(expressions, symbols=sp.numbered_symbols("x"), optimizations="basic")
+
+    def code(e):
+        return sp.pycode(e.xreplace({r: sp.Float(r, 17) for r in e.atoms(sp.Rational) if not r.is_Integer}))
+
+    lines = [f"def {name}(q):", f'    """{docstring}"""', "    q = np.asarray(q, dtype=float)"]
+    for i, symbol in enumerate(q):
+        lines.append(f"    {symbol} = q[..., {i}]")
+    for t in trig:
+        argument = " + ".join(str(term) for term in sp.Add.make_args(t.args[0]))
+        lines.append(f"    {trig_symbols[t]} = np.{t.func.__name__}({argument})")
+    for symbol, e in shared:
+        lines.append(f"    {symbol} = {code(e)}")
+    lines.append(f"    out = np.zeros(q.shape[:-1] + {shape})")
+    for index, e in zip(entries, reduced):
+        lines.append(f"    out[..., {index[0]}, {index[1]}] = {code(e)}")
+    lines.append("    return out")
+    return lines
+
+
+def generate() -> str:
+    """Returns the source of the kernel module"""
+    q = list(sp.symbols("q1:7"))
+    frames = symbolic_chain(q)
+    T_06 = frames[-1]
+
+    pose = {(i, j): T_06[i, j] for i in range(3) for j in range(4) if T_06[i, j] != 0}
+    pose[(3, 3)] = sp.Integer(1)
+
+    # linear part by differentiating the position, angular part from the z axis of every frame
+    J = {}
+    for j in range(UR5_MDH.joints):
+        for i in range(3):
+            J[(i, j)] = sp.trigsimp(sp.diff(T_06[i, 3], q[j]))
+            J[(i + 3, j)] = frames[j][i, 2]
+    J = {index: e for index, e in J.items() if e != 0}
+
+    lines = [
+        "# Generated by generate_kinematics_kernels.py from UR5_MDH in kinematics_ur5.py, do not edit by hand.",
+        "import numpy as np",
+        "",
+        f"MDH_ALPHA = {tuple(float(x) for x in UR5_MDH.alpha)}",
+        f"MDH_A = {tuple(float(x) for x in UR5_MDH.a)}",
+        f"MDH_D = {tuple(float(x) for x in UR5_MDH.d)}",
+        "",
+        "",
+    ]
+    lines += _emit_kernel("forward_kinematics", "Returns the base to flange pose T_06, shape (..., 4, 4)", (4, 4), pose, q)
+    lines += ["", ""]
+    lines += _emit_kernel("jacobian", "Returns the geometric jacobian of the flange in the base frame, shape (..., 6, 6)", (6, 6), J, q)
+    return "\n".join(lines) + "\n"
+
+
+if __name__ == "__main__":
+    with open(OUTPUT, "w") as f:
+        f.write(generate())
+    print(f"wrote {OUTPUT}")
@@ -1,6 +1,58 @@
+from dataclasses import dataclass
+import math
+
 import numpy as np
 from numpy.linalg import inv
-import math
+
+import kinematics_ur5_kernels
+
+
+@dataclass(frozen=True)
+class MDHTable:
+    """Modified denavit-hartenberg parameters, one entry per joint (angles in radiants, lengths in mm)"""
+    alpha: np.ndarray
+    a: np.ndarray
+    d: np.ndarray
+
+    def __post_init__(self):
+        for name in ("alpha", "a", "d"):
+            column = np.array(getattr(self, name), dtype=float)
+            column.setflags(write=False)
+            object.__setattr__(self, name, column)
+        if not (self.alpha.shape == self.a.shape == self.d.shape) or self.alpha.ndim != 1:
+            raise ValueError("alpha, a and d must be 1-D and have one entry per joint")
+
+    @property
+    def joints(self) -> int:
+        """Returns the number of joints in the chain"""
+        return self.alpha.shape[0]
+
+
+UR5_MDH = MDHTable(
+    alpha=(0, math.pi / 2, 0, 0, math.pi / 2, -math.pi / 2),
+    a=(0, 0, -425, -392.25, 0, 0),
+    d=(89.159, 0, 0, 109.15, 94.65, 82.3),
+)
+
+UR5_JOINT_LIMITS = np.full(6, 2 * math.pi)  # every UR5 joint can turn +-360 degrees
+
+
+@dataclass(frozen=True)
+class MotionLimits:
+    """Speed and acceleration limits of the robot, joint limits in radiants and linear limits in mm"""
+    joint_speed: float
+    joint_acceleration: float
+    linear_speed: float
+    linear_acceleration: float
+
+
+# the limits Initialize_robot sets in services/order_service.py
+ORDER_SERVICE_LIMITS = MotionLimits(
+    joint_speed=math.radians(180),
+    joint_acceleration=math.radians(600),
+    linear_speed=1300,
+    linear_acceleration=2000,
+)
 
 
 def T_mdh(alpha: float, a: float, d: float, theta: float) -> np.ndarray:
@@ -15,6 +67,441 @@ def T_mdh(alpha: float, a: float, d: float, theta: float) -> np.ndarray:
     ])
 
 
+def T_mdh_batch(alpha, a, d, theta) -> np.ndarray:
+    """Returns transformation matrices for modified denavit-hartenberg, shape (..., 4, 4).
+    Vectorized version of T_mdh, the arguments are broadcast against each other"""
+    alpha, a, d, theta = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (alpha, a, d, theta)))
+    ct = np.cos(theta)
+    st = np.sin(theta)
+    ca = np.cos(alpha)
+    sa = np.sin(alpha)
+
+    T = np.zeros(theta.shape + (4, 4))
+    T[..., 0, 0] = ct
+    T[..., 0, 1] = -st
+    T[..., 0, 3] = a
+    T[..., 1, 0] = st * ca
+    T[..., 1, 1] = ct * ca
+    T[..., 1, 2] = -sa
+    T[..., 1, 3] = -sa * d
+    T[..., 2, 0] = st * sa
+    T[..., 2, 1] = ct * sa
+    T[..., 2, 2] = ca
+    T[..., 2, 3] = ca * d
+    T[..., 3, 3] = 1
+    return T
+
+
+def invert_transform(T: np.ndarray) -> np.ndarray:
+    """Returns the inverse of homogeneous transformation matrices, shape (..., 4, 4)"""
+    R_t = np.swapaxes(T[..., :3, :3], -1, -2)
+    T_inv = np.zeros_like(T)
+    T_inv[..., :3, :3] = R_t
+    T_inv[..., :3, 3] = -(R_t @ T[..., :3, 3:])[..., 0]
+    T_inv[..., 3, 3] = 1
+    return T_inv
+
+
+def joint_transforms(joints: np.ndarray, mdh: MDHTable = UR5_MDH) -> np.ndarray:
+    """Returns the modified denavit-hartenberg matrix of every joint, shape (..., joints, 4, 4)"""
+    theta = np.asarray(joints, dtype=float)
+    if theta.shape[-1:] != (mdh.joints,):
+        raise ValueError(f"joints must have shape (..., {mdh.joints}), got {theta.shape}")
+    return T_mdh_batch(mdh.alpha, mdh.a, mdh.d, theta)
+
+
+def _generated_kernels(mdh: MDHTable):
+    """Returns the generated kernel module, after checking that it was generated from the same parameters"""
+    if not (np.array_equal(mdh.alpha, kinematics_ur5_kernels.MDH_ALPHA)
+            and np.array_equal(mdh.a, kinematics_ur5_kernels.MDH_A)
+            and np.array_equal(mdh.d, kinematics_ur5_kernels.MDH_D)):
+        raise ValueError("the generated kernels only cover the table they were generated from, "
+                         "run generate_kinematics_kernels.py or use backend='generic'")
+    return kinematics_ur5_kernels
+
+
+def forward_kinematics(joints: np.ndarray, mdh: MDHTable = UR5_MDH, tool: np.ndarray = None,
+                       backend: str = "generic") -> np.ndarray:
+    """Returns the base to flange pose T_06 for an (N, 6) array of joint angles as an (N, 4, 4) array.
+    A single configuration of shape (6,) gives a single (4, 4) pose. If a flange to tool transform is given,
+    the pose of the tool is returned instead. backend 'generic' multiplies the joint matrices, 'generated'
+    uses the closed form kernels from generate_kinematics_kernels.py"""
+    if backend == "generated":
+        T_0n = _generated_kernels(mdh).forward_kinematics(joints)
+    elif backend == "generic":
+        T = joint_transforms(joints, mdh)
+        T_0n = T[..., 0, :, :]
+        for i in range(1, mdh.joints):
+            T_0n = T_0n @ T[..., i, :, :]
+    else:
+        raise ValueError(f"unknown backend {backend!r}, use 'generic' or 'generated'")
+    if tool is not None:
+        T_0n = T_0n @ tool
+    return T_0n
+
+
+def forward_kinematics_frames(joints: np.ndarray, mdh: MDHTable = UR5_MDH, tool: np.ndarray = None) -> np.ndarray:
+    """Returns the base to joint frame poses T_01 ... T_06 followed by the end effector pose, shape (..., 7, 4, 4).
+    The end effector is the flange, or the tool if a flange to tool transform is given"""
+    T = joint_transforms(joints, mdh)
+    frames = np.empty(T.shape[:-3] + (mdh.joints + 1, 4, 4))
+    frames[..., 0, :, :] = T[..., 0, :, :]
+    for i in range(1, mdh.joints):
+        frames[..., i, :, :] = frames[..., i - 1, :, :] @ T[..., i, :, :]
+    frames[..., -1, :, :] = frames[..., -2, :, :] if tool is None else frames[..., -2, :, :] @ tool
+    return frames
+
+
+def _jacobian_from_frames(frames: np.ndarray) -> np.ndarray:
+    """Returns the geometric jacobian from the output of forward_kinematics_frames, shape (..., 6, joints)"""
+    z = frames[..., :-1, :3, 2]
+    p = frames[..., :-1, :3, 3]
+    p_end = frames[..., -1:, :3, 3]
+    return np.concatenate([np.swapaxes(np.cross(z, p_end - p), -1, -2), np.swapaxes(z, -1, -2)], axis=-2)
+
+
+def jacobian(joints: np.ndarray, mdh: MDHTable = UR5_MDH, tool: np.ndarray = None, backend: str = "generic") -> np.ndarray:
+    """Returns the geometric jacobian in the base frame, shape (..., 6, 6).
+    Rows are the linear velocity (mm/rad) followed by the angular velocity of the end effector, columns are the joints.
+    With modified denavit-hartenberg, joint i turns about the z axis of frame i. backend works as in forward_kinematics"""
+    if backend == "generic":
+        return _jacobian_from_frames(forward_kinematics_frames(joints, mdh, tool))
+    if backend != "generated":
+        raise ValueError(f"unknown backend {backend!r}, use 'generic' or 'generated'")
+    kernels = _generated_kernels(mdh)
+    J = kernels.jacobian(joints)
+    if tool is not None:
+        # the tool point moves with the flange velocity plus omega x (tool offset in the base frame)
+        offset = kernels.forward_kinematics(joints)[..., :3, :3] @ np.asarray(tool, dtype=float)[:3, 3]
+        J[..., :3, :] += np.swapaxes(np.cross(np.swapaxes(J[..., 3:, :], -1, -2), offset[..., None, :]), -1, -2)
+    return J
+
+
+def manipulability(J: np.ndarray) -> np.ndarray:
+    """Returns the yoshikawa manipulability sqrt(det(J J^T)) of jacobians with shape (..., rows, joints)"""
+    return np.sqrt(np.abs(np.linalg.det(J @ np.swapaxes(J, -1, -2))))
+
+
+def wrap_angle(theta: np.ndarray) -> np.ndarray:
+    """Wraps angles in radiants to the interval [-pi, pi)"""
+    return (np.asarray(theta) + np.pi) % (2 * np.pi) - np.pi
+
+
+def _clipped_arccos(x: np.ndarray, tolerance: float) -> tuple[np.ndarray, np.ndarray]:
+    """Returns arccos(x) and a mask of where x is inside [-1, 1] up to the tolerance.
+    Values outside of the domain give nan instead of a warning"""
+    inside = np.abs(x) <= 1 + tolerance
+    return np.where(inside, np.arccos(np.clip(x, -1, 1)), np.nan), inside
+
+
+def inverse_kinematics(poses: np.ndarray, mdh: MDHTable = UR5_MDH,
+                       tolerance: float = 1e-9, singular_theta6: float = 0.0) -> tuple[np.ndarray, np.ndarray]:
+    """Closed form inverse kinematics for the UR5, returns all 8 solutions for every pose.
+
+    Args:
+        poses (np.ndarray): Base to flange poses T_06, shape (N, 4, 4) or (4, 4).
+        mdh (MDHTable, optional): Parameters of the chain. Defaults to UR5_MDH.
+        tolerance (float, optional): How far outside [-1, 1] an arccos argument may be from rounding before the branch is unreachable.
+        singular_theta6 (float, optional): Value used for theta 6 when sin(theta 5) is zero and theta 6 is free.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Joint angles in [-pi, pi) with shape (N, 8, 6) and a validity mask with shape (N, 8).
+        Solution k uses the shoulder, wrist and elbow branches given by bits 2, 1 and 0 of k. Invalid solutions are nan.
+    """
+    T_06 = np.asarray(poses, dtype=float)
+    if T_06.shape[-2:] != (4, 4):
+        raise ValueError(f"poses must have shape (..., 4, 4), got {T_06.shape}")
+    batch = T_06.shape[:-2]
+    T_06 = T_06.reshape((-1, 4, 4))
+    alpha, a, d = mdh.alpha, mdh.a, mdh.d
+    signs = np.array([1.0, -1.0])
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # theta 1 from the position of frame 5, two shoulder branches, shape (N, 2)
+        P_06 = T_06[:, :3, 3]
+        P_05 = P_06 - d[5] * T_06[:, :3, 2]
+        phi1 = np.arctan2(P_05[:, 1], P_05[:, 0])
+        phi2, valid1 = _clipped_arccos(d[3] / np.hypot(P_05[:, 0], P_05[:, 1]), tolerance)
+        theta1 = phi1[:, None] + signs * phi2[:, None] + np.pi / 2
+
+        # theta 5, two wrist branches, shape (N, 2, 2)
+        s1 = np.sin(theta1)
+        c1 = np.cos(theta1)
+        c5 = (P_06[:, None, 0] * s1 - P_06[:, None, 1] * c1 - d[3]) / d[5]
+        theta5, valid5 = _clipped_arccos(c5, tolerance)
+        theta5 = theta5[..., None] * signs
+        valid5 = np.broadcast_to(valid5[..., None], theta5.shape)
+        theta1 = np.broadcast_to(theta1[..., None], theta5.shape)
+
+        # theta 6 from the inverse pose T_60, free when sin(theta 5) is zero
+        s1 = np.sin(theta1)
+        c1 = np.cos(theta1)
+        s5 = np.sin(theta5)
+        R = T_06[:, None, None, :3, :3]
+        sign5 = np.sign(s5)
+        theta6 = np.arctan2(sign5 * (-R[..., 0, 1] * s1 + R[..., 1, 1] * c1),
+                            sign5 * (R[..., 0, 0] * s1 - R[..., 1, 0] * c1))
+        theta6 = np.where(np.abs(s5) < 1e-10, singular_theta6, theta6)
+
+        # theta 3 from the position of frame 4 in frame 1, two elbow branches, shape (N, 2, 2, 2)
+        T_01 = T_mdh_batch(alpha[0], a[0], d[0], theta1)
+        T_45 = T_mdh_batch(alpha[4], a[4], d[4], theta5)
+        T_56 = T_mdh_batch(alpha[5], a[5], d[5], theta6)
+        T_14 = invert_transform(T_01) @ T_06[:, None, None] @ invert_transform(T_45 @ T_56)
+        P_14_x = T_14[..., 0, 3]
+        P_14_z = T_14[..., 2, 3]
+        P_14_norm = np.hypot(P_14_x, P_14_z)
+        theta3, valid3 = _clipped_arccos((P_14_x**2 + P_14_z**2 - a[2]**2 - a[3]**2) / (2 * a[2] * a[3]), tolerance)
+        theta3 = theta3[..., None] * signs
+        valid3 = np.broadcast_to(valid3[..., None], theta3.shape)
+
+        # theta 2 and theta 4
+        theta2 = (np.arctan2(-P_14_z, -P_14_x)[..., None]
+                  - np.arcsin(np.clip(-a[3] * np.sin(theta3) / P_14_norm[..., None], -1, 1)))
+        T_13 = T_mdh_batch(alpha[1], a[1], d[1], theta2) @ T_mdh_batch(alpha[2], a[2], d[2], theta3)
+        T_34 = invert_transform(T_13) @ T_14[..., None, :, :]
+        theta4 = np.arctan2(T_34[..., 1, 0], T_34[..., 0, 0])
+
+    shape = theta3.shape
+    solutions = np.stack([
+        np.broadcast_to(theta1[..., None], shape),
+        theta2,
+        theta3,
+        theta4,
+        np.broadcast_to(theta5[..., None], shape),
+        np.broadcast_to(theta6[..., None], shape),
+    ], axis=-1).reshape((-1, 8, 6))
+    valid = (valid1[:, None, None, None] & valid5[..., None] & valid3).reshape((-1, 8))
+    solutions = np.where(valid[..., None], wrap_angle(solutions), np.nan)
+    return solutions.reshape(batch + (8, 6)), valid.reshape(batch + (8,))
+
+
+def _weighted_distance(q: np.ndarray, reference: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Returns the weighted euclidean joint space distance with every joint difference wrapped to [-pi, pi)"""
+    return np.sqrt(np.sum((weights * wrap_angle(q - reference))**2, axis=-1))
+
+
+def _unwrap_towards(q: np.ndarray, reference: np.ndarray, limits: np.ndarray) -> np.ndarray:
+    """Returns the angles equivalent to q that are closest to reference while staying inside +-limits"""
+    q = reference + wrap_angle(q - reference)
+    q = np.where(q > limits, q - 2 * np.pi, q)
+    return np.where(q < -limits, q + 2 * np.pi, q)
+
+
+def nearest_solution(solutions: np.ndarray, valid: np.ndarray, reference: np.ndarray,
+                     weights: np.ndarray = None, limits: np.ndarray = UR5_JOINT_LIMITS) -> tuple[np.ndarray, np.ndarray]:
+    """Picks the inverse kinematic solution closest to a reference configuration for every pose.
+
+    Args:
+        solutions (np.ndarray): Solutions from inverse_kinematics, shape (N, 8, 6).
+        valid (np.ndarray): Validity mask from inverse_kinematics, shape (N, 8).
+        reference (np.ndarray): Joint angles to compare against, shape (N, 6) or (6,).
+        weights (np.ndarray, optional): Weight of each joint in the distance. Defaults to all ones.
+        limits (np.ndarray, optional): Symmetric joint limits used when unwrapping. Defaults to UR5_JOINT_LIMITS.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Chosen joint angles unwrapped towards the reference with shape (N, 6),
+        and a mask with shape (N,) that is False where no solution was valid.
+    """
+    weights = np.ones(solutions.shape[-1]) if weights is None else np.asarray(weights, dtype=float)
+    reference = np.asarray(reference, dtype=float)
+    cost = np.where(valid, _weighted_distance(solutions, reference[..., None, :], weights), np.inf)
+    index = np.argmin(cost, axis=-1)
+    chosen = np.take_along_axis(solutions, index[..., None, None], axis=-2)[..., 0, :]
+    return _unwrap_towards(chosen, reference, limits), np.any(valid, axis=-1)
+
+
+def select_nearest_solutions(current_joints: np.ndarray, poses: np.ndarray, weights: np.ndarray = None,
+                             mdh: MDHTable = UR5_MDH, limits: np.ndarray = UR5_JOINT_LIMITS) -> tuple[np.ndarray, np.ndarray]:
+    """Solves a sequence of poses, choosing every solution as the one closest to the solution before it.
+    This keeps the robot on the same branch through a program instead of swinging the wrist between branches.
+
+    Args:
+        current_joints (np.ndarray): Joint angles of the robot before the first pose, shape (6,).
+        poses (np.ndarray): Target poses in the order they are visited, shape (M, 4, 4).
+        weights (np.ndarray, optional): Weight of each joint in the distance. Defaults to all ones.
+        mdh (MDHTable, optional): Parameters of the chain. Defaults to UR5_MDH.
+        limits (np.ndarray, optional): Symmetric joint limits used when unwrapping. Defaults to UR5_JOINT_LIMITS.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Joint angles with shape (M, 6) and a reachability mask with shape (M,).
+        Unreachable poses are nan and the next pose is chosen relative to the last reachable one.
+    """
+    weights = np.ones(mdh.joints) if weights is None else np.asarray(weights, dtype=float)
+    current_joints = np.asarray(current_joints, dtype=float)
+    solutions, valid = inverse_kinematics(poses, mdh)
+    reachable = np.any(valid, axis=1)
+
+    # the costs between consecutive poses are computed up front, the walk below only indexes into them
+    step_cost = _weighted_distance(solutions[1:, :, None, :], solutions[:-1, None, :, :], weights)
+    step_cost = np.where(valid[1:, :, None], step_cost, np.inf)  # (M - 1, next branch, previous branch)
+
+    joints = np.full((len(solutions), mdh.joints), np.nan)
+    reference = current_joints
+    previous = None  # branch chosen for the last reachable pose
+    for i in np.flatnonzero(reachable):
+        if previous is not None and reachable[i - 1]:
+            cost = step_cost[i - 1, :, previous]
+        else:
+            cost = np.where(valid[i], _weighted_distance(solutions[i], reference, weights), np.inf)
+        previous = np.argmin(cost)
+        # unwrap along the path so consecutive configurations never differ by a full turn
+        joints[i] = reference = _unwrap_towards(solutions[i, previous], reference, limits)
+    return joints, reachable
+
+
+def _rotation_error(R_target: np.ndarray, R: np.ndarray) -> np.ndarray:
+    """Returns the rotation vector (axis times angle) that turns R into R_target, expressed in the base frame"""
+    R_err = R_target @ np.swapaxes(R, -1, -2)
+    cos_angle = np.clip((np.trace(R_err, axis1=-2, axis2=-1) - 1) / 2, -1, 1)
+    angle = np.arccos(cos_angle)
+    sin_axis = 0.5 * np.stack([R_err[..., 2, 1] - R_err[..., 1, 2],
+                               R_err[..., 0, 2] - R_err[..., 2, 0],
+                               R_err[..., 1, 0] - R_err[..., 0, 1]], axis=-1)
+    sin_angle = np.sin(angle)[..., None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        error = np.where(sin_angle > 1e-6, angle[..., None] / sin_angle * sin_axis, sin_axis)
+
+    # close to half a turn the skew part vanishes, the axis is the largest column of R_err + I instead
+    half_turn = (cos_angle < 0) & (np.abs(sin_angle[..., 0]) <= 1e-6)
+    if np.any(half_turn):
+        columns = R_err[half_turn] + np.eye(3)
+        best = np.argmax(np.linalg.norm(columns, axis=-2), axis=-1)
+        axis = columns[np.arange(len(columns)), :, best]
+        error[half_turn] = np.pi * axis / np.linalg.norm(axis, axis=-1, keepdims=True)
+    return error
+
+
+def pose_error(targets: np.ndarray, poses: np.ndarray) -> np.ndarray:
+    """Returns the position error (mm) and the rotation vector error (radiants) from poses to targets, shape (..., 6)"""
+    return np.concatenate([targets[..., :3, 3] - poses[..., :3, 3],
+                           _rotation_error(targets[..., :3, :3], poses[..., :3, :3])], axis=-1)
+
+
+def numerical_inverse_kinematics(poses: np.ndarray, initial_joints: np.ndarray, mdh: MDHTable = UR5_MDH,
+                                 tool: np.ndarray = None, damping: float = 0.1, max_iterations: int = 50,
+                                 position_tolerance: float = 1e-3, orientation_tolerance: float = 1e-6,
+                                 orientation_scale: float = 100.0, max_step: float = 0.5,
+                                 limits: np.ndarray = UR5_JOINT_LIMITS) -> tuple[np.ndarray, np.ndarray]:
+    """Iterative damped least squares inverse kinematics, solving a batch of poses at once.
+    Unlike inverse_kinematics it works with a tool offset and stays well behaved close to singularities.
+
+    Args:
+        poses (np.ndarray): Target poses of the end effector, shape (N, 4, 4) or (4, 4).
+        initial_joints (np.ndarray): Joint angles to start from, e.g. the previous solutions, shape (N, 6) or (6,).
+        mdh (MDHTable, optional): Parameters of the chain. Defaults to UR5_MDH.
+        tool (np.ndarray, optional): Flange to tool transform, shape (4, 4). Defaults to the flange.
+        damping (float, optional): Damping factor lambda in mm. Larger values are more robust near singularities but converge slower.
+        max_iterations (int, optional): Maximum number of iterations. Defaults to 50.
+        position_tolerance (float, optional): Position error in mm at which a pose counts as converged.
+        orientation_tolerance (float, optional): Orientation error in radiants at which a pose counts as converged.
+        orientation_scale (float, optional): Length in mm that one radiant of orientation error is weighted as.
+        max_step (float, optional): Largest change of any joint in one iteration, in radiants.
+        limits (np.ndarray, optional): Symmetric joint limits the result is folded into. Defaults to UR5_JOINT_LIMITS.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Joint angles with shape (N, 6) and a convergence mask with shape (N,).
+    """
+    targets = np.asarray(poses, dtype=float)
+    batch = targets.shape[:-2]
+    targets = targets.reshape((-1, 4, 4))
+    initial = np.broadcast_to(np.asarray(initial_joints, dtype=float), batch + (mdh.joints,)).reshape((-1, mdh.joints))
+    joints = initial.copy()
+    converged = np.zeros(len(joints), dtype=bool)
+    scale = np.array([1, 1, 1, orientation_scale, orientation_scale, orientation_scale], dtype=float)
+    identity = np.eye(6) * damping**2
+
+    active = np.arange(len(joints))
+    for _ in range(max_iterations + 1):
+        frames = forward_kinematics_frames(joints[active], mdh, tool)
+        error = pose_error(targets[active], frames[:, -1])
+        done = ((np.linalg.norm(error[:, :3], axis=-1) <= position_tolerance)
+                & (np.linalg.norm(error[:, 3:], axis=-1) <= orientation_tolerance))
+        converged[active[done]] = True
+        keep = ~done
+        active = active[keep]
+        if len(active) == 0:
+            break
+
+        # dq = J^T (J J^T + lambda^2 I)^-1 e, with the orientation rows scaled to mm
+        J = _jacobian_from_frames(frames[keep]) * scale[:, None]
+        e = error[keep] * scale
+        step = (np.swapaxes(J, -1, -2) @ np.linalg.solve(J @ np.swapaxes(J, -1, -2) + identity, e[..., None]))[..., 0]
+        largest = np.max(np.abs(step), axis=-1, keepdims=True)
+        step *= np.minimum(1, max_step / np.maximum(largest, 1e-12))
+        joints[active] += step
+
+    joints = _unwrap_towards(joints, initial, limits)
+    return joints.reshape(batch + (mdh.joints,)), converged.reshape(batch)
+
+
+@dataclass
+class MoveCheck:
+    """Result of check_joint_moves, one entry per segment"""
+    max_deviation: np.ndarray  # largest distance of the MoveJ path from the straight MoveL line (mm), shape (S,)
+    bounding_box_min: np.ndarray  # corner of the box swept by the end effector (mm), shape (S, 3)
+    bounding_box_max: np.ndarray  # opposite corner of the swept box (mm), shape (S, 3)
+    joint_duration: np.ndarray  # estimated MoveJ duration (s), shape (S,)
+    linear_duration: np.ndarray  # estimated MoveL duration of the straight line (s), shape (S,)
+
+    def joint_move_allowed(self, tolerance: float) -> np.ndarray:
+        """Returns True for the segments whose MoveJ path stays within tolerance (mm) of the MoveL line"""
+        return self.max_deviation <= tolerance
+
+
+def trapezoid_duration(distance: np.ndarray, speed: float, acceleration: float) -> np.ndarray:
+    """Returns the duration of rest to rest moves over distance with a trapezoidal speed profile"""
+    distance = np.abs(np.asarray(distance, dtype=float))
+    ramp = speed**2 / acceleration  # distance used to accelerate to full speed and brake again
+    return np.where(distance >= ramp, distance / speed + speed / acceleration, 2 * np.sqrt(distance / acceleration))
+
+
+def sample_joint_move(start: np.ndarray, end: np.ndarray, samples: int = 200) -> np.ndarray:
+    """Returns the configurations a MoveJ passes through from start to end, shape (..., samples, 6).
+    All joints are interpolated linearly and arrive at the same time, so the path does not depend on the speed profile"""
+    start = np.asarray(start, dtype=float)[..., None, :]
+    end = np.asarray(end, dtype=float)[..., None, :]
+    s = np.linspace(0, 1, samples)[:, None]
+    return start + s * (end - start)
+
+
+def check_joint_moves(start: np.ndarray, end: np.ndarray, samples: int = 200, limits: MotionLimits = ORDER_SERVICE_LIMITS,
+                      mdh: MDHTable = UR5_MDH, tool: np.ndarray = None, backend: str = "generic") -> MoveCheck:
+    """Compares MoveJ and MoveL between pairs of configurations, to find hops where a faster MoveJ is safe.
+
+    Args:
+        start (np.ndarray): Joint angles at the start of every segment, shape (S, 6) or (6,).
+        end (np.ndarray): Joint angles at the end of every segment, shape (S, 6) or (6,).
+        samples (int, optional): Number of configurations sampled along each MoveJ. Defaults to 200.
+        limits (MotionLimits, optional): Speed and acceleration limits. Defaults to ORDER_SERVICE_LIMITS.
+        mdh (MDHTable, optional): Parameters of the chain. Defaults to UR5_MDH.
+        tool (np.ndarray, optional): Flange to tool transform, shape (4, 4). Defaults to the flange.
+        backend (str, optional): Forward kinematics backend, see forward_kinematics. Defaults to 'generic'.
+
+    Returns:
+        MoveCheck: Deviation, swept box and estimated durations of every segment.
+    """
+    path = forward_kinematics(sample_joint_move(start, end, samples), mdh, tool, backend)[..., :3, 3]  # (S, samples, 3)
+    line_start = path[..., :1, :]
+    line = path[..., -1:, :] - line_start
+    length = np.linalg.norm(line, axis=-1, keepdims=True)
+
+    # distance from every sample to the closest point of the straight line segment
+    with np.errstate(invalid="ignore", divide="ignore"):
+        along = np.sum((path - line_start) * line, axis=-1, keepdims=True) / length**2
+    along = np.clip(np.nan_to_num(along), 0, 1)
+    deviation = np.linalg.norm(path - (line_start + along * line), axis=-1)
+
+    travel = np.max(np.abs(np.asarray(end, dtype=float) - np.asarray(start, dtype=float)), axis=-1)
+    return MoveCheck(
+        max_deviation=np.max(deviation, axis=-1),
+        bounding_box_min=np.min(path, axis=-2),
+        bounding_box_max=np.max(path, axis=-2),
+        joint_duration=trapezoid_duration(travel, limits.joint_speed, limits.joint_acceleration),
+        linear_duration=trapezoid_duration(length[..., 0, 0], limits.linear_speed, limits.linear_acceleration),
+    )
+
+
 def degrees_to_radiants(degrees: float) -> float:
     """Converts degrees to radiants"""
     return degrees * math.pi / 180
@@ -26,26 +513,9 @@ def radiants_to_degrees(radiants: float) -> float:
 
 
 if __name__ == "__main__":
-    d1 = 89.159
-    d2 = 0
-    d3 = 0
-    d4 = 109.15
-    d5 = 94.65
-    d6 = 82.3
-
-    alpha1 = 0
-    alpha2 = math.pi / 2
-    alpha3 = 0
-    alpha4 = 0
-    alpha5 = math.pi / 2
-    alpha6 = -math.pi / 2
-
-    a1 = 0
-    a2 = 0
-    a3 = -425
-    a4 = -392.25
-    a5 = 0
-    a6 = 0
+    d1, d2, d3, d4, d5, d6 = UR5_MDH.d
+    alpha1, alpha2, alpha3, alpha4, alpha5, alpha6 = UR5_MDH.alpha
+    a1, a2, a3, a4, a5, a6 = UR5_MDH.a
 
     theta1 = -math.pi / 4
     theta2 = -math.pi / 4
@@ -54,14 +524,7 @@ if __name__ == "__main__":
     theta5 = degrees_to_radiants(26)
     theta6 = degrees_to_radiants(26)
 
-    T_01 = T_mdh(alpha1, a1, d1, theta1)
-    T_12 = T_mdh(alpha2, a2, d2, theta2)
-    T_23 = T_mdh(alpha3, a3, d3, theta3)
-    T_34 = T_mdh(alpha4, a4, d4, theta4)
-    T_45 = T_mdh(alpha5, a5, d5, theta5)
-    T_56 = T_mdh(alpha6, a6, d6, theta6)
-
-    T_06 = T_01 @ T_12 @ T_23 @ T_34 @ T_45 @ T_56
+    T_06 = forward_kinematics(np.array([theta1, theta2, theta3, theta4, theta5, theta6]))
     np.set_printoptions(precision=3, suppress=True)
     print(f"\nforward kinematic model:\n{T_06}\n")
 
@@ -121,3 +584,11 @@ if __name__ == "__main__":
 
     T_06 = T_01 @ T_12 @ T_23 @ T_34 @ T_45 @ T_56
     print(f"\nforward kinematic model:\n{T_06}\n")
+
+    solutions, valid = inverse_kinematics(T_06)
+    print("all inverse kinematic solutions (degrees):")
+    for k in range(8):
+        if valid[k]:
+            print(f"{k}: {np.degrees(solutions[k])}")
+        else:
+            print(f"{k}: unreachable")
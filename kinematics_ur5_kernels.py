@@ -0,0 +1,122 @@
+# Generated by generate_kinematics_kernels.py from UR5_MDH in kinematics_ur5.py, do not edit by hand.
+import numpy as np
+
+MDH_ALPHA = (0.0, 1.5707963267948966, 0.0, 0.0, 1.5707963267948966, -1.5707963267948966)
+MDH_A = (0.0, 0.0, -425.0, -392.25, 0.0, 0.0)
+MDH_D = (89.159, 0.0, 0.0, 109.15, 94.65, 82.3)
+
+
+def forward_kinematics(q):
+    """Returns the base to flange pose T_06, shape (..., 4, 4)"""
+    q = np.asarray(q, dtype=float)
+    q1 = q[..., 0]
+    q2 = q[..., 1]
+    q3 = q[..., 2]
+    q4 = q[..., 3]
+    q5 = q[..., 4]
+    q6 = q[..., 5]
+    c1 = np.cos(q1)
+    c2 = np.cos(q2)
+    c23 = np.cos(q2 + q3)
+    c234 = np.cos(q2 + q3 + q4)
+    c5 = np.cos(q5)
+    c6 = np.cos(q6)
+    s1 = np.sin(q1)
+    s2 = np.sin(q2)
+    s23 = np.sin(q2 + q3)
+    s234 = np.sin(q2 + q3 + q4)
+    s5 = np.sin(q5)
+    s6 = np.sin(q6)
+    x0 = s1*s5
+    x1 = c1*s234
+    x2 = c1*c5
+    x3 = c234*c6
+    x4 = c234*s6
+    x5 = c1*s5
+    x6 = c234*x5
+    x7 = 425*c2
+    x8 = 392.25*c23
+    x9 = s1*s234
+    x10 = c234*x0
+    x11 = c5*s234
+    x12 = s234*s5
+    out = np.zeros(q.shape[:-1] + (4, 4))
+    out[..., 0, 0] = c6*x0 - s6*x1 + x2*x3
+    out[..., 0, 1] = -c6*x1 - s6*x0 - x2*x4
+    out[..., 0, 2] = c5*s1 - x6
+    out[..., 0, 3] = 94.65*c1*s234 - c1*x7 - c1*x8 + 82.3*c5*s1 + 109.15*s1 - 82.3*x6
+    out[..., 1, 0] = c234*c5*c6*s1 - c6*x5 - s6*x9
+    out[..., 1, 1] = c1*s5*s6 - c5*s1*x4 - c6*x9
+    out[..., 1, 2] = -x10 - x2
+    out[..., 1, 3] = -109.15*c1 + 94.65*s1*s234 - s1*x7 - s1*x8 - 82.3*x10 - 82.3*x2
+    out[..., 2, 0] = c6*x11 + x4
+    out[..., 2, 1] = -s6*x11 + x3
+    out[..., 2, 2] = -x12
+    out[..., 2, 3] = -94.65*c234 - 425*s2 - 392.25*s23 - 82.3*x12 + 89.159
+    out[..., 3, 3] = 1
+    return out
+
+
+def jacobian(q):
+    """Returns the geometric jacobian of the flange in the base frame, shape (..., 6, 6)"""
+    q = np.asarray(q, dtype=float)
+    q1 = q[..., 0]
+    q2 = q[..., 1]
+    q3 = q[..., 2]
+    q4 = q[..., 3]
+    q5 = q[..., 4]
+    q6 = q[..., 5]
+    c1 = np.cos(q1)
+    c2 = np.cos(q2)
+    c23 = np.cos(q2 + q3)
+    c234 = np.cos(q2 + q3 + q4)
+    c5 = np.cos(q5)
+    s1 = np.sin(q1)
+    s2 = np.sin(q2)
+    s23 = np.sin(q2 + q3)
+    s234 = np.sin(q2 + q3 + q4)
+    s5 = np.sin(q5)
+    x0 = c1*c5
+    x1 = 425*c2
+    x2 = 392.25*c23
+    x3 = s1*s5
+    x4 = c234*x3
+    x5 = c1*s5
+    x6 = c234*x5
+    x7 = s234*s5
+    x8 = 94.65*c234 + 425*s2 + 392.25*s23 + 82.3*x7
+    x9 = -c1
+    x10 = c234*s5
+    x11 = 1893*c234 + 1646*x7
+    x12 = 392.25*s23 + 0.05*x11
+    x13 = -1893*s234 + 1646*x10
+    x14 = 0.05*x11
+    out = np.zeros(q.shape[:-1] + (6, 6))
+    out[..., 0, 0] = 109.15*c1 - 94.65*s1*s234 + s1*x1 + s1*x2 + 82.3*x0 + 82.3*x4
+    out[..., 1, 0] = 94.65*c1*s234 - c1*x1 - c1*x2 + 82.3*c5*s1 + 109.15*s1 - 82.3*x6
+    out[..., 5, 0] = 1
+    out[..., 0, 1] = c1*x8
+    out[..., 3, 1] = s1
+    out[..., 1, 1] = s1*x8
+    out[..., 4, 1] = x9
+    out[..., 2, 1] = 94.65*s234 - x1 - 82.3*x10 - x2
+    out[..., 0, 2] = c1*x12
+    out[..., 3, 2] = s1
+    out[..., 1, 2] = s1*x12
+    out[..., 4, 2] = x9
+    out[..., 2, 2] = -392.25*c23 - 0.05*x13
+    out[..., 0, 3] = c1*x14
+    out[..., 3, 3] = s1
+    out[..., 1, 3] = s1*x14
+    out[..., 4, 3] = x9
+    out[..., 2, 3] = -0.05*x13
+    out[..., 0, 4] = -82.3*c234*x0 - 82.3*x3
+    out[..., 3, 4] = c1*s234
+    out[..., 1, 4] = -82.3*c234*c5*s1 + 82.3*x5
+    out[..., 4, 4] = s1*s234
+    out[..., 2, 4] = -82.3*c5*s234
+    out[..., 5, 4] = -c234
+    out[..., 3, 5] = c5*s1 - x6
+    out[..., 4, 5] = -x0 - x4
+    out[..., 5, 5] = -x7
+    return out
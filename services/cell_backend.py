@@ -0,0 +1,478 @@
+"""Backends of the cell: the robot, the gripper and the fixture behind one interface, chosen by the order service.
+
+RoboDKBackend drives the real cell like the order service always did. SimulatedBackend runs the robot on a clock
+with move times from the UR5 kinematics and the gripper and fixture simulators on local ports, at any speed-up.
+RecordingBackend logs every call to another backend and ReplayBackend plays such a log back without any hardware.
+To simulate with the move times of the real station, export the joints of its targets while RoboDK is running:
+    python cell_backend.py station.json
+"""
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import argparse
+import collections
+import concurrent.futures
+import json
+import math
+import sys
+import threading
+import time
+from pathlib import Path
+
+from fixture_client import FixtureClient
+from fixture_inventory import DRILL_LED_REGISTER
+from fixture_sim import FixtureSimulator, FixtureSimConfig
+from wsg50_async import WSG50Thread
+from wsg50_sim import WSG50Simulator, SimulatorConfig
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+INSTANT = math.inf # speed-up of a simulation that never waits
+REPOSITORY_ROOT = Path(__file__).resolve().parents[1] # holds kinematics_ur5.py, the service is started from services/
+DEFAULT_MOVE_TIMES = {'MoveJ': 1.0, 'MoveL': 0.5} # seconds of a simulated move to or from a target without joints
+
+# calls that are recorded and replayed, every other attribute is passed through when recording
+ROBOT_METHODS = {'MoveJ', 'MoveL', 'WaitMove', 'setPoseFrame', 'setSpeed', 'setSpeedJoints', 'setAcceleration',
+                 'setAccelerationJoints'}
+GRIPPER_METHODS = {'homing', 'preposition_gripper', 'grasp_part', 'release_part', 'preposition_nowait', 'grasp_nowait',
+                   'release_nowait'}
+FIXTURE_METHODS = {'read_registers', 'write_register'}
+REPEATABLE = {'read_registers'} # may run more often on replay than recorded, e.g. by the stock poller
+
+
+def parse_speedup(value: str) -> float:
+    """Reads a speed-up from configuration, 'instant' never waits."""
+
+    return INSTANT if value == 'instant' else float(value)
+
+
+class CellBackend():
+    """Robot, gripper and fixture of the cell. The order service only uses these attributes and methods.
+
+    Attributes:
+        robot: Has MoveJ, MoveL, WaitMove, setPoseFrame and the speed and acceleration setters of a robolink.Item.
+        items: Frames and targets by name, with ensure_current() like an ItemRegistry.
+        gripper: Has the methods of a WSG50Thread.
+        fixture: Has the methods of a FixtureClient.
+    """
+    robot = None
+    items = None
+    gripper = None
+    fixture = None
+
+    def start_run(self) -> None:
+        """Prepares the robot before an order is run."""
+
+    def sleep(self, seconds: float) -> None:
+        """Waits like the cell would, e.g. for the drill to run."""
+
+        time.sleep(seconds)
+
+    def close(self) -> None:
+        self.gripper.end_connection()
+        self.fixture.close()
+
+
+class RoboDKBackend(CellBackend):
+    """The real cell, the robot through RoboDK.
+
+    Args:
+        targets (iterable): Names of the targets the program uses.
+        frames (iterable): Names of the reference frames the program uses.
+        robot_name (str, optional): Name of the robot in the station. Defaults to 'UR5'.
+        gripper_address (tuple, optional): Host and port of the WSG50. Defaults to ('192.168.1.22', 1000).
+        fixture_address (tuple, optional): Host and port of the fixture. Defaults to ('192.168.1.184', 502).
+        simulation_speed (float, optional): Speed of the RoboDK simulation. Defaults to 5.
+        metrics (GripperMetrics, optional): Passed to the gripper. Defaults to None.
+        timings (CellTimings, optional): Passed to the fixture client. Defaults to None.
+    """
+
+    def __init__(self, targets, frames, robot_name='UR5', gripper_address=('192.168.1.22', 1000),
+                 fixture_address=('192.168.1.184', 502), simulation_speed=5, metrics=None, timings=None):
+        from robodk import robolink # only the RoboDK backend needs RoboDK
+        from robodk_registry import ItemRegistry
+
+        self.RDK = robolink.Robolink()
+        self.items = ItemRegistry(self.RDK, targets=targets, frames=frames, robots=[robot_name])
+        self.robot = self.items[robot_name]
+        self.RDK.setSimulationSpeed(simulation_speed)
+        self.gripper = WSG50Thread(*gripper_address, metrics=metrics)
+        self.fixture = FixtureClient(*fixture_address, timings=timings)
+
+    def start_run(self) -> None:
+        self.RDK.setRunMode(6) # the PC is the client and the robot behaves like a server, so the real robot moves
+
+
+class NameRegistry():
+    """Items of a backend without RoboDK, every name is its own item."""
+
+    def __init__(self, names):
+        self.names = set(names)
+
+    def __getitem__(self, name: str) -> str:
+        if name not in self.names:
+            raise KeyError(name)
+        return name
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.names
+
+    def ensure_current(self) -> bool:
+        return False
+
+
+class SimulatedRobot():
+    """Robot that takes as long as the UR5 would for every move, divided by the speed-up. Moves sent without
+    blocking are queued like the RoboDK driver does. Targets are names, the joints of the station give the move times.
+
+    Args:
+        station (dict, optional): Joints in degrees by target name. Moves from or to other targets take
+            DEFAULT_MOVE_TIMES. Defaults to none.
+        speedup (float, optional): Divides every wait, INSTANT never waits. Defaults to 1.0.
+    """
+
+    def __init__(self, station=None, speedup=1.0):
+        self.station = station or {}
+        self.speedup = speedup
+        self.linear_speed = 1300.0 # mm/s
+        self.joint_speed = 180.0 # deg/s
+        self.linear_acceleration = 2000.0 # mm/s^2
+        self.joint_acceleration = 600.0 # deg/s^2
+        self.target = None # last target moved to
+        self.moves = 0
+        self.motion_time = 0.0 # simulated seconds of motion, at the speed of the real robot
+        self._busy_until = time.monotonic()
+        self._durations = {}
+        if self.station:
+            if str(REPOSITORY_ROOT) not in sys.path:
+                sys.path.append(str(REPOSITORY_ROOT)) # appended, so it can not shadow the modules of the service
+            import kinematics_ur5
+            self._kinematics = kinematics_ur5
+
+    def _duration(self, op: str, target: str) -> float:
+        key = (op, self.target, target, self.linear_speed, self.joint_speed, self.linear_acceleration, self.joint_acceleration)
+        duration = self._durations.get(key)
+        if duration is None:
+            start, end = self.station.get(self.target), self.station.get(target)
+            if start is None or end is None:
+                duration = DEFAULT_MOVE_TIMES[op]
+            else:
+                limits = self._kinematics.MotionLimits(math.radians(self.joint_speed), math.radians(self.joint_acceleration),
+                                                       self.linear_speed, self.linear_acceleration)
+                check = self._kinematics.check_joint_moves([math.radians(q) for q in start], [math.radians(q) for q in end],
+                                                           samples=2, limits=limits)
+                duration = float(check.joint_duration if op == 'MoveJ' else check.linear_duration)
+            self._durations[key] = duration
+        return duration
+
+    def _move(self, op: str, target: str, blocking: bool) -> None:
+        duration = self._duration(op, target)
+        self.target = target
+        self.moves += 1
+        self.motion_time += duration
+        self._busy_until = max(self._busy_until, time.monotonic()) + duration / self.speedup
+        if blocking:
+            self.WaitMove()
+
+    def MoveJ(self, target, blocking=True):
+        self._move('MoveJ', target, blocking)
+
+    def MoveL(self, target, blocking=True):
+        self._move('MoveL', target, blocking)
+
+    def WaitMove(self, timeout=300):
+        delay = self._busy_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def setPoseFrame(self, frame):
+        pass # targets are names, the frame does not change a move
+
+    def setSpeed(self, speed_linear, speed_joints=-1, accel_linear=-1, accel_joints=-1):
+        for name, value in (('linear_speed', speed_linear), ('joint_speed', speed_joints),
+                            ('linear_acceleration', accel_linear), ('joint_acceleration', accel_joints)):
+            if value > 0: # like RoboDK, -1 keeps the value
+                setattr(self, name, float(value))
+
+    def setSpeedJoints(self, speed_joints):
+        self.joint_speed = float(speed_joints)
+
+    def setAcceleration(self, accel_linear):
+        self.linear_acceleration = float(accel_linear)
+
+    def setAccelerationJoints(self, accel_joints):
+        self.joint_acceleration = float(accel_joints)
+
+
+class SimulatedBackend(CellBackend):
+    """The cell without hardware: a SimulatedRobot and the WSG50 and fixture simulators, which are reached over
+    local TCP ports by the same clients as the real devices.
+
+    Args:
+        targets (iterable): Names of the targets the program uses.
+        frames (iterable): Names of the reference frames the program uses.
+        speedup (float, optional): Divides every wait of the robot, the gripper and the drill, INSTANT never waits.
+            Defaults to 1.0.
+        station (str, optional): JSON file of target joints, written by this module. Defaults to none.
+        stock (int, optional): Parts in every stack of the fixture. Defaults to 1000000.
+        metrics (GripperMetrics, optional): Passed to the gripper. Defaults to None.
+        timings (CellTimings, optional): Passed to the fixture client. Defaults to None.
+    """
+
+    def __init__(self, targets, frames, speedup=1.0, station=None, stock=1000000, metrics=None, timings=None):
+        self.speedup = speedup
+        self.items = NameRegistry(list(targets) + list(frames))
+        if station is not None:
+            with open(station) as file:
+                station = json.load(file)
+        self.robot = SimulatedRobot(station, speedup)
+        self.gripper_sim = WSG50Simulator(SimulatorConfig(time_scale=min(speedup, 1e9)))
+        self.gripper = WSG50Thread(*self.gripper_sim.start_in_thread(), metrics=metrics)
+        self.fixture_sim = FixtureSimulator(FixtureSimConfig(stock={slot: stock for slot in range(DRILL_LED_REGISTER)}))
+        self.fixture = FixtureClient(*self.fixture_sim.start_in_thread(), timings=timings)
+
+    def sleep(self, seconds: float) -> None:
+        if self.speedup != INSTANT:
+            time.sleep(seconds / self.speedup)
+
+
+class _Named():
+    """Item handed out by a recording backend, so the log holds its name."""
+    __slots__ = ('name', 'item')
+
+    def __init__(self, name, item):
+        self.name = name
+        self.item = item
+
+
+class _RecordingItems():
+    def __init__(self, items):
+        self._items = items
+
+    def __getitem__(self, name):
+        return _Named(name, self._items[name])
+
+    def __contains__(self, name):
+        return name in self._items
+
+    def ensure_current(self) -> bool:
+        return self._items.ensure_current()
+
+
+def _plain(value):
+    """Returns a value as it is written to the log."""
+
+    if isinstance(value, _Named):
+        return value.name
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    return value
+
+
+class _Recorder():
+    """Passes every call on to a device and logs the recorded methods with their arguments, result and duration."""
+
+    def __init__(self, device, name, methods, log):
+        self._device = device
+        self._name = name
+        self._methods = methods
+        self._log = log
+
+    def __getattr__(self, method):
+        attribute = getattr(self._device, method)
+        if method not in self._methods:
+            return attribute
+
+        def call(*args):
+            entry = self._log.start(self._name, method, [_plain(a) for a in args])
+            start = time.monotonic()
+            try:
+                result = attribute(*(a.item if isinstance(a, _Named) else a for a in args))
+            except Exception as exc:
+                self._log.finish(entry, None, time.monotonic() - start, exc)
+                raise
+            if isinstance(result, concurrent.futures.Future):
+                entry['future'] = True
+                result.add_done_callback(lambda future: self._log.finish(
+                    entry, None if future.exception() else future.result(), time.monotonic() - start, future.exception()))
+            else:
+                self._log.finish(entry, result, time.monotonic() - start)
+            return result
+        return call
+
+
+class _RecordLog():
+    """Writes one JSON line per finished call. Lines of calls that finish later, like *_nowait, can come out of
+    order, seq is the order of the calls."""
+
+    def __init__(self, path):
+        self._file = open(path, 'a')
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def start(self, device, method, args) -> dict:
+        with self._lock:
+            self._seq += 1
+            return {'seq': self._seq, 'device': device, 'method': method, 'args': args}
+
+    def finish(self, entry, result, duration, error=None) -> None:
+        entry['result'] = _plain(result)
+        entry['duration'] = duration
+        if error is not None:
+            entry['error'] = f'{type(error).__name__}: {error}'
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class RecordingBackend(CellBackend):
+    """Runs another backend and appends every call to its robot, gripper and fixture to a JSON lines file.
+
+    Args:
+        backend (CellBackend): The backend that is recorded.
+        path (str): The log, e.g. to run again with ReplayBackend.
+    """
+
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.log = _RecordLog(path)
+        self.items = _RecordingItems(backend.items)
+        self.robot = _Recorder(backend.robot, 'robot', ROBOT_METHODS, self.log)
+        self.gripper = _Recorder(backend.gripper, 'gripper', GRIPPER_METHODS, self.log)
+        self.fixture = _Recorder(backend.fixture, 'fixture', FIXTURE_METHODS, self.log)
+
+    def start_run(self) -> None:
+        self.backend.start_run()
+
+    def sleep(self, seconds: float) -> None:
+        self.backend.sleep(seconds)
+
+    def close(self) -> None:
+        self.backend.close()
+        self.log.close()
+
+
+class ReplayError(Exception):
+    """Raised when a replayed run calls the cell differently from the recording."""
+
+
+class _Replayer():
+    """Answers the calls to one device from the log, in the recorded order of every method.
+    Calls that failed when recorded raise ReplayError.
+
+    Raises:
+        ReplayError: If a call has other arguments than the recorded one, or there are no more recorded calls.
+    """
+
+    def __init__(self, name, entries, sleep):
+        self._name = name
+        self._sleep = sleep
+        self._calls = collections.defaultdict(collections.deque) # method -> entries not replayed yet
+        self._last = {} # method -> result of the last replayed call
+        for entry in entries:
+            self._calls[entry['method']].append(entry)
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+
+        def call(*args):
+            calls = self._calls[method]
+            if not calls:
+                if method in REPEATABLE and method in self._last:
+                    return self._last[method]
+                raise ReplayError(f'{self._name}.{method} is called more often than recorded')
+            entry = calls.popleft()
+            if entry['args'] != json.loads(json.dumps([_plain(a) for a in args])):
+                raise ReplayError(f'{self._name}.{method}{tuple(args)} was recorded as {self._name}.{method}{tuple(entry["args"])}')
+            self._sleep(entry['duration'])
+            error = ReplayError(f'recorded failure of {self._name}.{method}: {entry["error"]}') if 'error' in entry else None
+            if entry.get('future'):
+                future = concurrent.futures.Future()
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(entry['result'])
+                return future
+            if error is not None:
+                raise error
+            self._last[method] = entry['result']
+            return entry['result']
+        return call
+
+    def remaining(self) -> int:
+        return sum(len(calls) for calls in self._calls.values())
+
+
+class _ReplayGripper(_Replayer):
+    def start_telemetry(self, rate=20.0, capacity=1024):
+        pass # no telemetry is recorded, so Check_gripper only works with WSG50_TELEMETRY_HZ=0
+
+    def stop_telemetry(self):
+        pass
+
+    def latest(self):
+        return None
+
+    def fresh_sample(self, timeout=1.0):
+        return None
+
+    def end_connection(self):
+        pass
+
+
+class _ReplayFixture(_Replayer):
+    def health(self) -> dict:
+        return {'state': 'replay', 'remaining': self.remaining()}
+
+    def close(self):
+        pass
+
+
+class ReplayBackend(CellBackend):
+    """Plays a log of RecordingBackend back instead of moving a cell, checking that the same calls are made.
+
+    Args:
+        path (str): The log.
+        targets (iterable): Names of the targets the program uses.
+        frames (iterable): Names of the reference frames the program uses.
+        speedup (float, optional): Divides the recorded durations of the calls and the drill waits. Defaults to INSTANT.
+    """
+
+    def __init__(self, path, targets, frames, speedup=INSTANT):
+        self.speedup = speedup
+        entries = collections.defaultdict(list)
+        with open(path) as file:
+            for line in file:
+                entry = json.loads(line)
+                entries[entry['device']].append(entry)
+        for device in entries.values():
+            device.sort(key=lambda entry: entry['seq'])
+        self.items = NameRegistry(list(targets) + list(frames))
+        self.robot = _Replayer('robot', entries['robot'], self.sleep)
+        self.gripper = _ReplayGripper('gripper', entries['gripper'], self.sleep)
+        self.fixture = _ReplayFixture('fixture', entries['fixture'], self.sleep)
+
+    def sleep(self, seconds: float) -> None:
+        if self.speedup != INSTANT:
+            time.sleep(seconds / self.speedup)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write the joints of every target of the open RoboDK station to a JSON file, '
+                                                 'for the move times of SimulatedBackend.')
+    parser.add_argument('path')
+    args = parser.parse_args()
+
+    from robodk import robolink
+    RDK = robolink.Robolink()
+    station = {}
+    for target in RDK.ItemList(robolink.ITEM_TYPE_TARGET):
+        station[target.Name()] = list(target.Joints().list())
+    with open(args.path, 'w') as file:
+        json.dump(station, file, indent=1)
+    print(f'{len(station)} targets written to {args.path}')
+
+
+if __name__ == "__main__":
+    main()
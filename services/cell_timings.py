@@ -0,0 +1,146 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import bisect
+import collections
+import threading
+import time
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+# upper bounds of the span histogram buckets in seconds, from a frame change to a whole order
+SPAN_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 60.0, 120.0)
+WINDOW_QUANTILES = (0.5, 0.9, 0.99)
+KINDS = { # kind -> label of the span name, description
+    'order': ('result', 'Duration of whole orders, by their result.'),
+    'stage': ('stage', 'Duration of the assembly stages.'),
+    'call': ('call', 'Duration of the calls to RoboDK, the gripper and the fixture.'),
+}
+clock = time.perf_counter_ns # monotonic, used by record, so a span is started with clock()
+
+
+class _SpanStats():
+    __slots__ = ('buckets', 'total', 'count', 'recent')
+
+    def __init__(self, bucket_count):
+        self.buckets = [0] * (bucket_count + 1)
+        self.total = 0.0
+        self.count = 0
+        self.recent = collections.deque() # (end time in seconds, duration) of the spans inside the window
+
+
+class CellTimings():
+    """Durations of orders, stages and external calls, as histograms keyed by span and order variant.
+
+    record only appends to a queue, so a span costs well under a microsecond. The queue is folded into the
+    histograms by collect, which the cell worker calls between orders and the /metrics endpoint on every scrape.
+    Next to the histograms, which count every span since the start, the spans of the last window seconds are kept
+    for rolling quantiles. The variant is set per thread, so only the spans of the thread that runs the order are
+    keyed by it; spans of background threads like the stock poller get no variant labels.
+
+    Args:
+        buckets (tuple, optional): Upper bounds of the histogram buckets in seconds. Defaults to SPAN_BUCKETS.
+        window (float, optional): Seconds of spans the rolling quantiles are computed from. Defaults to 900.0.
+        capacity (int, optional): Spans that can wait for collect, older ones are dropped. Defaults to 100000.
+        variant_labels (tuple, optional): Labels of the variant. Every series carries all of them, with empty
+            values for spans recorded without a variant, so the label sets of a metric never differ. Defaults to ().
+    """
+
+    def __init__(self, buckets: tuple = SPAN_BUCKETS, window: float = 900.0, capacity: int = 100000,
+                 variant_labels: tuple = ()):
+        self.buckets = tuple(buckets)
+        self.window = window
+        self.variant_labels = tuple(variant_labels)
+        self._local = threading.local() # .variant of the calling thread, see variant
+        self._pending = collections.deque(maxlen=capacity) # (kind, name, variant, end, duration) in ns, not collected yet
+        self._stats = {} # (kind, name, variant) -> _SpanStats
+        self._lock = threading.Lock()
+
+    @property
+    def variant(self) -> tuple:
+        """(label, value) pairs of the order the calling thread is running, the spans it records are keyed by them."""
+
+        return getattr(self._local, 'variant', ())
+
+    @variant.setter
+    def variant(self, labels: tuple) -> None:
+        self._local.variant = tuple(labels)
+
+    def record(self, kind: str, name: str, start: int) -> None:
+        """Ends a span that was started with clock(). Safe to call from any thread.
+
+        Args:
+            kind (str): One of KINDS.
+            name (str): The result, stage or call, e.g. 'Assembled', 'Hole_drill' or 'robodk.movel'.
+            start (int): clock() when the span started.
+        """
+
+        end = clock()
+        self._pending.append((kind, name, getattr(self._local, 'variant', ()), end, end - start))
+
+    def collect(self) -> None:
+        """Moves the recorded spans into the histograms and drops the spans that left the window."""
+
+        with self._lock:
+            pending = self._pending
+            while pending:
+                kind, name, variant, end, duration = pending.popleft()
+                stats = self._stats.get((kind, name, variant))
+                if stats is None:
+                    stats = self._stats[(kind, name, variant)] = _SpanStats(len(self.buckets))
+                seconds = duration / 1e9
+                stats.buckets[bisect.bisect_left(self.buckets, seconds)] += 1
+                stats.total += seconds
+                stats.count += 1
+                stats.recent.append((end / 1e9, seconds))
+            oldest = clock() / 1e9 - self.window
+            for stats in self._stats.values():
+                while stats.recent and stats.recent[0][0] < oldest:
+                    stats.recent.popleft()
+
+    def prometheus(self) -> str:
+        """Collects and returns every histogram and the rolling quantiles in the Prometheus text format.
+
+        Returns:
+            str: A cell_<kind>_seconds histogram and a cell_<kind>_window_seconds summary for every kind.
+        """
+
+        self.collect()
+        lines = []
+        with self._lock:
+            for kind, (label, description) in KINDS.items():
+                keys = sorted(key for key in self._stats if key[0] == kind)
+                if not keys:
+                    continue
+                metric = f'cell_{kind}_seconds'
+                lines.append(f'# HELP {metric} {description}')
+                lines.append(f'# TYPE {metric} histogram')
+                for key in keys:
+                    stats = self._stats[key]
+                    labels = _labels(label, key[1], key[2], self.variant_labels)
+                    cumulative = 0
+                    for bound, count in zip(self.buckets + (float('inf'),), stats.buckets):
+                        cumulative += count
+                        le = '+Inf' if bound == float('inf') else repr(bound)
+                        lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+                    lines.append(f'{metric}_sum{{{labels}}} {stats.total!r}')
+                    lines.append(f'{metric}_count{{{labels}}} {stats.count}')
+                metric = f'cell_{kind}_window_seconds'
+                lines.append(f'# HELP {metric} {description} Quantiles of the last {self.window:g} seconds.')
+                lines.append(f'# TYPE {metric} summary')
+                for key in keys:
+                    recent = sorted(seconds for _, seconds in self._stats[key].recent)
+                    labels = _labels(label, key[1], key[2], self.variant_labels)
+                    for quantile in WINDOW_QUANTILES:
+                        value = recent[min(len(recent) - 1, int(quantile * len(recent)))] if recent else 'NaN'
+                        lines.append(f'{metric}{{{labels},quantile="{quantile}"}} {value}')
+                    lines.append(f'{metric}_sum{{{labels}}} {sum(recent)!r}')
+                    lines.append(f'{metric}_count{{{labels}}} {len(recent)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(label: str, name: str, variant: tuple, variant_labels: tuple) -> str:
+    values = dict(variant)
+    pairs = [(label, name)] + [(key, values.pop(key, '')) for key in variant_labels] + list(values.items())
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in pairs)
@@ -0,0 +1,142 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import inspect
+import threading
+import time
+
+from pymodbus.client import ModbusTcpClient
+from pymodbus.exceptions import ModbusException
+
+from cell_timings import clock
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+# health states
+CONNECTED = 'connected'
+DISCONNECTED = 'disconnected' # not connected yet, or closed
+RECONNECTING = 'reconnecting' # the last request failed, the next one reconnects after the backoff
+DOWN = 'down' # every attempt of the last request failed
+
+# pymodbus 3.10 renamed the unit id keyword from slave to device_id
+UNIT_KEYWORD = 'device_id' if 'device_id' in inspect.signature(ModbusTcpClient.read_holding_registers).parameters else 'slave'
+
+
+class FixtureError(Exception):
+    """Raised when the fixture does not answer a request, after every retry."""
+
+
+class FixtureClient():
+    """One long lived Modbus TCP connection to the ESP32 fixture, shared by every caller.
+    Requests are serialized with a lock, a broken connection is closed and reopened with exponential backoff.
+
+    Args:
+        host (str, optional): IP address of the fixture. Defaults to '192.168.1.184'.
+        port (int, optional): Modbus TCP port. Defaults to 502.
+        slave (int, optional): Unit id the fixture answers to. Defaults to 255.
+        timeout (float, optional): Seconds to wait for a connection or an answer. Defaults to 1.0.
+        retries (int, optional): Extra attempts of a failed request, each on a new connection. Defaults to 2.
+        backoff (float, optional): Seconds to wait before the first reconnect, doubled every failure. Defaults to 0.05.
+        max_backoff (float, optional): Longest wait between reconnects. Defaults to 2.0.
+        timings (CellTimings, optional): Records the duration of every answered request. Defaults to None.
+    """
+
+    def __init__(self, host='192.168.1.184', port=502, slave=255, timeout=1.0, retries=2, backoff=0.05, max_backoff=2.0,
+                 timings=None):
+        self.host = host
+        self.port = port
+        self.slave = slave
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timings = timings
+        self.state = DISCONNECTED
+        self.last_error = None
+        self.failures = 0 # failed attempts in a row
+        self.requests = 0
+        self.reconnects = 0
+        self._client = None
+        self._next_attempt = 0.0 # monotonic time before which no reconnect is tried
+        self._lock = threading.Lock()
+
+    ################ PRIVATE METHODS #####################
+    def _connect(self):
+        if self._client is not None and self._client.connected:
+            return self._client
+        delay = self._next_attempt - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if self._client is not None:
+            self._client.close()
+            self.reconnects += 1
+        self._client = ModbusTcpClient(host=self.host, port=self.port, timeout=self.timeout, retries=0)
+        if not self._client.connect():
+            raise ConnectionError(f'can not connect to the fixture at {self.host}:{self.port}')
+        return self._client
+
+    def _failed(self, exc):
+        self.failures += 1
+        self.last_error = f'{type(exc).__name__}: {exc}'
+        self.state = RECONNECTING
+        self._next_attempt = time.monotonic() + min(self.max_backoff, self.backoff * 2 ** (self.failures - 1))
+        if self._client is not None:
+            self._client.close()
+
+    def _request(self, name, function):
+        """Runs function(client) on the connection, reconnecting and retrying when it fails."""
+
+        start = clock()
+        with self._lock:
+            self.requests += 1
+            for _ in range(self.retries + 1):
+                try:
+                    response = function(self._connect())
+                    if response.isError():
+                        raise ModbusException(str(response))
+                except (ConnectionError, OSError, ModbusException) as exc:
+                    self._failed(exc)
+                    continue
+                self.failures = 0
+                self.state = CONNECTED
+                if self.timings is not None:
+                    self.timings.record('call', name, start)
+                return response
+            self.state = DOWN
+            raise FixtureError(f'fixture at {self.host}:{self.port} did not answer: {self.last_error}')
+
+    ################ PUBLIC METHODS #####################
+    def read_registers(self, address: int, count: int = 1) -> list[int]:
+        """Reads holding registers.
+
+        Args:
+            address (int): First register.
+            count (int, optional): Number of registers. Defaults to 1.
+
+        Raises:
+            FixtureError: If the fixture did not answer after every retry.
+
+        Returns:
+            list[int]: The register values.
+        """
+
+        return self._request('modbus.read', lambda client: client.read_holding_registers(address, count=count, **{UNIT_KEYWORD: self.slave})).registers
+
+    def write_register(self, address: int, value: int) -> None:
+        """Writes one holding register.
+
+        Raises:
+            FixtureError: If the fixture did not answer after every retry.
+        """
+
+        self._request('modbus.write', lambda client: client.write_register(address, value, **{UNIT_KEYWORD: self.slave}))
+
+    def health(self) -> dict:
+        """Returns the connection state and counters, e.g. for a health endpoint."""
+
+        return {'state': self.state, 'host': self.host, 'port': self.port, 'failures': self.failures,
+                'requests': self.requests, 'reconnects': self.reconnects, 'last_error': self.last_error}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+            self._client = None
+            self.state = DISCONNECTED
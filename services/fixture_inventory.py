@@ -0,0 +1,140 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import contextlib
+import threading
+import time
+from dataclasses import dataclass
+
+from fixture_client import FixtureError
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+# holding registers of the fixture, see MBHoldingRegister in Fixture code.cpp
+PCB_SLOT = 0
+BOTTOM_SLOTS = {'White': 1, 'Blue': 2, 'Black': 3}
+TOP_SLOTS = {'White': 4, 'Blue': 5, 'Black': 6}
+DRILL_LED_REGISTER = 7
+REGISTER_COUNT = 8 # the seven ToF presence states and the drill LED, read in one request
+
+
+@dataclass(frozen=True)
+class Inventory():
+    """Snapshot of the fixture registers. slots[i] is 1 if the ToF sensor of slot i sees a part."""
+    slots: tuple
+    drill_led: int
+    time: float # time.monotonic() when the registers were read
+
+    @classmethod
+    def from_registers(cls, registers, timestamp: float):
+        return cls(tuple(registers[:DRILL_LED_REGISTER]), registers[DRILL_LED_REGISTER], timestamp)
+
+    @property
+    def pcb(self) -> bool:
+        return bool(self.slots[PCB_SLOT])
+
+    @property
+    def bottoms(self) -> dict:
+        return {color: bool(self.slots[slot]) for color, slot in BOTTOM_SLOTS.items()}
+
+    @property
+    def tops(self) -> dict:
+        return {color: bool(self.slots[slot]) for color, slot in TOP_SLOTS.items()}
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.time
+
+    def in_stock(self, top_color: str, bottom_color: str) -> bool:
+        """True if the top cover, the bottom cover and a PCB of an order are all there."""
+
+        return self.pcb and self.tops[top_color] and self.bottoms[bottom_color]
+
+    def as_dict(self) -> dict:
+        return {'pcb': self.pcb, 'tops': self.tops, 'bottoms': self.bottoms, 'drill_led': self.drill_led, 'age': self.age}
+
+
+class StockMonitor():
+    """Caches the inventory of the fixture. A snapshot younger than ttl is answered from memory, an older one
+    is read again in a single request. A background poller can keep the snapshot fresh.
+
+    Args:
+        fixture (FixtureClient): Connection to the fixture.
+        ttl (float, optional): Seconds a snapshot is used for. Defaults to 2.0.
+    """
+
+    def __init__(self, fixture, ttl: float = 2.0):
+        self.fixture = fixture
+        self.ttl = ttl
+        self._inventory = None
+        self._generation = 0 # counts invalidations, a read that started before one is not cached
+        self._lock = threading.Lock()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._stop = threading.Event()
+        self._poller = None
+
+    def refresh(self) -> Inventory:
+        """Reads all registers in one request and caches the result."""
+
+        generation = self._generation
+        inventory = Inventory.from_registers(self.fixture.read_registers(0, REGISTER_COUNT), time.monotonic())
+        with self._lock:
+            if generation == self._generation:
+                self._inventory = inventory
+        return inventory
+
+    def snapshot(self, max_age: float = None) -> Inventory:
+        """Returns the cached inventory, or reads it if it is older than max_age (default ttl).
+
+        Raises:
+            FixtureError: If the inventory had to be read and the fixture did not answer.
+        """
+
+        inventory = self._inventory
+        if inventory is None or inventory.age > (self.ttl if max_age is None else max_age):
+            inventory = self.refresh()
+        return inventory
+
+    def invalidate(self) -> None:
+        """Forgets the snapshot, e.g. after a part was picked."""
+
+        with self._lock:
+            self._generation += 1
+            self._inventory = None
+
+    def pause(self) -> None:
+        """Holds the poller back, e.g. while drilling, so its requests do not delay the drill LED writes."""
+
+        self._resume.clear()
+
+    def resume(self) -> None:
+        self._resume.set()
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Holds the poller back while the block runs."""
+
+        self.pause()
+        try:
+            yield
+        finally:
+            self.resume()
+
+    def start(self, interval: float = 1.0) -> None:
+        """Starts a background thread that reads the inventory every interval seconds."""
+
+        self._stop.clear()
+        self._poller = threading.Thread(target=self._poll, args=(interval,), name='stock-monitor', daemon=True)
+        self._poller.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._resume.set()
+        if self._poller is not None:
+            self._poller.join()
+
+    def _poll(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            self._resume.wait()
+            try:
+                self.refresh()
+            except FixtureError as exc:
+                print("Stock poll failed:", exc) # the fixture client keeps its health state, the next poll tries again
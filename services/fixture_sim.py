@@ -0,0 +1,190 @@
+"""Stand-alone stand-in for the ESP32 fixture that speaks Modbus TCP like Fixture code.cpp.
+
+Holding registers 0..6 are the ToF presence states of the part stacks and register 7 is the drill LED.
+Like the firmware, only function codes 3 (read holding registers) and 6 (write register) are served; the firmware has
+its handler of 16 (write multiple registers) commented out, so the simulator answers it with ILLEGAL_FUNCTION unless
+write_multiple is set.
+Every stack holds a number of parts, a pick takes one and the register reads 0 once the stack is empty.
+Responses can be delayed and connections dropped, and every register write is recorded with a timestamp.
+Run it and point the order service at it, e.g. FIXTURE_HOST=127.0.0.1 FIXTURE_PORT=5020:
+    python fixture_sim.py --port 5020 --stock 10 --latency 0.02 --drop 0.01 --log writes.jsonl
+"""
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import argparse
+import asyncio
+import json
+import random
+import struct
+import threading
+import time
+from dataclasses import dataclass, field
+
+from fixture_inventory import REGISTER_COUNT, DRILL_LED_REGISTER
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+MBAP = struct.Struct('>HHHB') # transaction id, protocol id, length, unit id
+READ_HOLDING_REGISTERS = 3
+WRITE_REGISTER = 6
+WRITE_MULTIPLE_REGISTERS = 16
+ILLEGAL_FUNCTION = 1
+ILLEGAL_DATA_ADDRESS = 2
+
+
+@dataclass
+class FixtureSimConfig:
+    """Behaviour of the simulated fixture and network. Times are in seconds."""
+    stock: dict = field(default_factory=lambda: {slot: 10 for slot in range(DRILL_LED_REGISTER)}) # slot -> parts
+    latency: float = 0.0 # delay of every response
+    jitter: float = 0.0 # random extra delay, uniform between 0 and jitter
+    drop_probability: float = 0.0 # chance that a request is not answered and the connection is closed
+    drop_requests: tuple = () # numbers of the requests (counted from 1) that drop the connection
+    write_multiple: bool = False # serve function 16 as well, which Fixture code.cpp does not
+    seed: int = None
+
+
+class FixtureSimulator():
+    """Simulated fixture. Connections share one register map."""
+
+    def __init__(self, config: FixtureSimConfig = None, log_path: str = None):
+        self.config = config or FixtureSimConfig()
+        self.stock = dict(self.config.stock)
+        self.registers = [0] * REGISTER_COUNT
+        self.writes = [] # (time.time(), address, value) of every register write
+        self.requests = 0
+        self.dropped = 0
+        self._log = open(log_path, 'a') if log_path else None
+        self._random = random.Random(self.config.seed)
+        self._server = None
+
+    ################ PUBLIC METHODS #####################
+    def pick(self, *slots) -> None:
+        """Takes one part from each slot, like the robot picking from the stacks."""
+
+        for slot in slots:
+            self.stock[slot] = max(0, self.stock.get(slot, 0) - 1)
+
+    def refill(self, slot: int, parts: int) -> None:
+        self.stock[slot] = parts
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Start listening. Port 0 picks a free port.
+
+        Returns:
+            tuple: The host and port the simulator listens on.
+        """
+
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._log is not None:
+            self._log.close()
+
+    def start_in_thread(self, host='127.0.0.1', port=0):
+        """Run the simulator on an event loop in a daemon thread, for blocking clients like pymodbus.
+
+        Returns:
+            tuple: The host and port the simulator listens on.
+        """
+
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name='fixture-sim', daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(self.start(host, port), loop).result()
+
+    ################ PRIVATE METHODS #####################
+    def _sense(self) -> None:
+        """Updates the ToF states from the stock, the firmware measures them at every request as well."""
+
+        for slot in range(DRILL_LED_REGISTER):
+            self.registers[slot] = 1 if self.stock.get(slot, 0) > 0 else 0
+
+    def _write(self, address: int, value: int) -> None:
+        self.registers[address] = value
+        record = (time.time(), address, value)
+        self.writes.append(record)
+        if self._log is not None:
+            self._log.write(json.dumps({'time': record[0], 'address': address, 'value': value}) + '\n')
+            self._log.flush()
+
+    def _handle(self, function: int, data: bytes) -> bytes:
+        """Returns the response PDU of a request PDU."""
+
+        self._sense()
+        if function == READ_HOLDING_REGISTERS:
+            start, count = struct.unpack_from('>HH', data)
+            if start + count > REGISTER_COUNT:
+                return bytes((function | 0x80, ILLEGAL_DATA_ADDRESS))
+            values = self.registers[start:start + count]
+            return struct.pack(f'>BB{count}H', function, 2 * count, *values)
+        if function == WRITE_REGISTER:
+            address, value = struct.unpack_from('>HH', data)
+            if address >= REGISTER_COUNT:
+                return bytes((function | 0x80, ILLEGAL_DATA_ADDRESS))
+            self._write(address, value)
+            return struct.pack('>BHH', function, address, value)
+        if function == WRITE_MULTIPLE_REGISTERS and self.config.write_multiple:
+            start, count, _ = struct.unpack_from('>HHB', data)
+            if start + count > REGISTER_COUNT:
+                return bytes((function | 0x80, ILLEGAL_DATA_ADDRESS))
+            for i, value in enumerate(struct.unpack_from(f'>{count}H', data, 5)):
+                self._write(start + i, value)
+            return struct.pack('>BHH', function, start, count)
+        return bytes((function | 0x80, ILLEGAL_FUNCTION))
+
+    def _drop(self) -> bool:
+        return self.requests in self.config.drop_requests or self._random.random() < self.config.drop_probability
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(MBAP.size)
+                transaction, protocol, length, unit = MBAP.unpack(header)
+                pdu = await reader.readexactly(length - 1)
+                self.requests += 1
+                if self._drop():
+                    self.dropped += 1
+                    return
+                delay = self.config.latency + self._random.uniform(0, self.config.jitter)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                response = self._handle(pdu[0], pdu[1:])
+                writer.write(MBAP.pack(transaction, protocol, len(response) + 1, unit) + response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate the ESP32 fixture on a Modbus TCP port.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=502)
+    parser.add_argument('--stock', type=int, default=10, help='parts in every stack at the start')
+    parser.add_argument('--latency', type=float, default=0.0, help='response delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra delay in seconds')
+    parser.add_argument('--drop', type=float, default=0.0, help='chance that a request drops the connection')
+    parser.add_argument('--log', help='append every register write to this JSON lines file')
+    parser.add_argument('--write-multiple', action='store_true',
+                        help='serve function 16 (write multiple registers), which the firmware does not')
+    args = parser.parse_args()
+
+    config = FixtureSimConfig(stock={slot: args.stock for slot in range(DRILL_LED_REGISTER)}, latency=args.latency,
+                              jitter=args.jitter, drop_probability=args.drop, write_multiple=args.write_multiple)
+
+    async def serve():
+        host, port = await FixtureSimulator(config, args.log).start(args.host, args.port)
+        print(f'Fixture simulator listening on {host}:{port}')
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import json
+import time
+from dataclasses import dataclass
+
+from cell_timings import clock
+from wsg50_codec import E_SUCCESS, ERROR_CODES_WSG
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+# primitives of a program, every step is a tuple (op, *arguments) of plain values
+STAGE = 'stage' # (name) marks the start of a stage
+FRAME = 'frame' # (frame name) reference frame of the following moves
+MOVEJ = 'movej' # (target name)
+MOVEL = 'movel' # (target name)
+SPEED = 'speed' # (linear speed in mm/s)
+GRASP = 'grasp' # (width, speed)
+RELEASE = 'release' # (width, speed)
+PREPOSITION = 'preposition' # (width, speed, wait) wait False starts it and lets the robot move on
+GRIPPER_WAIT = 'gripper_wait' # () waits for a preposition that was started without waiting
+DRILL_LED = 'drill_led' # (value)
+DWELL = 'dwell' # (seconds)
+CALL = 'call' # (hook name) calls a hook of the executor, e.g. to tell the stock cache that parts were picked
+SYNC = 'sync' # () waits until the robot arrived, for steps that depend on where the robot is but are not ARRIVAL_OPS
+
+# sync points of pipelined execution: these act on the part where the robot stops, so the robot has to arrive first.
+# A PREPOSITION with wait True is one as well, every other step is issued while the robot is still moving
+ARRIVAL_OPS = {GRASP, RELEASE, DRILL_LED, DWELL, SYNC}
+GRIPPER_OPS = {GRASP, RELEASE, PREPOSITION}
+# name of the external call of every op, for the timings of the executor
+CALL_NAMES = {MOVEL: 'robodk.movel', MOVEJ: 'robodk.movej', FRAME: 'robodk.set_frame', SPEED: 'robodk.set_speed',
+              GRASP: 'wsg50.grasp', RELEASE: 'wsg50.release', PREPOSITION: 'wsg50.preposition',
+              GRIPPER_WAIT: 'wsg50.wait'} # the fixture client times the drill LED writes itself
+
+
+class GripperCommandFailed(Exception):
+    """Raised when a gripper command of a program ends with another status than SUCCESS, e.g. E_CMD_FAILED
+    when a grasp closed on nothing. The program stops, so the cell worker marks the order failed."""
+
+    def __init__(self, command: str, status: int):
+        super().__init__(f'{command} ended with {ERROR_CODES_WSG.get(status, status)}')
+        self.command = command
+        self.status = status
+
+
+class ProgramBuilder():
+    """Collects the steps of a program. The stage functions of the order service call it instead of moving the cell."""
+
+    def __init__(self):
+        self.steps = []
+
+    def stage(self, name):
+        self.steps.append((STAGE, name))
+
+    def frame(self, name):
+        self.steps.append((FRAME, name))
+
+    def movej(self, target):
+        self.steps.append((MOVEJ, target))
+
+    def movel(self, target):
+        self.steps.append((MOVEL, target))
+
+    def speed(self, linear_speed):
+        self.steps.append((SPEED, linear_speed))
+
+    def grasp(self, width, speed):
+        self.steps.append((GRASP, width, speed))
+
+    def release(self, width, speed):
+        self.steps.append((RELEASE, width, speed))
+
+    def preposition(self, width, speed, wait=True):
+        self.steps.append((PREPOSITION, width, speed, wait))
+
+    def gripper_wait(self):
+        self.steps.append((GRIPPER_WAIT,))
+
+    def drill_led(self, value):
+        self.steps.append((DRILL_LED, value))
+
+    def dwell(self, seconds):
+        self.steps.append((DWELL, seconds))
+
+    def call(self, hook):
+        self.steps.append((CALL, hook))
+
+    def sync(self):
+        self.steps.append((SYNC,))
+
+    def build(self):
+        return MotionProgram(tuple(self.steps))
+
+
+@dataclass(frozen=True)
+class MotionProgram():
+    """Flat, immutable list of steps for one order variant. It can be cached, stored as JSON and run again."""
+    steps: tuple
+
+    def to_json(self) -> str:
+        return json.dumps(self.steps)
+
+    @classmethod
+    def from_json(cls, text: str):
+        return cls(tuple(tuple(step) for step in json.loads(text)))
+
+    def names(self, op: str) -> set:
+        """Returns the names used by all steps of one op, e.g. every target of MOVEL."""
+
+        return {step[1] for step in self.steps if step[0] == op}
+
+    def stages(self) -> list[str]:
+        return [step[1] for step in self.steps if step[0] == STAGE]
+
+    def validate(self, registry) -> list[str]:
+        """Returns every frame and target of the program that the registry does not know."""
+
+        used = self.names(FRAME) | self.names(MOVEJ) | self.names(MOVEL)
+        return sorted(name for name in used if name not in registry)
+
+
+class ProgramExecutor():
+    """Runs programs on the cell one step at a time, the way the stage functions used to drive it directly.
+    Pipelined, moves are sent without blocking and RoboDK queues them, so frames, speeds, hooks and gripper
+    prepositions run while the robot moves. The executor only waits for the robot before ARRIVAL_OPS.
+    Every gripper command has to end with SUCCESS, otherwise GripperCommandFailed is raised.
+
+    Args:
+        robot (robolink.Item): The robot.
+        items (ItemRegistry): Frames and targets by name.
+        gripper (WSG50Thread): The gripper.
+        drill_led (callable): Switches the drill LED, called with the value.
+        hooks (dict, optional): Functions called by CALL steps, by name. Defaults to none.
+        sleep (callable, optional): Used for DWELL steps. Defaults to time.sleep.
+        pipelined (bool, optional): Send moves without blocking. Defaults to False.
+        timings (CellTimings, optional): Records every stage and every call to the cell. Defaults to None.
+    """
+
+    def __init__(self, robot, items, gripper, drill_led, hooks=None, sleep=time.sleep, pipelined=False, timings=None):
+        self.robot = robot
+        self.items = items
+        self.gripper = gripper
+        self.drill_led = drill_led
+        self.hooks = hooks or {}
+        self.sleep = sleep
+        self.pipelined = pipelined
+        self.timings = timings
+        self.current_frame = None # frame that is set on the robot, setPoseFrame is skipped if it does not change
+
+    def run(self, program: MotionProgram, set_stage=None) -> float:
+        """Runs every step of the program. set_stage is called with the name of every stage that starts.
+
+        Returns:
+            float: Seconds from the first step until the robot stopped after the last one.
+        """
+
+        start = time.monotonic()
+        timings = self.timings
+        blocking = not self.pipelined
+        moving = False # a move was sent without blocking and may not be finished
+        pending_gripper = None
+        stage = None
+        for op, *args in program.steps:
+            if moving and (op in ARRIVAL_OPS or (op == PREPOSITION and args[2])):
+                self._wait_move()
+                moving = False
+            if pending_gripper is not None and op in GRIPPER_OPS: # the gripper runs one command at a time
+                self._wait_gripper(pending_gripper)
+                pending_gripper = None
+            if timings is not None:
+                call_start = clock()
+            if op == MOVEL:
+                self.robot.MoveL(self.items[args[0]], blocking)
+                moving = not blocking
+            elif op == MOVEJ:
+                self.robot.MoveJ(self.items[args[0]], blocking)
+                moving = not blocking
+            elif op == FRAME:
+                if self.current_frame != args[0]:
+                    self.robot.setPoseFrame(self.items[args[0]])
+                    self.current_frame = args[0]
+            elif op == SPEED:
+                self.robot.setSpeed(args[0])
+            elif op == GRASP:
+                _check_gripper(GRASP, self.gripper.grasp_part(*args))
+            elif op == RELEASE:
+                _check_gripper(RELEASE, self.gripper.release_part(*args))
+            elif op == PREPOSITION:
+                width, speed, wait = args
+                if wait:
+                    _check_gripper(PREPOSITION, self.gripper.preposition_gripper(width, speed))
+                else:
+                    pending_gripper = self.gripper.preposition_nowait(width, speed)
+            elif op == GRIPPER_WAIT:
+                if pending_gripper is not None:
+                    _check_gripper(PREPOSITION, pending_gripper.result())
+                    pending_gripper = None
+            elif op == DRILL_LED:
+                self.drill_led(args[0])
+            elif op == DWELL:
+                self.sleep(args[0])
+            elif op == CALL:
+                self.hooks[args[0]]()
+            elif op == STAGE:
+                if stage is not None and timings is not None:
+                    timings.record('stage', stage, stage_start)
+                stage, stage_start = args[0], clock()
+                if set_stage is not None:
+                    set_stage(stage)
+            elif op == SYNC:
+                pass # the robot arrived above
+            else:
+                raise ValueError(f'unknown step {op}')
+            if timings is not None and op in CALL_NAMES:
+                timings.record('call', CALL_NAMES[op], call_start)
+        if moving:
+            self._wait_move()
+        if pending_gripper is not None:
+            self._wait_gripper(pending_gripper)
+        if stage is not None and timings is not None:
+            timings.record('stage', stage, stage_start)
+        return time.monotonic() - start
+
+    def _wait_move(self) -> None:
+        start = clock()
+        self.robot.WaitMove()
+        if self.timings is not None:
+            self.timings.record('call', 'robodk.wait_move', start)
+
+    def _wait_gripper(self, pending) -> None:
+        start = clock()
+        status = pending.result()
+        if self.timings is not None:
+            self.timings.record('call', 'wsg50.wait', start)
+        _check_gripper(PREPOSITION, status) # only prepositions are started without waiting
+
+
+def _check_gripper(op: str, status: int) -> None:
+    if status != E_SUCCESS:
+        raise GripperCommandFailed(CALL_NAMES[op], status)
+
+
+def to_robodk_program(program: MotionProgram, RDK, items, robot, name: str):
+    """Generates a RoboDK station program with the motion of a program, to simulate it, check it or export it
+    with a post processor. Gripper and I/O steps become comments, dwells become pauses.
+
+    Returns:
+        robolink.Item: The generated program.
+    """
+
+    from robodk import robolink # only needed here, programs can be built and run without the RoboDK package
+
+    prog = RDK.AddProgram(name, robot)
+    for op, *args in program.steps:
+        if op == MOVEL:
+            prog.MoveL(items[args[0]])
+        elif op == MOVEJ:
+            prog.MoveJ(items[args[0]])
+        elif op == FRAME:
+            prog.setPoseFrame(items[args[0]])
+        elif op == SPEED:
+            prog.setSpeed(args[0])
+        elif op == DWELL:
+            prog.Pause(args[0] * 1000)
+        else:
+            prog.RunInstruction(f'{op} {" ".join(str(a) for a in args)}'.strip(), robolink.INSTRUCTION_COMMENT)
+    return prog
@@ -0,0 +1,290 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import collections
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+REVIEW = 'review' # was running when the service stopped, an operator has to check the cell before it is retried
+
+
+class QueueFull(Exception):
+    """Raised when an order is submitted while the queue already holds its maximum number of orders."""
+
+
+class StoreUnavailable(Exception):
+    """Raised when a submitted order could not be committed to the order store in time. The order is not queued."""
+
+
+@dataclass
+class Job():
+    """One submitted order and how far the cell got with it."""
+    order: object
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    state: str = QUEUED
+    stage: str = None # stage of the assembly while running
+    result: str = None
+    error: str = None
+    submitted: float = field(default_factory=time.time)
+    started: float = None
+    finished: float = None
+    seq: int = None # submission order in the order store
+
+    def as_dict(self) -> dict:
+        return {'id': self.id, 'state': self.state, 'stage': self.stage, 'result': self.result, 'error': self.error,
+                'submitted': self.submitted, 'started': self.started, 'finished': self.finished}
+
+
+class JobQueue():
+    """Bounded FIFO of jobs waiting for the cell, plus a record of recent jobs to look them up by id.
+
+    Args:
+        maxsize (int, optional): Number of queued jobs before submit raises QueueFull. Defaults to 32.
+        history (int, optional): Number of finished jobs that can still be looked up. Defaults to 1000.
+        store (OrderStore, optional): Persists every state change of every job. Defaults to None.
+        durable (bool, optional): Let submit wait until the job is committed to the store. Defaults to True.
+        save_timeout (float, optional): Seconds submit waits for the store before it gives up. Defaults to 5.0.
+    """
+
+    def __init__(self, maxsize: int = 32, history: int = 1000, store=None, durable: bool = True,
+                 save_timeout: float = 5.0):
+        self.maxsize = maxsize
+        self.history = history
+        self.store = store
+        self.durable = durable
+        self.save_timeout = save_timeout
+        self._queue = collections.deque()
+        self._jobs = collections.OrderedDict() # job id -> job, oldest first
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        with self._condition:
+            return len(self._queue)
+
+    def submit(self, order) -> Job:
+        """Queues an order and returns its job at once, or once it is committed to the store if durable.
+
+        Raises:
+            QueueFull: If maxsize jobs are already waiting.
+            StoreUnavailable: If durable and the job is not committed within save_timeout seconds.
+        """
+
+        with self._condition:
+            if len(self._queue) >= self.maxsize:
+                raise QueueFull(f'{len(self._queue)} orders are already queued')
+            job = Job(order)
+            saved = self.store.save(job) if self.store is not None else None
+            self._queue.append(job)
+            self._remember(job)
+            self._condition.notify()
+        if saved is not None and self.durable:
+            self._wait_saved([job], {saved})
+        return job
+
+    def submit_many(self, orders) -> list[Job]:
+        """Queues several orders right behind each other, in the given order. Either all are queued or none.
+
+        Raises:
+            QueueFull: If the orders do not all fit in the queue.
+            StoreUnavailable: If durable and the jobs are not committed within save_timeout seconds.
+        """
+
+        with self._condition:
+            if len(self._queue) + len(orders) > self.maxsize:
+                raise QueueFull(f'{len(self._queue)} orders are already queued, {len(orders)} more do not fit')
+            jobs = [Job(order) for order in orders]
+            saved = {self.store.save(job) for job in jobs} if self.store is not None else set()
+            for job in jobs:
+                self._queue.append(job)
+                self._remember(job)
+            self._condition.notify()
+        if self.durable:
+            self._wait_saved(jobs, saved)
+        return jobs
+
+    def last_order(self):
+        """Returns the order of the newest queued job, or of the running or last started job if nothing is queued."""
+
+        with self._condition:
+            if self._queue:
+                return self._queue[-1].order
+            started = [job for job in self._jobs.values() if job.started is not None]
+            return max(started, key=lambda job: job.started).order if started else None
+
+    def update(self, job: Job) -> None:
+        """Persists a state change of a job."""
+
+        if self.store is not None:
+            self.store.save(job)
+
+    def restore(self, load_order) -> list[Job]:
+        """Loads the jobs of the store after a restart. Queued jobs are queued again in their original order,
+        jobs that were running are marked for review instead of being run a second time.
+
+        Args:
+            load_order (callable): Builds an order from its stored dict.
+
+        Returns:
+            list[Job]: The jobs that need review.
+        """
+
+        review = []
+        with self._condition:
+            stored_jobs = self.store.load()
+            for index, stored in enumerate(stored_jobs):
+                if stored['state'] not in (QUEUED, RUNNING, REVIEW) and index < len(stored_jobs) - self.history:
+                    continue # finished long ago, only kept in the database
+                job = Job(**{**stored, 'order': load_order(stored['order'])})
+                if job.state == QUEUED:
+                    self._queue.append(job)
+                elif job.state == RUNNING:
+                    job.state = REVIEW
+                    job.error = f'interrupted during {job.stage}, check the cell before retrying'
+                    self.store.save(job)
+                if job.state == REVIEW:
+                    review.append(job)
+                self._jobs[job.id] = job
+            self._condition.notify_all()
+        return review
+
+    def retry(self, job_id: str):
+        """Queues a job that is in review again, once an operator has cleared the cell. Returns None if there is no such job.
+
+        Raises:
+            QueueFull: If maxsize jobs are already waiting, the job stays in review.
+        """
+
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != REVIEW:
+                return None
+            if len(self._queue) >= self.maxsize:
+                raise QueueFull(f'{len(self._queue)} orders are already queued')
+            job.state, job.stage, job.error, job.started = QUEUED, None, None, None
+            self.update(job)
+            self._queue.append(job)
+            self._condition.notify()
+            return job
+
+    def dismiss(self, job_id: str):
+        """Marks a job that is in review as failed without running it again. Returns None if there is no such job."""
+
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.state != REVIEW:
+                return None
+            job.state = FAILED
+            self.update(job)
+            return job
+
+    def in_review(self) -> list[Job]:
+        with self._condition:
+            return [job for job in self._jobs.values() if job.state == REVIEW]
+
+    def _wait_saved(self, jobs: list, saved: set) -> None:
+        """Waits for the store to commit newly submitted jobs. If it does not in time, the jobs the worker has not
+        taken yet are taken out of the queue again and marked failed, so they are not run after a restart either.
+        """
+
+        deadline = time.monotonic() + self.save_timeout
+        if all(self.store.wait_saved(event, max(0.0, deadline - time.monotonic())) for event in saved):
+            return
+        reason = repr(self.store.error) if self.store.error is not None else f'no commit within {self.save_timeout} s'
+        with self._condition:
+            withdrawn = [job for job in jobs if job.state == QUEUED and job in self._queue]
+            for job in withdrawn:
+                self._queue.remove(job)
+                job.state, job.error, job.finished = FAILED, f'not stored: {reason}', time.time()
+                self.update(job) # replaces the queued state the store has not written yet
+        if withdrawn:
+            raise StoreUnavailable(f'order store is not writable, {len(withdrawn)} orders not queued: {reason}')
+
+    def _remember(self, job: Job) -> None:
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.history:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.state in (QUEUED, RUNNING, REVIEW):
+                break
+            self._jobs.popitem(last=False)
+
+    def get(self, job_id: str):
+        """Returns the job with this id, or None if it is unknown or was forgotten."""
+
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def position(self, job: Job):
+        """Returns how many jobs are in front of a queued job, or None if it is not queued."""
+
+        with self._condition:
+            try:
+                return self._queue.index(job)
+            except ValueError:
+                return None
+
+    def next_job(self, timeout: float = None):
+        """Takes the next job out of the queue, waiting up to timeout seconds. Returns None on timeout."""
+
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._queue, timeout):
+                return None
+            return self._queue.popleft()
+
+
+class CellWorker():
+    """The one thread that drives the robot and the gripper. It runs queued jobs one after another with
+    run(order, set_stage), which returns the result text of the job and calls set_stage(name) at every stage.
+
+    Args:
+        jobs (JobQueue): Queue to take jobs from.
+        run (callable): Assembles one order.
+    """
+
+    def __init__(self, jobs: JobQueue, run):
+        self.jobs = jobs
+        self.run = run
+        self.current = None # job that is running
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._work, name='cell-worker', daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """Stops taking new jobs and waits for the running one to finish."""
+
+        self._stop.set()
+        self._thread.join(timeout)
+
+    def _work(self) -> None:
+        while not self._stop.is_set():
+            job = self.jobs.next_job(timeout=0.5)
+            if job is not None:
+                self._run_job(job)
+
+    def _run_job(self, job: Job) -> None:
+        def set_stage(stage):
+            job.stage = stage
+            self.jobs.update(job)
+
+        self.current = job
+        job.started = time.time()
+        job.state = RUNNING
+        self.jobs.update(job)
+        try:
+            job.result = self.run(job.order, set_stage)
+            job.state = DONE
+        except Exception as exc:
+            job.error = f'{type(exc).__name__}: {exc}'
+            job.state = FAILED
+            traceback.print_exc()
+        finally:
+            job.finished = time.time()
+            self.jobs.update(job)
+            self.current = None
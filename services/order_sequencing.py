@@ -0,0 +1,95 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+from dataclasses import dataclass
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+# drilling variants, as Hole_drill in order_service.py runs them
+DRILL_NONE = 'none'
+DRILL_TOP = 'top' # two holes, no offset
+DRILL_BOTTOM = 'bottom' # two holes after turning the cover, offset path to assembly
+DRILL_BOTH = 'both' # four holes after turning the cover, offset path to assembly
+
+
+def drill_variant(order) -> str:
+    if order.top_hole and order.bottom_hole:
+        return DRILL_BOTH
+    if order.top_hole:
+        return DRILL_TOP
+    if order.bottom_hole:
+        return DRILL_BOTTOM
+    return DRILL_NONE
+
+
+@dataclass
+class SequencingModel():
+    """Estimated seconds for an order and for the changeovers between two orders that follow each other.
+    The defaults are rough estimates of the cell, calibrate them from the stage timings of real runs.
+    """
+    base_time: float = 60.0 # pick, assemble and lay off one phone without drilling or fuses
+    drill_times: dict = None # seconds per drilling variant
+    fuse_time: float = 4.0 # per fuse
+    bottom_color_change: float = 1.5 # other bottom cover stack, the approach to the new stack frame is longer
+    top_color_change: float = 1.5 # other top cover stack
+    drill_variant_change: float = 2.0 # the cover is turned or the offset path is used only by some variants
+    fuse_change: float = 0.5
+
+    def __post_init__(self):
+        if self.drill_times is None:
+            self.drill_times = {DRILL_NONE: 0.0, DRILL_TOP: 6.0, DRILL_BOTTOM: 10.0, DRILL_BOTH: 14.0}
+
+    def order_time(self, order) -> float:
+        return self.base_time + self.drill_times[drill_variant(order)] + self.fuse_time * (order.top_fuse + order.bottom_fuse)
+
+    def changeover_time(self, previous, order) -> float:
+        if previous is None:
+            return 0.0
+        return (self.bottom_color_change * (previous.bottom_color != order.bottom_color)
+                + self.top_color_change * (previous.top_color != order.top_color)
+                + self.drill_variant_change * (drill_variant(previous) != drill_variant(order))
+                + self.fuse_change * ((previous.top_fuse, previous.bottom_fuse) != (order.top_fuse, order.bottom_fuse)))
+
+    def sequence_time(self, orders, previous=None) -> float:
+        """Estimated seconds to run the orders in the given order, after the order previous."""
+
+        total = 0.0
+        for order in orders:
+            total += self.changeover_time(previous, order) + self.order_time(order)
+            previous = order
+        return total
+
+
+def sequence_orders(orders, window: int = 5, model: SequencingModel = None, previous=None) -> list[int]:
+    """Chooses the order to run a batch in, with as little changeover time as possible. Every order runs at most
+    window - 1 places later than in arrival order, so no order is held back for long by orders that fit better.
+    Greedy: each step runs the waiting order that is cheapest to change over to, among the window oldest ones.
+    The arrival order is kept unless the model predicts the greedy order to be strictly faster, so orders are
+    never reordered for nothing.
+
+    Args:
+        orders (list): Orders in arrival order.
+        window (int, optional): Fairness window, 1 keeps the arrival order. Defaults to 5.
+        model (SequencingModel, optional): Time estimates. Defaults to SequencingModel().
+        previous (Order, optional): Order the cell ran last. Defaults to None.
+
+    Returns:
+        list[int]: Indices into orders, in the order to run them.
+    """
+
+    model = model or SequencingModel()
+    window = max(1, window)
+    arrival = list(range(len(orders)))
+    arrival_time = model.sequence_time(orders, previous)
+    last = previous
+    waiting = list(arrival)
+    sequence = []
+    while waiting:
+        oldest = waiting[0]
+        if len(sequence) - oldest >= window - 1:
+            chosen = oldest # it can not be passed again
+        else:
+            chosen = min(waiting[:window], key=lambda i: (model.changeover_time(previous, orders[i]), i))
+        waiting.remove(chosen)
+        sequence.append(chosen)
+        previous = orders[chosen]
+    if model.sequence_time([orders[i] for i in sequence], last) < arrival_time - 1e-9: # not just rounding
+        return sequence
+    return arrival
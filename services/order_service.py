@@ -1,28 +1,91 @@
-#Library used to make the robot wait by using time.sleep()
-import time
-
-# Type help("robodk.robolink") for more information
-# Documentation: https://robodk.com/doc/en/RoboDK-API.html
-# Reference:     https://robodk.com/doc/en/PythonAPI/robodk.html
-# Note: It is not required to keep a copy of this file, your Python script is saved with your RDK project
-from robodk import robolink    # RoboDK API
-RDK = robolink.Robolink()
-robot = RDK.Item('UR5')
-
-# Forward and backwards compatible use of the RoboDK API:
-# Remove these 2 lines to follow python programming guidelines
-from robodk import *      # RoboDK API
-from robolink import *    # Robot toolbox
-
-#Gripper library and initialization
-import wsg50
-wsg50_instance = wsg50.wsg50()
+import os
+import collections
+import functools
+import itertools
+
+#Every target and frame the program uses is looked up once at startup, a missing or misspelled name stops the service
+from robodk_registry import MissingItemError
+FRAME_NAMES = [
+    "Frame 5", "Frame 4", "Frame 3", "FrameDrilling", "Universal frame", "FramePCB", "FrameFuse", "Frame 8", "Frame 7",
+    "Frame 6"
+]
+TARGET_NAMES = [
+    "AboveAssemblyBottomCover", "Bottom Cover 1", "Bottom Cover 2", "Approach_Exit_Drilling", "BeforeDrilling",
+    "Drilling", "AboveBottomCover180", "DetachBottomCover180", "DetachOffset", "Drilling180", "BeforeDrilling180",
+    "AssemblyBottomCover", "AboveAssemblyBottomCoverOffset", "AssemblyBottomCoverOffset", "PCB 1", "PCB 2",
+    "BetweenFuseAndAssembly", "Top Fuse Approach & Exit", "Top Fuse", "Bottom Fuse Approach & Exit", "Bottom Fuse",
+    "AboveAssemblyPCB", "AssemblyPCB", "BetweenTopCoverAndAssembly", "TopCoverAboveAssembly", "TopCoverAssembly",
+    "PushPhone", "AssembledPhoneLayoff", "AboveAssembledPhone"
+]
 
-#Modbus communication from fixture to main program
-from pymodbus.client import ModbusTcpClient
+from wsg50_metrics import GripperMetrics
+#Command latencies and counters of the gripper, set WSG50_METRICS=0 to switch them off
+gripper_metrics = GripperMetrics() if os.environ.get('WSG50_METRICS', '1') != '0' else None
+
+#Every stage and every call to the cell is timed per order variant, the histograms are served on GET /metrics.
+#Calls from other threads than the cell worker, like the stock poller's, carry the variant labels with empty values
+from cell_timings import CellTimings, clock
+VARIANT_LABELS = ("top", "bottom", "top_fuse", "bottom_fuse", "top_hole", "bottom_hole")
+cell_timings = CellTimings(window=float(os.environ.get('CELL_TIMINGS_WINDOW', 900)), variant_labels=VARIANT_LABELS)
+
+#The robot, the gripper and the fixture are reached through the backend chosen with CELL_BACKEND:
+#robodk drives the real cell through RoboDK (WSG50_HOST, WSG50_PORT, FIXTURE_HOST and FIXTURE_PORT give the devices),
+#sim simulates the whole cell CELL_SPEEDUP times faster ('instant' never waits), replay plays back the log in CELL_REPLAY.
+#CELL_RECORD logs every call to the cell of any backend, to replay it later
+import cell_backend
+cell_speedup = cell_backend.parse_speedup(os.environ.get('CELL_SPEEDUP', '1'))
+match os.environ.get('CELL_BACKEND', 'robodk'):
+    case 'robodk':
+        cell = cell_backend.RoboDKBackend(TARGET_NAMES, FRAME_NAMES, robot_name='UR5',
+                                          gripper_address=(os.environ.get('WSG50_HOST', '192.168.1.22'), int(os.environ.get('WSG50_PORT', 1000))),
+                                          fixture_address=(os.environ.get('FIXTURE_HOST', '192.168.1.184'), int(os.environ.get('FIXTURE_PORT', 502))),
+                                          simulation_speed=5, metrics=gripper_metrics, timings=cell_timings)
+    case 'sim':
+        cell = cell_backend.SimulatedBackend(TARGET_NAMES, FRAME_NAMES, speedup=cell_speedup, station=os.environ.get('CELL_STATION'),
+                                             metrics=gripper_metrics, timings=cell_timings)
+    case 'replay':
+        cell = cell_backend.ReplayBackend(os.environ['CELL_REPLAY'], TARGET_NAMES, FRAME_NAMES,
+                                          speedup=cell_backend.parse_speedup(os.environ.get('CELL_SPEEDUP', 'instant')))
+    case backend:
+        raise ValueError(f"Unknown CELL_BACKEND {backend}, use robodk, sim or replay")
+if os.environ.get('CELL_RECORD'):
+    cell = cell_backend.RecordingBackend(cell, os.environ['CELL_RECORD'])
+items = cell.items
+robot = cell.robot
+
+#The gripper runs on a background event loop, so its moves can overlap robot moves
+wsg50_instance = cell.gripper
+#Set WSG50_TELEMETRY_HZ to poll the gripper state in the background, so readiness is checked from memory
+telemetry_rate = float(os.environ.get('WSG50_TELEMETRY_HZ', 0))
+gripper_ready_timeout = float(os.environ.get('GRIPPER_READY_TIMEOUT', 1.0))
+if telemetry_rate > 0:
+    wsg50_instance.start_telemetry(telemetry_rate)
+
+class GripperNotReady(Exception):
+    """Raised when the gripper is not ready to start an order."""
+
+#Modbus communication from fixture to main program. One connection is kept open and reopened when it breaks
+from fixture_client import FixtureError
+fixture = cell.fixture
+#The stock is read in one request and cached for FIXTURE_STOCK_TTL seconds, a poller refreshes it every FIXTURE_POLL_INTERVAL seconds (0 is off)
+from fixture_inventory import StockMonitor, PCB_SLOT, TOP_SLOTS, BOTTOM_SLOTS
+stock_monitor = StockMonitor(fixture, ttl=float(os.environ.get('FIXTURE_STOCK_TTL', 2.0)))
+stock_poll_interval = float(os.environ.get('FIXTURE_POLL_INTERVAL', 1.0))
+if stock_poll_interval > 0:
+    stock_monitor.start(stock_poll_interval)
+
+#Order queue and the worker that owns the cell
+from order_jobs import JobQueue, CellWorker, QueueFull, StoreUnavailable
+from order_store import OrderStore
+from order_sequencing import SequencingModel, sequence_orders
+#The stage functions build a motion program per order variant, the executor runs it on the cell
+from motion_program import ProgramBuilder, MotionProgram, ProgramExecutor
+#PIPELINED_MOVES=1 sends moves without blocking and only waits for the robot where a step needs it to have arrived
+pipelined_moves = os.environ.get('PIPELINED_MOVES', '0') == '1'
+cycle_times = collections.deque(maxlen=100) # seconds per phone of the last orders
 
 #Libraries for GUI
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 
@@ -34,17 +97,14 @@ class Order(BaseModel):
     top_hole: bool
     bottom_hole: bool
 
-top_dict = {
-    'Black': 6,
-    'Blue': 5,
-    'White': 4
-}
+class Batch(BaseModel):
+    orders: list[Order]
+    fairness_window: int = 5 # every order runs at most fairness_window - 1 places later than submitted
+
+# holding register of the ToF sensor of every cover stack
+top_dict = TOP_SLOTS
 
-bottom_dict = {
-    'Black': 3,
-    'Blue': 2,
-    'White': 1
-}
+bottom_dict = BOTTOM_SLOTS
 
 # top_dict[order.top_color] = 6
 
@@ -53,7 +113,7 @@ linear_speed = 1300
 joint_speed = 180
 drillTime = 0.5
 gripSpeed = 400
-RDK.setSimulationSpeed(5)
+graspClearance = 6 # mm the fingers are wider than a part while approaching it
 
 
 app = FastAPI()
@@ -71,281 +131,484 @@ app.add_middleware(
 )
 
 
+@app.get("/gripper/metrics")
+def read_gripper_metrics() -> dict:
+    '''Returns the command counters and latency histograms of the gripper.'''
+    return gripper_metrics.as_dict() if gripper_metrics is not None else {}
+
+
+@app.get("/metrics")
+def read_metrics() -> Response:
+    '''Returns the duration histograms of the orders, stages and calls to the cell in the Prometheus text format.'''
+    return Response(content=cell_timings.prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/stock")
+def read_stock() -> dict:
+    '''Returns the stock of the fixture, from the cached snapshot while it is fresh.'''
+    try:
+        return stock_monitor.snapshot().as_dict()
+    except FixtureError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+@app.get("/fixture/health")
+def read_fixture_health() -> dict:
+    '''Returns the state of the connection to the fixture.'''
+    return fixture.health()
+
+
+@app.get("/cycle_time")
+def read_cycle_time() -> dict:
+    '''Returns the cycle time per phone of the last assembled orders and whether the moves are pipelined.'''
+    times = list(cycle_times)
+    return {"pipelined": pipelined_moves, "count": len(times), "last": times[-1] if times else None,
+            "mean": sum(times) / len(times) if times else None}
+
+
 @app.post("/")
-def read_order(order: Order) -> str:
-    '''Waits for an order to be made in the GUI and assembles order if possible.
+def read_order(order: Order) -> dict:
+    '''Validates an order from the GUI and queues it for the cell. Returns the job id at once, the state of the
+    job can be followed on GET /jobs/{job_id}. Answers 429 when the queue is full and 503 when the order can not be stored.
+    
+    Parameters: (order: Class)'''
+    if order.top_color not in top_dict or order.bottom_color not in bottom_dict:
+        raise HTTPException(status_code=422, detail=f"Unknown color, tops: {list(top_dict)}, bottoms: {list(bottom_dict)}")
+    try:
+        job = order_queue.submit(order)
+    except QueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "60"})
+    except StoreUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "60"})
+    return {"job_id": job.id, "state": job.state, "position": order_queue.position(job)}
+
+@app.post("/batch")
+def read_batch(batch: Batch) -> dict:
+    '''Queues many orders at once, reordered within the fairness window so that orders which share covers,
+    drilling and fuses run after each other. Returns the job ids in the chosen order and the predicted time saved.
+    
+    Parameters: (batch: Class)'''
+    for order in batch.orders:
+        if order.top_color not in top_dict or order.bottom_color not in bottom_dict:
+            raise HTTPException(status_code=422, detail=f"Unknown color, tops: {list(top_dict)}, bottoms: {list(bottom_dict)}")
+    previous = order_queue.last_order()
+    sequence = sequence_orders(batch.orders, batch.fairness_window, sequencing_model, previous)
+    ordered = [batch.orders[i] for i in sequence]
+    try:
+        jobs = order_queue.submit_many(ordered)
+    except QueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "60"})
+    except StoreUnavailable as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "60"})
+    arrival_time = sequencing_model.sequence_time(batch.orders, previous)
+    sequenced_time = sequencing_model.sequence_time(ordered, previous)
+    return {"job_ids": [job.id for job in jobs],
+            "sequence": sequence, # indices into the submitted orders, in the order they run
+            "predicted_time": sequenced_time,
+            "predicted_time_saved": arrival_time - sequenced_time}
+
+@app.post("/program")
+def read_program(order: Order) -> dict:
+    '''Returns the motion program of an order without running it, e.g. to check or time a variant away from the cell.
+    
+    Parameters: (order: Class)'''
+    if order.top_color not in top_dict or order.bottom_color not in bottom_dict:
+        raise HTTPException(status_code=422, detail=f"Unknown color, tops: {list(top_dict)}, bottoms: {list(bottom_dict)}")
+    program = Compile_variant(*Order_variant(order))
+    return {"variant": Order_variant(order), "stages": program.stages(), "steps": program.steps,
+            "unknown_items": program.validate(items)}
+
+@app.get("/jobs/{job_id}")
+def read_job(job_id: str) -> dict:
+    '''Returns the state of a job: queued (with its position in the queue), running (with the current stage), done or failed.
+    
+    Parameters: (job_id: str)'''
+    job = order_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return {**job.as_dict(), "position": order_queue.position(job)}
+
+@app.get("/review")
+def read_review() -> list:
+    '''Returns the jobs that were interrupted by a restart of the service and wait for an operator.'''
+    return [job.as_dict() for job in order_queue.in_review()]
+
+@app.post("/jobs/{job_id}/retry")
+def retry_job(job_id: str) -> dict:
+    '''Queues an interrupted job again, after the operator has cleared the cell. Answers 503 while the queue is full,
+    the job then stays in review.
+    
+    Parameters: (job_id: str)'''
+    try:
+        job = order_queue.retry(job_id)
+    except QueueFull as exc:
+        raise HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": "60"})
+    if job is None:
+        raise HTTPException(status_code=404, detail="No job in review with this id")
+    return job.as_dict()
+
+@app.post("/jobs/{job_id}/dismiss")
+def dismiss_job(job_id: str) -> dict:
+    '''Marks an interrupted job as failed without running it again.
+    
+    Parameters: (job_id: str)'''
+    job = order_queue.dismiss(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="No job in review with this id")
+    return job.as_dict()
+
+def Order_variant(order: Order) -> tuple:
+    '''Returns the fields of an order that decide its motion, the key of the program cache.
+    
+    Parameters: (order: Class)'''
+    return (order.top_color, order.bottom_color, order.top_fuse, order.bottom_fuse, order.top_hole, order.bottom_hole)
+
+@functools.lru_cache(maxsize=int(os.environ.get('PROGRAM_CACHE_SIZE', 144)))
+def Compile_variant(Top: str, Bottom: str, top_fuse: bool, bottom_fuse: bool, top_holes: bool, bottom_holes: bool) -> MotionProgram:
+    '''Runs the stage functions against a program builder instead of the cell. The program of every variant is built
+    once and reused by every later order of the same variant, 3 x 3 x 2 x 2 x 2 x 2 = 144 variants in total.
+    
+    Parameters: (Top: str, Bottom: str, top_fuse: bool, bottom_fuse: bool, top_holes: bool, bottom_holes: bool)'''
+    program = ProgramBuilder()
+    program.stage("Move_home")
+    program.preposition(90, gripSpeed, wait=False) # open the gripper while moving home
+    Move_home(program)
+    program.gripper_wait()
+    program.stage("Bottom_pickup")
+    Bottom_pickup(program, Bottom)
+    program.stage("Hole_drill")
+    program.call("pause_stock_poller") # keep the stock poller off the fixture while the drill LED is switched
+    Offset1 = Hole_drill(program, top_holes, bottom_holes)
+    program.call("resume_stock_poller")
+    program.stage("From_drill_to_assembly")
+    From_drill_to_assembly(program, Offset1)
+    program.stage("PCB_pickup")
+    PCB_pickup(program)
+    program.stage("Fuse_pickup")
+    Fuse_pickup(program, top_fuse, bottom_fuse)
+    program.stage("From_fuse_to_assembly")
+    From_fuse_to_assembly(program, top_fuse, bottom_fuse)
+    program.stage("Top_pickup")
+    Top_pickup(program, Top)
+    program.call("stock_taken") # all parts of the order are picked, the next order reads the stock again
+    program.stage("From_top_cover_to_assembly")
+    From_top_cover_to_assembly(program)
+    program.stage("Layoff_assembled_phone")
+    Layoff_assembled_phone(program)
+    program.stage("Move_home")
+    Move_home(program)
+    program.call("prefetch_stock") # read the stock for the next order while the robot moves home
+    return program.build()
+
+def All_variants() -> list[tuple]:
+    '''Returns the variant of every possible order.'''
+    return list(itertools.product(top_dict, bottom_dict, *[(False, True)] * 4))
+
+def Variant_labels(order: Order) -> tuple:
+    '''Returns the variant of an order as (label, value) pairs, the timings of the order are keyed by them.
     
     Parameters: (order: Class)'''
-    Top = order.top_color
-    Bottom = order.bottom_color
-    top_fuse = order.top_fuse
-    bottom_fuse = order.bottom_fuse
-    top_holes = order.top_hole
-    bottom_holes = order.bottom_hole
-    Offset1 = 0
-    stock_list = Check_stock(top_dict[Top],bottom_dict[Bottom])
+    return tuple((label, str(value).lower() if isinstance(value, bool) else value)
+                 for label, value in zip(VARIANT_LABELS, Order_variant(order)))
+
+def Assemble_order(order: Order, set_stage) -> str:
+    '''Assembles an order if the parts are in stock and records how long it took. Runs on the cell worker,
+    the only thread that moves the robot and the gripper.
+    
+    Parameters: (order: Class, set_stage: function called with the name of every stage)'''
+    cell_timings.variant = Variant_labels(order) # only for this thread, the stock poller's spans stay unlabelled
+    start = clock()
+    result = "Failed"
+    try:
+        result = Run_order(order, set_stage)
+        return result
+    finally:
+        cell_timings.record("order", result, start)
+        cell_timings.variant = ()
+        cell_timings.collect() # between orders, so the spans never pile up while nobody scrapes /metrics
+
+def Run_order(order: Order, set_stage) -> str:
+    '''Checks the stock and the gripper and runs the program of the order on the cell.
+    
+    Parameters: (order: Class, set_stage: function called with the name of every stage)'''
+    if items.ensure_current(): # another station was opened, the stored items belong to the old one
+        program_executor.current_frame = None
+    set_stage("Check_stock")
+    start = clock()
+    stock_list = Check_stock(top_dict[order.top_color],bottom_dict[order.bottom_color])
+    cell_timings.record("stage", "Check_stock", start)
+
+    Check_gripper()
 
     if (stock_list[0] and stock_list[1] and stock_list[2]):
         print("Items in stock")
+        start = clock()
         Initialize_robot(linear_speed, joint_speed)
-        wsg50_instance.preposition_gripper(90, gripSpeed)
-        Move_home()
-        Bottom_pickup(Bottom)
-        Offset1 = Hole_drill(top_holes, bottom_holes)
-        From_drill_to_assembly(Offset1)
-        PCB_pickup()
-        Fuse_pickup(top_fuse, bottom_fuse)
-        From_fuse_to_assembly(top_fuse, bottom_fuse)
-        Top_pickup(Top)
-        From_top_cover_to_assembly()
-        Layoff_assembled_phone()
-        Move_home()
+        cell_timings.record("call", "robodk.initialize", start)
+        try:
+            cycle_time = program_executor.run(Compile_variant(*Order_variant(order)), set_stage)
+            cycle_times.append(cycle_time)
+            print(f"Cycle time: {cycle_time:.2f} s")
+        finally:
+            stock_monitor.resume() # a failed step must not leave the poller paused
+        return "Assembled"
     else:
         print("Items not in stock")
-    
+        return "Items not in stock"
 
 # Fixture code (Missing implementation)
 def Check_stock(Top, Bottom) -> list[int]:
-    HOST = "192.168.1.184"
-    PORT = 502
-    with ModbusTcpClient(host=HOST, port=PORT) as client:
-
-        client.connect()
-        resultTop = client.read_holding_registers(address=Top, count=2, slave=255)
-        print(resultTop.registers[0])
-        resultBottom = client.read_holding_registers(address=Bottom, count=2, slave=255)
-        print(resultBottom.registers[0])
-        resultPCB = client.read_holding_registers(address=0, count=2, slave=255)
-        print(resultPCB.registers[0])
-        return [resultTop.registers[0], resultBottom.registers[0], resultPCB.registers[0]]
+    inventory = stock_monitor.snapshot() # from memory while the snapshot is fresh, else one read of all registers
+    return [inventory.slots[Top], inventory.slots[Bottom], inventory.slots[PCB_SLOT]]
+
+def Prefetch_stock() -> None:
+    """Reads the stock into the snapshot, so the next order checks it from memory."""
+    try:
+        stock_monitor.refresh()
+    except FixtureError as exc:
+        print("Stock prefetch failed:", exc) # the next order reads the stock again
 
 # LED Function
 def Drill_LED(LED_DRILL):
-    HOST = "192.168.1.184"
-    PORT = 502
-    with ModbusTcpClient(host=HOST, port=PORT) as client:
-        client.connect()
-        client.write_register(address=7, value=LED_DRILL, slave=255)
+    fixture.write_register(7, LED_DRILL)
 
 ### -------- Functions for moving the UR5 -------- ###
 def Initialize_robot(linear_speed: int, joint_speed: int) -> None:
     """Start the UR5 in mode: '6'. This will make it possible to move the real robot from the PC (PC is the client, the robot behaves like a server). \n 
     Then sets linear speed and joint speed of the UR5.\n
     Parameters: (linear_speed, joint_speed)"""
-    RDK.setRunMode(6)
+    cell.start_run()
     robot.setSpeed(linear_speed)
     robot.setSpeedJoints(joint_speed)
     robot.setAcceleration(2000)
     robot.setAccelerationJoints(600)
 
-def Move_home() -> None:
-    """Moves to starting position above assembly station.\n
+def Check_gripper() -> None:
+    """Checks a gripper state polled after the last gripper move finished: the move reached its target and no finger
+    fault is present. Waits at most GRIPPER_READY_TIMEOUT seconds for that sample. Nothing is checked when telemetry is not running.\n
+    Raises GripperNotReady, so the job fails with the state of the gripper as its error.\n
     Parameters: None"""
-    robot.MoveJ(RDK.Item("AboveAssemblyBottomCover"))
-
-def Grasp(width: int, speed: int) -> None:
-    """Uses grasp function from wsg50 library.\n
-    Parameters: (width: int, speed: int)"""
-    time.sleep(0.01)
-    wsg50_instance.grasp_part(width, speed)
-    time.sleep(0.01)
-
-def Release(width: int, speed: int):
-    """Uses release function from wsg50 library.\n
-    Parameters: (width: int, speed: int)"""
-    time.sleep(0.01)
-    wsg50_instance.release_part(width, speed)
-    time.sleep(0.01)
-
-def Bottom_pickup(Bottom: str) -> None:
+    if telemetry_rate <= 0:
+        return
+    sample = wsg50_instance.fresh_sample(timeout=gripper_ready_timeout)
+    if sample is None:
+        raise GripperNotReady(f"no gripper state polled within {gripper_ready_timeout} s after the last move")
+    if not sample.ready(max_age=gripper_ready_timeout + 5 / telemetry_rate):
+        raise GripperNotReady(f"gripper state {sample.states}")
+
+def Move_home(program: ProgramBuilder) -> None:
+    """Moves to starting position above assembly station.\n
+    Parameters: (program: ProgramBuilder)"""
+    program.movej("AboveAssemblyBottomCover")
+
+def Bottom_pickup(program: ProgramBuilder, Bottom: str) -> None:
     """Picks up the bottom cover, depending on the color input, cooming from the GUI.\n
-    Parameters: (Bottom: str)"""
+    Parameters: (program: ProgramBuilder, Bottom: str)"""
     match Bottom:
         case 'White':
-            robot.setPoseFrame(RDK.Item("Frame 5"))
+            program.frame("Frame 5")
         case 'Blue':
-            robot.setPoseFrame(RDK.Item("Frame 4"))
+            program.frame("Frame 4")
         case 'Black':
-            robot.setPoseFrame(RDK.Item("Frame 3"))
-    robot.MoveL(RDK.Item("Bottom Cover 1"))
-    robot.MoveL(RDK.Item("Bottom Cover 2"))
-    Grasp(68, gripSpeed)
-    robot.MoveL(RDK.Item("Bottom Cover 1"))
-
-def Hole_drill(top_holes: bool, bottom_holes: bool) -> int:
+            program.frame("Frame 3")
+    program.movel("Bottom Cover 1")
+    program.sync() # the fingers are clear of the last part above the stack
+    program.preposition(68 + graspClearance, gripSpeed, wait=False) # close in on the part during the approach
+    program.movel("Bottom Cover 2")
+    program.grasp(68, gripSpeed)
+    program.movel("Bottom Cover 1")
+
+def Hole_drill(program: ProgramBuilder, top_holes: bool, bottom_holes: bool) -> int:
     """Drills the correct amount of holes in the bottom cover depended on values top_holes and bottom_holes\n
-    Parameters: (top_holes: bool, bottom_holes: bool)"""
+    Parameters: (program: ProgramBuilder, top_holes: bool, bottom_holes: bool)"""
     if top_holes and bottom_holes: # Drills 4 holes
-        robot.setPoseFrame(RDK.Item("FrameDrilling"))
-        robot.MoveL(RDK.Item("Approach_Exit_Drilling"))
-        robot.MoveL(RDK.Item("BeforeDrilling"))
-        robot.MoveL(RDK.Item("Drilling"))
-        Drill_LED(1)
-        time.sleep(drillTime)
-        Drill_LED(0)
-        robot.MoveL(RDK.Item("BeforeDrilling"))
-        robot.MoveJ(RDK.Item("AboveBottomCover180"))
-        robot.MoveL(RDK.Item("DetachBottomCover180"))
-        Release(80, gripSpeed)
-        robot.MoveL(RDK.Item("DetachOffset"))
-        Grasp(69, gripSpeed)
-        robot.MoveJ(RDK.Item("AboveBottomCover180"))
-        robot.MoveL(RDK.Item("Drilling180"))
-        Drill_LED(1)
-        time.sleep(drillTime)
-        Drill_LED(0)
-        robot.MoveL(RDK.Item("BeforeDrilling180"))
-        robot.MoveJ(RDK.Item("Approach_Exit_Drilling"))
+        program.frame("FrameDrilling")
+        program.movel("Approach_Exit_Drilling")
+        program.movel("BeforeDrilling")
+        program.movel("Drilling")
+        program.drill_led(1)
+        program.dwell(drillTime)
+        program.drill_led(0)
+        program.movel("BeforeDrilling")
+        program.movej("AboveBottomCover180")
+        program.movel("DetachBottomCover180")
+        program.release(80, gripSpeed)
+        program.movel("DetachOffset")
+        program.grasp(69, gripSpeed)
+        program.movej("AboveBottomCover180")
+        program.movel("Drilling180")
+        program.drill_led(1)
+        program.dwell(drillTime)
+        program.drill_led(0)
+        program.movel("BeforeDrilling180")
+        program.movej("Approach_Exit_Drilling")
         return 1
     elif top_holes: # Drills 2 holes in the top of the bottom cover
-        robot.setPoseFrame(RDK.Item("FrameDrilling"))
-        robot.MoveL(RDK.Item("Approach_Exit_Drilling"))
-        robot.MoveL(RDK.Item("BeforeDrilling"))
-        robot.MoveL(RDK.Item("Drilling"))
-        Drill_LED(1)
-        time.sleep(drillTime)
-        Drill_LED(0)
-        robot.MoveL(RDK.Item("BeforeDrilling"))
-        robot.MoveL(RDK.Item("Approach_Exit_Drilling"))
+        program.frame("FrameDrilling")
+        program.movel("Approach_Exit_Drilling")
+        program.movel("BeforeDrilling")
+        program.movel("Drilling")
+        program.drill_led(1)
+        program.dwell(drillTime)
+        program.drill_led(0)
+        program.movel("BeforeDrilling")
+        program.movel("Approach_Exit_Drilling")
         return 0
     elif bottom_holes: # Drills 2 holes in the bottom of the bottom cover
-        robot.setPoseFrame(RDK.Item("FrameDrilling"))
-        robot.MoveL(RDK.Item("Approach_Exit_Drilling"))
-        robot.MoveJ(RDK.Item("DetachBottomCover180"))
-        Release(80, gripSpeed)
-        robot.MoveL(RDK.Item("DetachOffset"))
-        Grasp(69, gripSpeed)
-        robot.MoveJ(RDK.Item("AboveBottomCover180"))
-        robot.MoveL(RDK.Item("BeforeDrilling180"))
-        robot.MoveL(RDK.Item("Drilling180"))
-        Drill_LED(1)
-        time.sleep(drillTime)
-        Drill_LED(0)
-        robot.MoveL(RDK.Item("BeforeDrilling180"))
-        robot.MoveJ(RDK.Item("Approach_Exit_Drilling"))
-        return 1    
+        program.frame("FrameDrilling")
+        program.movel("Approach_Exit_Drilling")
+        program.movej("DetachBottomCover180")
+        program.release(80, gripSpeed)
+        program.movel("DetachOffset")
+        program.grasp(69, gripSpeed)
+        program.movej("AboveBottomCover180")
+        program.movel("BeforeDrilling180")
+        program.movel("Drilling180")
+        program.drill_led(1)
+        program.dwell(drillTime)
+        program.drill_led(0)
+        program.movel("BeforeDrilling180")
+        program.movej("Approach_Exit_Drilling")
+        return 1
     else:
         return 0       
 
-def From_drill_to_assembly(Offset1: int) -> None:
+def From_drill_to_assembly(program: ProgramBuilder, Offset1: int) -> None:
     """Desides the path from drill to assembly in relation to offset1, if the bottom cover was offset when drilling holes in the bottom.\n
-    Parameters: (Offset1: int)"""
-    print("From drill to assembly")
+    Parameters: (program: ProgramBuilder, Offset1: int)"""
     match Offset1:
         case 0: # Path without offset
-            print("Path without offset")
-            robot.setPoseFrame(RDK.Item("Universal frame"))
-            robot.MoveJ(RDK.Item("AboveAssemblyBottomCover"))
-            robot.MoveL(RDK.Item("AssemblyBottomCover"))
-            Release(80, gripSpeed)
-            robot.MoveL(RDK.Item("AboveAssemblyBottomCover"))
+            program.frame("Universal frame")
+            program.movej("AboveAssemblyBottomCover")
+            program.movel("AssemblyBottomCover")
+            program.release(80, gripSpeed)
+            program.movel("AboveAssemblyBottomCover")
         case 1: # Path with offset
-            print("Path without offset")
-            robot.setPoseFrame(RDK.Item("Universal frame"))
-            robot.MoveJ(RDK.Item("AboveAssemblyBottomCoverOffset"))
-            robot.MoveL(RDK.Item("AssemblyBottomCoverOffset"))
-            Release(80, gripSpeed)
-            robot.MoveL(RDK.Item("AboveAssemblyBottomCoverOffset"))
-    Offset1 = 0
-
-def PCB_pickup() -> None:
-    """Picks up the PCB.\n
-    Parameters: None"""
-    robot.setPoseFrame(RDK.Item("FramePCB"))
-    robot.MoveL(RDK.Item("PCB 1"))
-    robot.MoveL(RDK.Item("PCB 2"))
-    Grasp(52, gripSpeed)
-    robot.MoveL(RDK.Item("PCB 1"))
+            program.frame("Universal frame")
+            program.movej("AboveAssemblyBottomCoverOffset")
+            program.movel("AssemblyBottomCoverOffset")
+            program.release(80, gripSpeed)
+            program.movel("AboveAssemblyBottomCoverOffset")
 
-def Fuse_pickup(top_fuse: bool, bottom_fuse: bool) -> None:
+def PCB_pickup(program: ProgramBuilder) -> None:
+    """Picks up the PCB.\n
+    Parameters: (program: ProgramBuilder)"""
+    program.frame("FramePCB")
+    program.movel("PCB 1")
+    program.sync() # the fingers are clear of the last part above the stack
+    program.preposition(52 + graspClearance, gripSpeed, wait=False) # close in on the part during the approach
+    program.movel("PCB 2")
+    program.grasp(52, gripSpeed)
+    program.movel("PCB 1")
+
+def Fuse_pickup(program: ProgramBuilder, top_fuse: bool, bottom_fuse: bool) -> None:
     """Picks up the the ordered amount of fuses depending on values top_fuse and bottom_fuse.\n
-    Parameters: (top_fuse: bool, bottom_fuse: bool)"""
-    robot.setPoseFrame(RDK.Item("Universal Frame"))
-    robot.MoveL(RDK.Item("BetweenFuseAndAssembly"))
+    Parameters: (program: ProgramBuilder, top_fuse: bool, bottom_fuse: bool)"""
+    program.frame("Universal frame")
+    program.movel("BetweenFuseAndAssembly")
     if top_fuse and bottom_fuse: # Picks up both fuses
-        robot.setPoseFrame(RDK.Item("FrameFuse"))
-        robot.MoveL(RDK.Item("Top Fuse Approach & Exit"))
-        robot.setSpeed(200)
-        robot.MoveL(RDK.Item("Top Fuse"))
+        program.frame("FrameFuse")
+        program.movel("Top Fuse Approach & Exit")
+        program.speed(200)
+        program.movel("Top Fuse")
         #pickup <----
-        robot.MoveL(RDK.Item("Top Fuse Approach & Exit"))
-        robot.MoveL(RDK.Item("Bottom Fuse Approach & Exit"))
-        robot.MoveL(RDK.Item("Bottom Fuse"))
+        program.movel("Top Fuse Approach & Exit")
+        program.movel("Bottom Fuse Approach & Exit")
+        program.movel("Bottom Fuse")
         #pickup <----
-        robot.MoveL(RDK.Item("Bottom Fuse Approach & Exit"))
+        program.movel("Bottom Fuse Approach & Exit")
     elif top_fuse: # Picks up top fuse
-        robot.setPoseFrame(RDK.Item("FrameFuse"))
-        robot.MoveL(RDK.Item("Top Fuse Approach & Exit"))
-        robot.setSpeed(200)
-        robot.MoveL(RDK.Item("Top Fuse"))
+        program.frame("FrameFuse")
+        program.movel("Top Fuse Approach & Exit")
+        program.speed(200)
+        program.movel("Top Fuse")
         #pickup <----
-        robot.MoveL(RDK.Item("Top Fuse Approach & Exit"))
+        program.movel("Top Fuse Approach & Exit")
     elif bottom_fuse: # Picks up bottom fuse
-        robot.setPoseFrame(RDK.Item("FrameFuse"))
-        robot.MoveL(RDK.Item("Bottom Fuse Approach & Exit"))
-        robot.setSpeed(200)
-        robot.MoveL(RDK.Item("Bottom Fuse"))
+        program.frame("FrameFuse")
+        program.movel("Bottom Fuse Approach & Exit")
+        program.speed(200)
+        program.movel("Bottom Fuse")
         #pickup <----
-        robot.MoveL(RDK.Item("Bottom Fuse Approach & Exit"))
-    robot.setSpeed(linear_speed)
+        program.movel("Bottom Fuse Approach & Exit")
+    program.speed(linear_speed)
 
-def From_fuse_to_assembly(top_fuse: bool, bottom_fuse: bool) -> None:
+def From_fuse_to_assembly(program: ProgramBuilder, top_fuse: bool, bottom_fuse: bool) -> None:
     """Takes the path from fuse to assembly depended on the values top_fuse and bottom_fuse.\n
-    Parameters: (top_fuse: bool, bottom_fuse: bool)"""
-    robot.setPoseFrame(RDK.Item("Universal frame"))
+    Parameters: (program: ProgramBuilder, top_fuse: bool, bottom_fuse: bool)"""
+    program.frame("Universal frame")
     if top_fuse or bottom_fuse: # Goes to target always, unless no fuses were picked up
-        robot.MoveL(RDK.Item("BetweenFuseAndAssembly"))
-    robot.MoveJ(RDK.Item("AboveAssemblyPCB"))
-    robot.MoveL(RDK.Item("AssemblyPCB"))
-    Release(80, gripSpeed)
-    robot.MoveL(RDK.Item("AboveAssemblyPCB"))
+        program.movel("BetweenFuseAndAssembly")
+    program.movej("AboveAssemblyPCB")
+    program.movel("AssemblyPCB")
+    program.release(80, gripSpeed)
+    program.movel("AboveAssemblyPCB")
 
-def Top_pickup(Top: str) -> None:
+def Top_pickup(program: ProgramBuilder, Top: str) -> None:
     """Picks up the top cover, depending on the ordered color input in the GUI.\n
-    Parameters: (Top: str)"""
-    robot.setPoseFrame(RDK.Item("Universal frame"))
-    robot.MoveJ(RDK.Item("BetweenTopCoverAndAssembly"))
+    Parameters: (program: ProgramBuilder, Top: str)"""
+    program.frame("Universal frame")
+    program.movej("BetweenTopCoverAndAssembly")
     match Top:
         case 'White':
-            robot.setPoseFrame(RDK.Item("Frame 8"))
+            program.frame("Frame 8")
         case 'Blue':
-            robot.setPoseFrame(RDK.Item("Frame 7"))
+            program.frame("Frame 7")
         case 'Black':
-            robot.setPoseFrame(RDK.Item("Frame 6"))
-    robot.MoveL(RDK.Item("Bottom Cover 1"))
-    robot.MoveL(RDK.Item("Bottom Cover 2"))
-    Grasp(68, gripSpeed)
-    robot.MoveL(RDK.Item("Bottom Cover 1"))
-
-def From_top_cover_to_assembly() -> None:
+            program.frame("Frame 6")
+    program.movel("Bottom Cover 1")
+    program.sync() # the fingers are clear of the last part above the stack
+    program.preposition(68 + graspClearance, gripSpeed, wait=False) # close in on the part during the approach
+    program.movel("Bottom Cover 2")
+    program.grasp(68, gripSpeed)
+    program.movel("Bottom Cover 1")
+
+def From_top_cover_to_assembly(program: ProgramBuilder) -> None:
     """Takes the path from top cover to assembly.\n
-    Parameters: None"""
-    robot.setPoseFrame(RDK.Item("Universal frame"))
-    robot.MoveJ(RDK.Item("BetweenTopCoverAndAssembly"))
-    robot.MoveJ(RDK.Item("TopCoverAboveAssembly"))
-    robot.MoveL(RDK.Item("TopCoverAssembly"))
-    Release(80, gripSpeed)
-    robot.MoveL(RDK.Item("TopCoverAboveAssembly"))
-    wsg50_instance.preposition_gripper(40, gripSpeed)
-    robot.MoveL(RDK.Item("PushPhone"))
-    robot.MoveL(RDK.Item("TopCoverAboveAssembly"))
-    wsg50_instance.preposition_gripper(80, gripSpeed)
-    robot.MoveL(RDK.Item("TopCoverAssembly"))
-    Grasp(69, gripSpeed)
-    robot.MoveL(RDK.Item("TopCoverAboveAssembly"))
-
-
-
-
-
-
-
-def Layoff_assembled_phone() -> None:
+    Parameters: (program: ProgramBuilder)"""
+    program.frame("Universal frame")
+    program.movej("BetweenTopCoverAndAssembly")
+    program.movej("TopCoverAboveAssembly")
+    program.movel("TopCoverAssembly")
+    program.release(80, gripSpeed)
+    program.movel("TopCoverAboveAssembly")
+    program.preposition(40, gripSpeed) # the fingers are still around the top cover until here, so this one can not overlap
+    program.movel("PushPhone")
+    program.sync() # the phone is pushed with the closed fingers
+    program.preposition(80, gripSpeed, wait=False) # open the gripper while moving up from the phone
+    program.movel("TopCoverAboveAssembly")
+    program.gripper_wait()
+    program.movel("TopCoverAssembly")
+    program.grasp(69, gripSpeed)
+    program.movel("TopCoverAboveAssembly")
+
+def Layoff_assembled_phone(program: ProgramBuilder) -> None:
     """Takes the path to lay down the assembled phone in position to be removed.\n
-    Parameters: None"""
-    robot.setPoseFrame(RDK.Item("Universal frame"))
-    robot.MoveJ(RDK.Item("AssembledPhoneLayoff"))
-    Release(80, gripSpeed)
-    robot.MoveJ(RDK.Item("AboveAssembledPhone"))
-
-
+    Parameters: (program: ProgramBuilder)"""
+    program.frame("Universal frame")
+    program.movej("AssembledPhoneLayoff")
+    program.release(80, gripSpeed)
+    program.movej("AboveAssembledPhone")
+
+
+#Every variant is compiled and checked against the station once at startup, so a stage that uses an unknown name fails here
+for variant in All_variants():
+    unknown = Compile_variant(*variant).validate(items)
+    if unknown:
+        raise MissingItemError(f"Program of {variant} uses unregistered items: {unknown}")
+program_executor = ProgramExecutor(robot, items, wsg50_instance, Drill_LED, sleep=cell.sleep, hooks={
+    "pause_stock_poller": stock_monitor.pause,
+    "resume_stock_poller": stock_monitor.resume,
+    "stock_taken": stock_monitor.invalidate,
+    "prefetch_stock": Prefetch_stock,
+}, pipelined=pipelined_moves, timings=cell_timings)
+
+#Orders are queued and run one at a time by a single worker, so two requests never drive the cell at the same time.
+#Every job is stored in ORDER_DB, so queued orders survive a restart. ORDER_DB_SYNC=full fsyncs every batch of writes
+order_store = OrderStore(os.environ.get('ORDER_DB', 'orders.db'), sync=os.environ.get('ORDER_DB_SYNC', 'normal'))
+sequencing_model = SequencingModel()
+order_queue = JobQueue(maxsize=int(os.environ.get('ORDER_QUEUE_SIZE', 32)), store=order_store,
+                       save_timeout=float(os.environ.get('ORDER_DB_TIMEOUT', 5.0)))
+for job in order_queue.restore(lambda stored: Order(**stored)):
+    print("Needs review:", job.id, job.error)
+cell_worker = CellWorker(order_queue, Assemble_order)
+cell_worker.start()
@@ -0,0 +1,179 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import json
+import sqlite3
+import threading
+import traceback
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+# PRAGMA synchronous per sync mode: 'full' fsyncs every batch, 'normal' fsyncs the WAL at checkpoints only
+# (a power loss can lose the last batches, a crash of the service can not), 'off' leaves it to the OS
+SYNC_MODES = {'full': 'FULL', 'normal': 'NORMAL', 'off': 'OFF'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    seq INTEGER NOT NULL,
+    order_json TEXT NOT NULL,
+    state TEXT NOT NULL,
+    stage TEXT,
+    result TEXT,
+    error TEXT,
+    submitted REAL,
+    started REAL,
+    finished REAL
+)
+"""
+RETRY_INTERVAL = 1.0 # seconds between attempts to write a batch that failed
+COLUMNS = ('id', 'seq', 'order_json', 'state', 'stage', 'result', 'error', 'submitted', 'started', 'finished')
+UPSERT = f"INSERT OR REPLACE INTO jobs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+
+def _order_dict(order) -> dict:
+    return order if isinstance(order, dict) else dict(order) # pydantic models iterate as (field, value) pairs
+
+
+class OrderStore():
+    """SQLite record of every job, written in batches by a background thread so a burst of submissions
+    costs one transaction instead of one fsync per order. Only the newest state of a job in a batch is written.
+
+    Args:
+        path (str): Database file.
+        sync (str, optional): 'full', 'normal' or 'off', see SYNC_MODES. Defaults to 'normal'.
+        flush_interval (float, optional): Extra seconds to gather writes before a batch is committed.
+            Writes that arrive while a batch is being committed always go into the next one. Defaults to 0.
+        batch_size (int, optional): Commit at once when this many jobs are waiting. Defaults to 500.
+    """
+
+    def __init__(self, path: str, sync: str = 'normal', flush_interval: float = 0.0, batch_size: int = 500):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._db = sqlite3.connect(path, check_same_thread=False) # only the writer thread uses it after load
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(f'PRAGMA synchronous={SYNC_MODES[sync]}')
+        self._db.execute(SCHEMA)
+        self._db.commit()
+        self._seq = self._db.execute('SELECT COALESCE(MAX(seq), 0) FROM jobs').fetchone()[0]
+        self._pending = {} # job id -> row of the newest state that is not written yet
+        self._flushed = threading.Event() # replaced by every batch, set once the batch is committed
+        self._inflight = None # event of the batch that is being written
+        lock = threading.RLock()
+        self._condition = threading.Condition(lock) # wakes the writer
+        self._written = threading.Condition(lock) # wakes wait_saved after every batch
+        self._closed = False
+        self.error = None # sqlite3.Error of the last batch, None once a batch is committed again
+        self._writer = threading.Thread(target=self._write_loop, name='order-store', daemon=True)
+        self._writer.start()
+
+    def load(self) -> list[dict]:
+        """Returns every stored job as a dict, in submission order. Call it before anything is saved."""
+
+        cursor = self._db.execute(f"SELECT {', '.join(COLUMNS)} FROM jobs ORDER BY seq")
+        jobs = []
+        for row in cursor:
+            job = dict(zip(COLUMNS, row))
+            job['order'] = json.loads(job.pop('order_json'))
+            jobs.append(job)
+        return jobs
+
+    def save(self, job) -> threading.Event:
+        """Queues the current state of a job for the next batch.
+
+        Returns:
+            threading.Event: Set once the batch holding this state is committed.
+        """
+
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('order store is closed')
+            seq = getattr(job, 'seq', None)
+            if seq is None:
+                self._seq += 1
+                seq = job.seq = self._seq
+            self._pending[job.id] = (job.id, seq, json.dumps(_order_dict(job.order)), job.state, job.stage,
+                                     job.result, job.error, job.submitted, job.started, job.finished)
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._condition.notify()
+            return self._flushed
+
+    def wait_saved(self, saved: threading.Event, timeout: float = None) -> bool:
+        """Waits until the batch of an event returned by save is committed, giving up early when a write fails.
+
+        Args:
+            saved (threading.Event): Event returned by save.
+            timeout (float, optional): Seconds to wait. Defaults to None, no limit.
+
+        Returns:
+            bool: True if the batch is committed, False on timeout or a failed write.
+        """
+
+        with self._condition:
+            self._written.wait_for(lambda: saved.is_set() or self.error is not None, timeout)
+            return saved.is_set()
+
+    def flush(self, timeout: float = None) -> bool:
+        """Waits until everything saved so far is committed."""
+
+        with self._condition:
+            flushed = self._flushed if self._pending else self._inflight
+            self._condition.notify()
+        return flushed is None or flushed.wait(timeout)
+
+    def close(self, timeout: float = 10.0) -> bool:
+        """Writes the remaining batch and closes the database. If the batch can not be written, it is given up
+        after one more attempt and error tells why.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the writer. Defaults to 10.0.
+
+        Returns:
+            bool: True if everything saved was committed.
+        """
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._writer.join(timeout)
+        if self._writer.is_alive():
+            return False # still inside a write, the connection is left to it
+        self._db.close()
+        return not self._pending and self.error is None
+
+    def _write_loop(self) -> None:
+        waiting = [] # events of batches that are not committed yet
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if self.flush_interval > 0 and not self._closed and len(self._pending) < self.batch_size:
+                    # group commit: give a burst a moment to gather into the same transaction
+                    self._condition.wait_for(lambda: len(self._pending) >= self.batch_size or self._closed,
+                                             self.flush_interval)
+                rows = list(self._pending.values())
+                self._pending = {}
+                waiting.append(self._flushed)
+                self._inflight, self._flushed = self._flushed, threading.Event()
+                closed = self._closed
+            try:
+                with self._db:
+                    self._db.executemany(UPSERT, rows)
+            except sqlite3.Error as exc:
+                traceback.print_exc()
+                with self._condition: # retry with the next batch, unless the job was saved again since
+                    self.error = exc
+                    for row in rows:
+                        self._pending.setdefault(row[0], row)
+                    self._written.notify_all()
+                    if closed:
+                        return # closing, a database that fails now is not going to recover in time
+                    self._condition.wait_for(lambda: self._closed, RETRY_INTERVAL) # close retries at once
+                continue
+            with self._condition:
+                self.error = None
+                for flushed in waiting:
+                    flushed.set()
+                self._written.notify_all()
+            waiting = []
+            if closed:
+                with self._condition:
+                    if not self._pending:
+                        return
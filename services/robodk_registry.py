@@ -0,0 +1,83 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import difflib
+import threading
+
+
+class MissingItemError(Exception):
+    """Raised when names used by the program do not exist in the RoboDK station."""
+
+
+class ItemRegistry():
+    """Resolves every named RoboDK item the program uses once, so moves use stored handles instead of asking
+    RoboDK for an item by name at every move. All names are checked at once and every missing one is reported,
+    with the names in the station that look like it. When the active station changes, the items are resolved again.
+
+    Args:
+        RDK (robolink.Robolink): Connection to RoboDK.
+        targets (iterable, optional): Names of targets. Defaults to none.
+        frames (iterable, optional): Names of reference frames. Defaults to none.
+        robots (iterable, optional): Names of robots. Defaults to none.
+    """
+
+    def __init__(self, RDK, targets=(), frames=(), robots=()):
+        from robodk import robolink # imported here, so MissingItemError can be used without the RoboDK package
+
+        self.RDK = RDK
+        self.types = {}
+        for names, item_type in ((targets, robolink.ITEM_TYPE_TARGET), (frames, robolink.ITEM_TYPE_FRAME),
+                                 (robots, robolink.ITEM_TYPE_ROBOT)):
+            for name in names:
+                self.types[name] = item_type
+        self.station = None
+        self.refreshes = 0
+        self._items = {}
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Resolves every name again.
+
+        Raises:
+            MissingItemError: If any name is not an item of its type in the station.
+        """
+
+        with self._lock:
+            items = {}
+            missing = []
+            for name, item_type in self.types.items():
+                item = self.RDK.Item(name, item_type)
+                if item.Valid():
+                    items[name] = item
+                else:
+                    missing.append(name)
+            if missing:
+                raise MissingItemError('Not in the RoboDK station: ' + '; '.join(self._describe(name) for name in missing))
+            self._items = items
+            self.station = self.RDK.ActiveStation()
+            self.refreshes += 1
+
+    def _describe(self, name: str) -> str:
+        station_names = self.RDK.ItemList(self.types[name], True)
+        similar = difflib.get_close_matches(name, station_names, n=3, cutoff=0.6)
+        return f'"{name}"' + (f' (did you mean {", ".join(repr(s) for s in similar)}?)' if similar else '')
+
+    def ensure_current(self) -> bool:
+        """Resolves the items again if another station was opened since the last refresh. One call to RoboDK.
+
+        Returns:
+            bool: True if the items were resolved again.
+        """
+
+        if self.RDK.ActiveStation() == self.station:
+            return False
+        self.refresh()
+        return True
+
+    def __getitem__(self, name: str):
+        try:
+            return self._items[name]
+        except KeyError:
+            raise MissingItemError(f'"{name}" is not registered, add it to the names given to the registry') from None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._items
@@ -0,0 +1,21 @@
+import json
+import sys
+
+from cell_backend import DEFAULT_MOVE_TIMES, INSTANT, REPOSITORY_ROOT, SimulatedRobot
+
+
+def test_simulated_robot_with_a_station_file(tmp_path, monkeypatch):
+    # started from services/ like the order service, kinematics_ur5 in the root is not importable by itself
+    monkeypatch.setattr(sys, 'path', [path for path in sys.path if path not in ('', str(REPOSITORY_ROOT))])
+    monkeypatch.delitem(sys.modules, 'kinematics_ur5', raising=False)
+    station_file = tmp_path / 'station.json'
+    station_file.write_text(json.dumps({'Home': [0, -90, 90, -90, -90, 0], 'Pick': [30, -70, 80, -100, -90, 30]}))
+    with open(station_file) as file:
+        robot = SimulatedRobot(json.load(file), speedup=INSTANT)
+
+    robot.MoveJ('Home')
+    robot.MoveJ('Pick')
+    robot.MoveL('Home')
+    kinematic_time = robot.motion_time - DEFAULT_MOVE_TIMES['MoveJ'] # the first move starts from no known target
+    assert robot.moves == 3
+    assert 0 < kinematic_time and kinematic_time != DEFAULT_MOVE_TIMES['MoveJ'] + DEFAULT_MOVE_TIMES['MoveL']
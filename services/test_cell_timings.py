@@ -0,0 +1,45 @@
+import threading
+
+from cell_timings import CellTimings, clock
+
+VARIANT = (('top', 'black'), ('bottom', 'white'))
+LABELS = ('top', 'bottom')
+
+
+def test_variant_only_labels_the_thread_that_set_it():
+    timings = CellTimings(variant_labels=LABELS)
+    timings.variant = VARIANT
+
+    def poll_stock():
+        timings.record('call', 'modbus.read', clock())
+
+    poller = threading.Thread(target=poll_stock)
+    poller.start()
+    poller.join()
+    timings.record('call', 'robodk.movel', clock())
+
+    metrics = timings.prometheus()
+    assert 'cell_call_seconds_count{call="modbus.read",top="",bottom=""} 1' in metrics
+    assert 'cell_call_seconds_count{call="robodk.movel",top="black",bottom="white"} 1' in metrics
+
+
+def test_variant_is_cleared_between_orders():
+    timings = CellTimings(variant_labels=LABELS)
+    timings.variant = VARIANT
+    timings.record('order', 'Assembled', clock())
+    timings.variant = ()
+    timings.record('call', 'modbus.read', clock())
+    assert timings.variant == ()
+    assert 'cell_call_seconds_count{call="modbus.read",top="",bottom=""} 1' in timings.prometheus()
+
+
+def test_every_series_of_a_metric_has_the_same_label_keys():
+    timings = CellTimings(variant_labels=LABELS)
+    timings.record('call', 'modbus.read', clock())
+    timings.variant = VARIANT
+    timings.record('call', 'modbus.read', clock())
+    keys = set()
+    for line in timings.prometheus().splitlines():
+        if line.startswith('cell_call_seconds_bucket'):
+            keys.add(tuple(pair.split('=')[0] for pair in line[line.index('{') + 1:line.index('}')].split(',')))
+    assert keys == {('call', 'top', 'bottom', 'le')}
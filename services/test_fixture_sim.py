@@ -0,0 +1,38 @@
+from pymodbus.client import ModbusTcpClient
+
+from fixture_client import FixtureClient
+from fixture_inventory import DRILL_LED_REGISTER
+from fixture_sim import FixtureSimulator, FixtureSimConfig, ILLEGAL_FUNCTION
+
+
+def connect(simulator):
+    host, port = simulator.start_in_thread()
+    client = ModbusTcpClient(host, port=port)
+    assert client.connect()
+    return client
+
+
+def test_client_reads_the_stock_and_writes_the_drill_led():
+    simulator = FixtureSimulator(FixtureSimConfig(stock={0: 1}))
+    fixture = FixtureClient(*simulator.start_in_thread())
+    assert fixture.read_registers(0, 2) == [1, 0]
+    fixture.write_register(DRILL_LED_REGISTER, 1)
+    assert simulator.registers[DRILL_LED_REGISTER] == 1
+    fixture.close()
+
+
+def test_write_multiple_registers_is_refused_like_the_firmware():
+    simulator = FixtureSimulator()
+    client = connect(simulator)
+    response = client.write_registers(DRILL_LED_REGISTER, [1])
+    assert response.isError() and response.exception_code == ILLEGAL_FUNCTION
+    assert simulator.writes == []
+    client.close()
+
+
+def test_write_multiple_registers_can_be_switched_on():
+    simulator = FixtureSimulator(FixtureSimConfig(write_multiple=True))
+    client = connect(simulator)
+    assert not client.write_registers(DRILL_LED_REGISTER, [1]).isError()
+    assert simulator.registers[DRILL_LED_REGISTER] == 1
+    client.close()
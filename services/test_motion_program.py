@@ -0,0 +1,68 @@
+import time
+
+from cell_backend import INSTANT, NameRegistry, SimulatedRobot
+from motion_program import ProgramBuilder, ProgramExecutor
+from order_jobs import JobQueue, CellWorker, DONE, FAILED
+from wsg50_async import WSG50Thread
+from wsg50_codec import GRASP_ID, E_CMD_FAILED
+from wsg50_sim import WSG50Simulator, SimulatorConfig
+
+
+def pick_program():
+    program = ProgramBuilder()
+    program.stage('Pick')
+    program.frame('Fixture')
+    program.movej('Above_part')
+    program.preposition(74, 400, wait=False)
+    program.movel('Part')
+    program.grasp(68, 400)
+    program.movel('Above_part')
+    program.stage('Place')
+    program.movel('Assembly')
+    program.release(80, 400)
+    return program.build()
+
+
+def run_jobs(simulator, pipelined, orders=1):
+    program = pick_program()
+    gripper = WSG50Thread(*simulator.start_in_thread())
+    try:
+        names = program.names('frame') | program.names('movej') | program.names('movel')
+        executor = ProgramExecutor(SimulatedRobot(speedup=INSTANT), NameRegistry(names), gripper, drill_led=lambda value: None,
+                                   pipelined=pipelined)
+
+        def assemble(order, set_stage):
+            executor.run(program, set_stage)
+            return "Assembled"
+
+        jobs = JobQueue()
+        worker = CellWorker(jobs, assemble)
+        submitted = [jobs.submit({'order': n}) for n in range(orders)]
+        worker.start()
+        while any(job.finished is None for job in submitted):
+            time.sleep(0.01)
+        worker.stop()
+        return submitted
+    finally:
+        gripper.end_connection()
+
+
+def test_program_runs_on_the_simulated_cell():
+    job, = run_jobs(WSG50Simulator(SimulatorConfig(time_scale=1000.0)), pipelined=True)
+    assert job.state == DONE and job.result == "Assembled"
+
+
+def test_missed_grasp_fails_the_job():
+    for pipelined in (False, True):
+        simulator = WSG50Simulator(SimulatorConfig(time_scale=1000.0))
+        simulator.inject_fault(GRASP_ID, E_CMD_FAILED)
+        failed, next_order = run_jobs(simulator, pipelined, orders=2)
+        assert failed.state == FAILED and failed.result is None
+        assert failed.error == 'GripperCommandFailed: wsg50.grasp ended with E_CMD_FAILED'
+        assert failed.stage == 'Pick'
+        assert next_order.state == DONE
+
+
+def test_part_missing_between_the_fingers_fails_the_job():
+    job, = run_jobs(WSG50Simulator(SimulatorConfig(time_scale=1000.0, part_width=None)), pipelined=False)
+    assert job.state == FAILED and 'E_CMD_FAILED' in job.error
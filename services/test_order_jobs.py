@@ -0,0 +1,99 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from order_jobs import Job, JobQueue, StoreUnavailable, QueueFull, FAILED, QUEUED, REVIEW, RUNNING
+from order_store import OrderStore
+
+
+class FailingConnection():
+    """Stands in for the store's sqlite3 connection: every write raises, or blocks until released if hang is set."""
+
+    def __init__(self, hang=False):
+        self.hang = hang
+        self.released = threading.Event()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def executemany(self, sql, rows):
+        if self.hang:
+            self.released.wait()
+        raise sqlite3.OperationalError('disk I/O error')
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = OrderStore(str(tmp_path / 'orders.db'))
+    connection = store._db
+    yield store
+    if isinstance(store._db, FailingConnection):
+        store._db.released.set()
+    store._db = connection # the writer retries on the real database, so close can write the last batch
+    store.close()
+
+
+def test_submit_is_committed(store):
+    jobs = JobQueue(store=store)
+    job = jobs.submit({'top_color': 'black'})
+    assert job.state == QUEUED and len(jobs) == 1
+    assert [stored['id'] for stored in store.load()] == [job.id]
+
+
+def test_submit_fails_when_the_store_can_not_write(store):
+    jobs = JobQueue(store=store, save_timeout=2.0)
+    store._db = FailingConnection()
+    with pytest.raises(StoreUnavailable, match='disk I/O error'):
+        jobs.submit({'top_color': 'black'})
+    with pytest.raises(StoreUnavailable):
+        jobs.submit_many([{'top_color': 'white'}, {'top_color': 'blue'}])
+    assert len(jobs) == 0 and jobs.next_job(timeout=0) is None
+    assert all(job.state == FAILED and job.error.startswith('not stored') for job in jobs._jobs.values())
+
+
+def test_submit_times_out_when_the_store_hangs(store):
+    jobs = JobQueue(store=store, save_timeout=0.2)
+    store._db = FailingConnection(hang=True)
+    with pytest.raises(StoreUnavailable, match='no commit within'):
+        jobs.submit({'top_color': 'black'})
+    assert len(jobs) == 0
+
+
+def test_full_queue_is_not_a_store_error(store):
+    jobs = JobQueue(maxsize=1, store=store)
+    jobs.submit({'top_color': 'black'})
+    with pytest.raises(QueueFull):
+        jobs.submit({'top_color': 'white'})
+
+
+def test_close_gives_up_when_the_store_can_not_write(tmp_path):
+    store = OrderStore(str(tmp_path / 'orders.db'))
+    connection = store._db
+    store._db = FailingConnection()
+    jobs = JobQueue(store=store, durable=False)
+    jobs.submit({'top_color': 'black'})
+    started = time.monotonic()
+    assert store.close(timeout=5.0) is False
+    assert time.monotonic() - started < 2.0 and not store._writer.is_alive()
+    assert isinstance(store.error, sqlite3.OperationalError)
+    connection.close()
+
+
+def test_retry_respects_the_queue_size(store):
+    store.save(Job({'top_color': 'black'}, state=RUNNING, stage='Hole_drill'))
+    store.save(Job({'top_color': 'white'}, state=RUNNING, stage='Hole_drill'))
+    store.flush()
+    jobs = JobQueue(maxsize=1, store=store)
+    first, second = jobs.restore(dict)
+    assert jobs.retry(first.id) is first and len(jobs) == 1
+    with pytest.raises(QueueFull):
+        jobs.retry(second.id)
+    assert second.state == REVIEW and len(jobs) == 1
@@ -0,0 +1,38 @@
+from dataclasses import dataclass, replace
+
+from order_sequencing import SequencingModel, sequence_orders
+
+
+@dataclass(frozen=True)
+class Order():
+    top_color: str = 'Black'
+    bottom_color: str = 'Black'
+    top_fuse: bool = False
+    bottom_fuse: bool = False
+    top_hole: bool = False
+    bottom_hole: bool = True
+
+
+def test_arrival_order_is_kept_without_a_gain():
+    o = Order()
+    batch = [o, replace(o, top_color='White'), o, replace(o, bottom_hole=False)]
+    assert sequence_orders(batch, window=5) == [0, 1, 2, 3]
+
+
+def test_orders_are_grouped_when_it_saves_time():
+    o = Order()
+    white = replace(o, top_color='White', bottom_color='White', bottom_hole=False)
+    batch = [o, white, o, white]
+    sequence = sequence_orders(batch, window=5)
+    model = SequencingModel()
+    assert sequence == [0, 2, 1, 3]
+    assert model.sequence_time([batch[i] for i in sequence]) < model.sequence_time(batch)
+
+
+def test_no_order_runs_more_than_window_minus_one_places_late():
+    o = Order()
+    white = replace(o, top_color='White')
+    batch = [o, white, white, white, white, o, o, o]
+    sequence = sequence_orders(batch, window=3)
+    assert sorted(sequence) == list(range(len(batch)))
+    assert all(sequence.index(index) - index <= 2 for index in range(len(batch)))
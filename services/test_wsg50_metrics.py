@@ -0,0 +1,20 @@
+import json
+
+import wsg50
+from wsg50_codec import GRASP_ID
+from wsg50_metrics import GripperMetrics, LATENCY_BUCKETS
+from wsg50_sim import WSG50Simulator, SimulatorConfig
+
+
+def test_metrics_are_valid_json():
+    metrics = GripperMetrics()
+    gripper = wsg50.wsg50(*WSG50Simulator(SimulatorConfig(time_scale=100.0)).start_in_thread(), metrics=metrics)
+    gripper.preposition_gripper(80, 400)
+    metrics.sent(GRASP_ID, b'') # sent but not answered yet
+    exported = json.loads(json.dumps(metrics.as_dict(), allow_nan=False))
+
+    homing, grasp = exported['commands']['HOMING']['latency'], exported['commands']['GRASP']['latency']
+    assert homing['buckets'] == list(LATENCY_BUCKETS) + ['+Inf']
+    assert sum(homing['counts']) == 1 and 0 < homing['min'] <= homing['max']
+    assert grasp['min'] is None and grasp['max'] is None and grasp['mean'] is None
+    gripper.end_connection()
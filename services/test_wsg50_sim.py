@@ -0,0 +1,54 @@
+import asyncio
+
+import wsg50
+from wsg50_async import AsyncWSG50
+from wsg50_codec import HOMING_ID, PREPOSITION_ID, RELEASE_ID, E_SUCCESS, E_CMD_FAILED
+from wsg50_sim import WSG50Simulator, SimulatorConfig, E_ALREADY_RUNNING, E_AXIS_BLOCKED
+
+COALESCE_ALL = SimulatorConfig(coalesce_probability=1.0, time_scale=100.0, seed=1)
+
+
+def test_blocking_driver_disconnects_with_coalescing():
+    host, port = WSG50Simulator(COALESCE_ALL).start_in_thread()
+    for _ in range(3): # every connect homes and waits 0.5 s
+        gripper = wsg50.wsg50(host, port)
+        assert gripper.preposition_gripper(80, 400) == E_SUCCESS
+        gripper.end_connection() # raised ConnectionError when the DISCONNECT reply was held back
+
+
+def test_async_driver_disconnects_with_coalescing():
+    async def run():
+        simulator = WSG50Simulator(COALESCE_ALL)
+        host, port = await simulator.start()
+        try:
+            for _ in range(10):
+                gripper = await AsyncWSG50.connect(host, port)
+                assert await gripper.preposition(80, 400) == E_SUCCESS
+                assert await gripper.close() == E_SUCCESS
+        finally:
+            await simulator.close()
+
+    asyncio.run(run())
+
+
+def test_blocking_driver_returns_every_final_status():
+    simulator = WSG50Simulator(SimulatorConfig(time_scale=100.0, seed=1))
+    host, port = simulator.start_in_thread()
+    gripper = wsg50.wsg50(host, port)
+    for command_id, status, move in ((PREPOSITION_ID, E_AXIS_BLOCKED, lambda: gripper.preposition_gripper(80, 400)),
+                                     (RELEASE_ID, E_CMD_FAILED, lambda: gripper.release_part(90, 400)),
+                                     (HOMING_ID, E_ALREADY_RUNNING, gripper.homing)):
+        simulator.inject_fault(command_id, status)
+        assert move() == status # used to wait for SUCCESS forever
+    assert gripper.preposition_gripper(80, 400) == E_SUCCESS
+    gripper.end_connection()
+
+
+def test_blocking_driver_acknowledges_a_fault():
+    simulator = WSG50Simulator(SimulatorConfig(time_scale=100.0, part_width=None))
+    gripper = wsg50.wsg50(*simulator.start_in_thread())
+    assert gripper.grasp_part(68, 400) == E_CMD_FAILED
+    assert 'SF_CMD_FAILURE' in gripper.gripper_state()
+    assert gripper.acknowledge_fault() == E_SUCCESS
+    assert 'SF_CMD_FAILURE' not in gripper.gripper_state()
+    gripper.end_connection()
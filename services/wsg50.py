@@ -17,46 +17,18 @@ import socket
 import time
 import sys
 
-import numpy as np
+from wsg50_codec import (DISCONNECT_ID, HOMING_ID, PREPOSITION_ID, ACK_FAULT_ID, GRASP_ID, RELEASE_ID,
+                         SYSTEM_STATE_ID, COMMAND_PAYLOADS, ERROR_CODES_WSG, E_CMD_PENDING, FrameDecoder,
+                         FrameEncoder, encode_frame)
 
 #################################### CONSTANTS AND GLOBAL VARIABLES #########################################
-# #inital message with header for later id and payload to be appended
-
-# command ids
-HOMING_ID = 32
-PREPOSITION_ID = 33
-GRASP_ID = 37
-RELEASE_ID = 38
-
-# payload sizes
-HOMING_SIZE = 1
-PREPOSITION_SIZE = 9
-GRASP_SIZE = 8
-RELEASE_SIZE = 8
-
-# preambles for each message type
-HOMING_PREAMBLE = [170, 170, 170, HOMING_ID, HOMING_SIZE, 0]
-PREPOSITION_PREAMBLE = [170, 170, 170, PREPOSITION_ID, PREPOSITION_SIZE, 0, 0]
-GRASP_PREAMBLE = [170, 170, 170, GRASP_ID, GRASP_SIZE, 0]
-RELEASE_PREAMBLE = [170, 170, 170, RELEASE_ID, RELEASE_SIZE, 0]
-
-# disconnect message
-DISCONNECT_MSG = [170, 170, 170, 7, 0, 0, 53, 76]
-REMOVE_ERROR_MSG = [170, 170, 170, 36, 3, 0, 97, 99, 107, 220, 185]
-
-GRIPPER_STATUS_MSG = [170, 170, 170, 64, 3, 0, 1, 8, 62, 67, 76]
-
-# error code messages and state flags
-ERROR_CODES_WSG = {0: 'SUCCESS', 1: 'E_NOT_AVAILABLE', 2: 'E_NO_SENSOR',
-                   3: 'E_NOT_INITIALIZED', 4: 'E_ALREADY_RUNNING', 5: 'E_FEATURE_NOT_SUPPORTED',
-                   6: 'E_INCONSISTENT_DATA', 7: 'E_TIMEOUT', 8: 'E_READ_ERROR', 9: 'E_WRITE_ERROR',
-                   10: 'E_INSUFFICIENT_RESOURCES', 11: 'E_CHECKSUM_ERROR', 12: 'E_NO_PARAM_EXPECTED',
-                   13: 'E_NOT_ENOUGH_PARAMS', 14: 'E_CMD_UNKNOWN', 15: 'E_CMD_FORMAT_ERROR',
-                   16: 'E_ACCESS_DENIED', 17: 'E_ALREADY_OPEN', 18: 'E_CMD_FAILED', 19: 'E_CMD_ABORTED',
-                   20: 'E_INVALID_HANDLE', 21: 'E_NOT_FOUND', 22: 'E_NOT_OPEN', 23: 'E_IO_ERROR',
-                   24: 'E_INVALID_PARAMETER', 25: 'E_INDEX_OUT_OF_BOUNDS', 26: 'E_CMD_PENDING',
-                   27: 'E_OVERRUN', 28: 'E_RANGE_ERROR', 29: 'E_AXIS_BLOCKED', 30: 'E_FILE_EXISTS'}
+# static messages, built once with their checksums
+DISCONNECT_MSG = encode_frame(DISCONNECT_ID)
+REMOVE_ERROR_MSG = encode_frame(ACK_FAULT_ID, b'ack')
 
+GRIPPER_STATUS_MSG = encode_frame(SYSTEM_STATE_ID, COMMAND_PAYLOADS[SYSTEM_STATE_ID].pack(1, 15880))
+
+# state flags
 SYSTEM_STATE_FLAGS = ['SF_REFERENCED', 'SF_MOVING', 'SF_BLOCKED_MINUS', 'SF_BLOCKED_PLUS',
                       'SF_SOFT_LIMIT_MINUS', 'SF_SOFT_LIMIT_PLUS', 'SF_AXIS_STOPPED',
                       'SF_TARGET_POS_REACHED', 'SF_OVERRIDE_MODE', 'SF_FORCECNTL_MODE',
@@ -66,7 +38,7 @@ SYSTEM_STATE_FLAGS = ['SF_REFERENCED', 'SF_MOVING', 'SF_BLOCKED_MINUS', 'SF_BLOC
 
 
 class wsg50():
-    def __init__(self, server_ip='192.168.1.22', server_port=1000):
+    def __init__(self, server_ip='192.168.1.22', server_port=1000, metrics=None):
 
         self.server_ip = server_ip # set the local class ip 
         self.server_port = server_port # set the local class port
@@ -74,71 +46,73 @@ class wsg50():
         self.sckt = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # construct the class for the socket connection
         self.sckt.connect((self.server_ip, self.server_port)) # connect with TCP/IP to the gripper
 
-        errorRemove = bytearray()
-        for m in REMOVE_ERROR_MSG: # compile the byte array for the error remove message(this message is static on only needs to be created once)
-            errorRemove.append(m)
-        self.errorRemove = errorRemove
-
-        disconnect = bytearray()
-        for m in DISCONNECT_MSG: # compile the byte array for the disconnect message(this message is static on only needs to be created once)
-            disconnect.append(m)
-        self.disconnect = disconnect
-
-        state = bytearray()
-        for m in GRIPPER_STATUS_MSG: # compile the byte array for the disconnect message(this message is static on only needs to be created once)
-            state.append(m)
-        self.gripper_status = state
+        self.errorRemove = REMOVE_ERROR_MSG
+        self.disconnect = DISCONNECT_MSG
+        self.gripper_status = GRIPPER_STATUS_MSG
+        self._encoder = FrameEncoder() # reusable buffer the command frames are packed into
+        self._decoder = FrameDecoder() # reusable buffer the responses are received into
+        self.metrics = metrics # wsg50_metrics.GripperMetrics, None measures nothing
 
         self.homing() # Home the gripper once connected to it
         time.sleep(0.5)
 
     ################ PRIVATE METHODS #####################
-    def _remove_err(self):
-        """Remove checksum errors from the gripper status. 
+    def _send(self, command_id, frame):
+        self.sckt.sendall(frame)
+        if self.metrics is not None:
+            self.metrics.sent(command_id, frame)
+
+    def _responses(self):
+        """Yields every response frame from the gripper as it arrives, receiving more whenever the buffer is empty.
+        A single recv can hold part of a frame or several frames, the decoder takes care of both.
         """
 
-        self.sckt.sendall(self.errorRemove)
-        self.sckt.setblocking(0)
-        
-    def _float_to_payload(self, payload):
-        """Decomposes a float to IEEE 754 32-bit float representation(4 bytes).
+        while True:
+            for response in self._decoder:
+                if self.metrics is not None:
+                    self.metrics.received(response)
+                yield response
+            self._decoder.receive(self.sckt)
+
+    def _wait_for(self, command_id):
+        """Reads responses until the command returns its final status, which is any status but E_CMD_PENDING.
+        Responses to other commands, like automatic system state updates, are skipped.
 
         Args:
-            payload (float): Input float that needs to be converted.
+            command_id (int): Command id to wait for.
 
         Returns:
-            list: List consisting of 4 bytes that describes the float in IEEE 754.
+            int: The final status of the command, e.g. 0 SUCCESS, 18 E_CMD_FAILED or 29 E_AXIS_BLOCKED.
         """
-        
-        hex_list = hex(struct.unpack('>I', struct.pack('>f', payload))[0])
 
-        payload_list = []
-        for i in range(0, len(hex_list[2:]), 2):
-            payload_list.append(int(hex_list[i + 2 : i + 4], 16))
-
-        return payload_list[::-1] #return as little endian
+        self.sckt.setblocking(1)
+        for response in self._responses():
+            if response.command_id != command_id:
+                continue
+            if response.status != E_CMD_PENDING: # 26: the command was accepted and is still running
+                return response.status
 
     ################ PUBLIC METHODS #####################
-    def homing(self):
-        """Homing gripper to 110mm and recalibrates finger pose.
+    def send_command(self, command_id, *values, layout=None):
+        """Send any command to the gripper, the checksum is calculated when the frame is built.
+
+        Args:
+            command_id (int): Command id from the WSG50 Command Set Reference Manual.
+            *values: Values of the payload fields.
+            layout (struct.Struct, optional): Payload layout, needed for commands that are not in wsg50_codec.COMMAND_PAYLOADS.
         """
 
-        homing_payload = [0]
-        combined_payload = HOMING_PREAMBLE + homing_payload # create the specific payload for the homing procedure # checksum , 143, 131
-        
-        byte_msg = bytearray()
-        for byte in combined_payload:
-            byte_msg.append(byte)
+        self._send(command_id, self._encoder.encode(command_id, *values, layout=layout))
 
-        self.sckt.sendall(byte_msg)
-        self._remove_err()
-        self.sckt.setblocking(1)
+    def homing(self):
+        """Homing gripper to 110mm and recalibrates finger pose.
+
+        Returns:
+            int: Final status of the command, 0 on SUCCESS.
+        """
 
-        err_code = None
-        while err_code != 0:
-            data = self.sckt.recv(256) 
-            err_code = struct.unpack('<h', data[6:8])[0]# byte 6-8 are error codes: 0: SUCCESS, 26: PENDING, 4: RUNNING, 10: DENIED
-            print("Homing response: ", err_code, ERROR_CODES_WSG[err_code])
+        self._send(HOMING_ID, self._encoder.encode(HOMING_ID, 0)) # direction 0: home in the default direction
+        return self._wait_for(HOMING_ID)
 
 
     def preposition_gripper(self, width, speed):
@@ -148,25 +122,13 @@ class wsg50():
         Args:
             width (float): Set the width of the gripper fingers in mm.
             speed (float): Set the speed of the gripper fingers in mm/s.
+
+        Returns:
+            int: Final status of the command, 0 on SUCCESS.
         """
  
-        width_payload = self._float_to_payload(width) # decompose float to 4 bytes that can be attached to message
-        speed_payload = self._float_to_payload(speed)
-        combined_payload = PREPOSITION_PREAMBLE + width_payload + speed_payload
-        
-        byte_msg = bytearray()
-        for byte in combined_payload:
-            byte_msg.append(byte)
-
-        self.sckt.sendall(byte_msg)
-        self._remove_err()
-        self.sckt.setblocking(1)
-
-        err_code = None
-        while err_code != 0:
-            data = self.sckt.recv(256) # byte 5-6 are error codes: 10 denied and 1a success
-            err_code = struct.unpack('<h', data[6:8])[0]
-            print("Preposition reponse from {0}:".format([width, speed]), err_code, ERROR_CODES_WSG[err_code])
+        self._send(PREPOSITION_ID, self._encoder.encode(PREPOSITION_ID, 0, width, speed)) # flags 0: absolute, clamp on block
+        return self._wait_for(PREPOSITION_ID)
 
 
     def grasp_part(self, width, speed):
@@ -176,28 +138,13 @@ class wsg50():
         Args:
             width (float): Set the width of the part that has to be grasped in mm.
             speed (float): Set the speed of the gripper fingers in mm/s.
-        """
-
-        width_payload = self._float_to_payload(width)
-        speed_payload = self._float_to_payload(speed)
-        combined_payload = GRASP_PREAMBLE + width_payload + speed_payload
 
-        byte_msg = bytearray()
-        for byte in combined_payload:
-            byte_msg.append(byte)
-
-        self.sckt.sendall(byte_msg)
-        self._remove_err()
-        self.sckt.setblocking(1)
+        Returns:
+            int: Final status of the command, 0 on SUCCESS.
+        """
 
-        err_code = None
-        while err_code != 0:
-            data = self.sckt.recv(256) # byte 5-6 are error codes: 10 denied and 1a success
-            err_code = struct.unpack('<h', data[6:8])[0]
-            print("Grasp reponse from {0}:".format([width, speed]), err_code, ERROR_CODES_WSG[err_code])
-            print(type(err_code))
-            if err_code == 18:
-                break
+        self._send(GRASP_ID, self._encoder.encode(GRASP_ID, width, speed))
+        return self._wait_for(GRASP_ID) # 18: E_CMD_FAILED, nothing was grasped
 
 
     def release_part(self, width, speed):
@@ -206,26 +153,13 @@ class wsg50():
         Args:
             width (float): Set the width of the gripper fingers in mm.
             speed (float): Set the speed of the gripper fingers in mm/s.
-        """
-
-        width_payload = self._float_to_payload(width)
-        speed_payload = self._float_to_payload(speed)
-        combined_payload = RELEASE_PREAMBLE + width_payload + speed_payload
-
-        byte_msg = bytearray()
-        for byte in combined_payload:
-            byte_msg.append(byte)
-
-        self.sckt.sendall(byte_msg)
-        self._remove_err()
-        self.sckt.setblocking(1)
 
-        err_code = None
-        while err_code != 0:
-            data = self.sckt.recv(256) # byte 5-6 are error codes: 10 denied and 1a success
-            err_code = struct.unpack('<h', data[6:8])[0]
+        Returns:
+            int: Final status of the command, 0 on SUCCESS.
+        """
 
-            print("Release reponse from {0}:".format([width, speed]), err_code, ERROR_CODES_WSG[err_code])
+        self._send(RELEASE_ID, self._encoder.encode(RELEASE_ID, width, speed))
+        return self._wait_for(RELEASE_ID)
 
     def gripper_state(self):
         """Gets all the present state flags from the gripper.\n
@@ -235,21 +169,28 @@ class wsg50():
             list[str]: Returns a list of all the present states on the gripper
         """
 
-        self.sckt.sendall(self.gripper_status)
+        self._send(SYSTEM_STATE_ID, self.gripper_status)
         self.sckt.setblocking(1)
-        data = self.sckt.recv(16)
-        binarized = bin(int(data.hex()[4:10], 16))[2:23] # Take the 21 bits that are allocated to state flags. For more information see: WSG50 Command Set Reference Maunal, Appendix B
+        for response in self._responses():
+            if response.command_id == SYSTEM_STATE_ID:
+                break
+        flags = struct.unpack_from('<I', response.payload)[0] # bit i is SYSTEM_STATE_FLAGS[i]. For more information see: WSG50 Command Set Reference Maunal, Appendix B
 
-        state_mask =  [] # Added mask for the error_states
-        for bit in binarized:
-            state_mask.append(bool(int(bit)))
-        
-        present_state_flags = [SYSTEM_STATE_FLAGS[i] for i in range(len(SYSTEM_STATE_FLAGS)) if state_mask[i]]
-        print(present_state_flags)
+        present_state_flags = [SYSTEM_STATE_FLAGS[i] for i in range(len(SYSTEM_STATE_FLAGS)) if flags >> i & 1]
 
         return present_state_flags
         
 
+    def acknowledge_fault(self):
+        """Acknowledge a fault of the gripper, e.g. after a failed command, so it accepts motion commands again.
+
+        Returns:
+            int: Final status of the command, 0 on SUCCESS.
+        """
+
+        self._send(ACK_FAULT_ID, self.errorRemove)
+        return self._wait_for(ACK_FAULT_ID)
+
     def start_connection(self, server_ip='192.168.1.22', server_port=1000):
         """Start a TCP/IP socket connection with a desired IP and port.
 
@@ -260,20 +201,14 @@ class wsg50():
 
         self.sckt = socket.socket(socket.AF_INET, socket.SOCK_STREAM) # construct the class for the socket connection
         self.sckt.connect((server_ip, server_port)) # connect with TCP/IP to the 
+        self._decoder = FrameDecoder() # bytes left over from the old connection are not part of the new stream
 
     def end_connection(self):
         """End TCP/IP socket connection.
         """
 
-        self.sckt.sendall(self.disconnect)
-        #self._remove_err()
-        self.sckt.setblocking(1)
-
-        err_code = None
-        while err_code != 0: # While the command hasn't returned 0 for SUCCESS continue listening
-            data = self.sckt.recv(256) # byte 5-6 are error codes: 10 denied and 1a success
-            err_code = struct.unpack('<h', data[6:8])[0]
-            print("Close connection reponse:", err_code, ERROR_CODES_WSG[err_code])
+        self._send(DISCONNECT_ID, self.disconnect)
+        self._wait_for(DISCONNECT_ID)
 
         self.sckt.close()
 
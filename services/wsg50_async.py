@@ -0,0 +1,324 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import asyncio
+import collections
+import threading
+import time
+
+from wsg50_codec import (DISCONNECT_ID, HOMING_ID, PREPOSITION_ID, GRASP_ID, RELEASE_ID, SYSTEM_STATE_ID,
+                         GET_WIDTH_ID, GET_FORCE_ID, E_SUCCESS, E_CMD_PENDING, FLOAT, FrameDecoder, FrameEncoder,
+                         Response)
+from wsg50_telemetry import TelemetryRing
+
+
+################################################ CLASSES ####################################################
+class _WSGProtocol(asyncio.BufferedProtocol):
+    """Receives straight into the buffer of a FrameDecoder and hands every decoded response to the client."""
+
+    def __init__(self, client):
+        self.client = client
+        self.decoder = FrameDecoder()
+
+    def get_buffer(self, sizehint):
+        return self.decoder.writable()
+
+    def buffer_updated(self, nbytes):
+        self.decoder.commit(nbytes)
+        for response in self.decoder:
+            self.client._dispatch(response)
+
+    def connection_lost(self, exc):
+        self.client._fail_pending(exc or ConnectionError('connection to the gripper was closed'))
+
+
+class AsyncWSG50():
+    """Asyncio client for the WSG50 gripper. Every command is awaitable and resolves with the final status code
+    (0 for SUCCESS) once the gripper is done, so gripper motion can run while other coroutines move the robot.
+
+    Motion commands (homing, preposition, grasp and release) are sent one after another in the order they were
+    started, because the gripper only runs one motion at a time. Use the *_nowait methods to start a motion now
+    and await its handle later.
+    """
+
+    def __init__(self, metrics=None):
+        self._transport = None
+        self.metrics = metrics # wsg50_metrics.GripperMetrics, None measures nothing
+        self._encoder = FrameEncoder()
+        self._pending = collections.defaultdict(collections.deque) # command id -> futures waiting for a final response
+        self._motion_lock = asyncio.Lock()
+        self._poller = None
+        self.telemetry = None # TelemetryRing filled by start_telemetry
+        self.motion_done = 0.0 # time.monotonic() when the last motion command finished
+        self._sampled = asyncio.Event() # set and replaced by the poller after every sample
+
+    @classmethod
+    async def connect(cls, server_ip='192.168.1.22', server_port=1000, home=True, metrics=None):
+        """Connect to the gripper and home it, like the constructor of wsg50 does.
+
+        Args:
+            server_ip (str, optional): IP address of the gripper. Defaults to '192.168.1.22'.
+            server_port (int, optional): Port of the gripper. Defaults to 1000.
+            home (bool, optional): Home the gripper once connected. Defaults to True.
+            metrics (GripperMetrics, optional): Records latencies and counters of every command. Defaults to None.
+
+        Returns:
+            AsyncWSG50: The connected client.
+        """
+
+        client = cls(metrics)
+        loop = asyncio.get_running_loop()
+        client._transport, _ = await loop.create_connection(lambda: _WSGProtocol(client), server_ip, server_port)
+        if home:
+            await client.homing()
+        return client
+
+    ################ PRIVATE METHODS #####################
+    def _dispatch(self, response):
+        if self.metrics is not None:
+            self.metrics.received(response)
+        if response.status == E_CMD_PENDING:
+            return # the command was accepted, the final status follows when it is done
+        waiting = self._pending.get(response.command_id)
+        if waiting:
+            future = waiting.popleft()
+            if not future.done():
+                # copy the payload, the view is only valid until the decoder receives more bytes
+                future.set_result(Response(response.command_id, response.status, bytes(response.payload)))
+
+    def _fail_pending(self, exc):
+        for waiting in self._pending.values():
+            while waiting:
+                future = waiting.popleft()
+                if not future.done():
+                    future.set_exception(exc)
+
+    async def _request(self, command_id, *values) -> Response:
+        if self._transport is None or self._transport.is_closing():
+            raise ConnectionError('not connected to the gripper')
+        future = asyncio.get_running_loop().create_future()
+        self._pending[command_id].append(future)
+        frame = self._encoder.encode(command_id, *values)
+        self._transport.write(frame)
+        if self.metrics is not None:
+            self.metrics.sent(command_id, frame)
+        return await future
+
+    async def _command(self, command_id, *values):
+        return (await self._request(command_id, *values)).status
+
+    async def _motion(self, command_id, *values):
+        async with self._motion_lock:
+            try:
+                return await self._command(command_id, *values)
+            finally:
+                self.motion_done = time.monotonic()
+
+    ################ PUBLIC METHODS #####################
+    async def homing(self):
+        """Homing gripper to 110mm and recalibrates finger pose.
+        """
+
+        return await self._motion(HOMING_ID, 0)
+
+    async def preposition(self, width, speed):
+        """Preposition the gripper to a set width at a certain speed, not for grasping parts.
+
+        Args:
+            width (float): Set the width of the gripper fingers in mm.
+            speed (float): Set the speed of the gripper fingers in mm/s.
+        """
+
+        return await self._motion(PREPOSITION_ID, 0, width, speed)
+
+    async def grasp(self, width, speed):
+        """Grasp a part. Resolves with 18 (E_CMD_FAILED) if there was nothing to grasp.
+
+        Args:
+            width (float): Set the width of the part that has to be grasped in mm.
+            speed (float): Set the speed of the gripper fingers in mm/s.
+        """
+
+        return await self._motion(GRASP_ID, width, speed)
+
+    async def release(self, width, speed):
+        """Release a previously grasped part.
+
+        Args:
+            width (float): Set the width of the gripper fingers in mm.
+            speed (float): Set the speed of the gripper fingers in mm/s.
+        """
+
+        return await self._motion(RELEASE_ID, width, speed)
+
+    def preposition_nowait(self, width, speed) -> asyncio.Task:
+        """Start prepositioning now and return a handle to await the status later."""
+
+        return asyncio.ensure_future(self.preposition(width, speed))
+
+    def grasp_nowait(self, width, speed) -> asyncio.Task:
+        """Start grasping now and return a handle to await the status later."""
+
+        return asyncio.ensure_future(self.grasp(width, speed))
+
+    def release_nowait(self, width, speed) -> asyncio.Task:
+        """Start releasing now and return a handle to await the status later."""
+
+        return asyncio.ensure_future(self.release(width, speed))
+
+    async def _poll(self, period):
+        loop = asyncio.get_running_loop()
+        next_time = loop.time()
+        while True:
+            # the queries are not motion commands, so they are answered while a motion is running.
+            # A sample is stamped with the time it was asked for, the state it reports is at least that new
+            asked = time.monotonic()
+            state, width, force = await asyncio.gather(self._request(SYSTEM_STATE_ID, 0, 0),
+                                                       self._request(GET_WIDTH_ID, 0, 0),
+                                                       self._request(GET_FORCE_ID, 0, 0))
+            flags = int.from_bytes(state.payload[:4], 'little') if state.status == E_SUCCESS else 0
+            self.telemetry.append(asked, flags, _float_or_nan(width), _float_or_nan(force))
+            self._sampled.set()
+            self._sampled = asyncio.Event()
+            next_time += period
+            await asyncio.sleep(max(0.0, next_time - loop.time()))
+
+    async def start_telemetry(self, rate=20.0, capacity=1024) -> TelemetryRing:
+        """Start polling system state, width and force in the background. Motion commands are not held up by it.
+
+        Args:
+            rate (float, optional): Polls per second. Defaults to 20.
+            capacity (int, optional): Number of samples the ring buffer keeps. Defaults to 1024.
+
+        Returns:
+            TelemetryRing: The buffer the samples are written to, also available as self.telemetry.
+        """
+
+        await self.stop_telemetry()
+        self.telemetry = TelemetryRing(capacity)
+        self._poller = asyncio.ensure_future(self._poll(1.0 / rate))
+        return self.telemetry
+
+    async def stop_telemetry(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            try:
+                await self._poller
+            except (asyncio.CancelledError, ConnectionError):
+                pass
+            self._poller = None
+
+    def latest(self):
+        """Returns the newest telemetry sample, or None if telemetry is not running or nothing was polled yet."""
+
+        return self.telemetry.latest() if self.telemetry is not None else None
+
+    async def fresh_sample(self, timeout=1.0):
+        """Waits for the first telemetry sample asked for after the last motion finished, so it can not show
+        the state of a motion that is already over.
+
+        Args:
+            timeout (float, optional): Seconds to wait for the sample. Defaults to 1.0.
+
+        Returns:
+            GripperSample: The sample, or None if telemetry is not running or no fresh sample came in time.
+        """
+
+        if self._poller is None:
+            return None
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            sample = self.latest()
+            if sample is not None and sample.time >= self.motion_done and not self._motion_lock.locked():
+                return sample
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                return None
+            try:
+                await asyncio.wait_for(self._sampled.wait(), remaining)
+            except asyncio.TimeoutError:
+                return None
+
+    async def close(self):
+        """Tell the gripper the connection is closing, then close it.
+        """
+
+        await self.stop_telemetry()
+        status = await self._command(DISCONNECT_ID)
+        self._transport.close()
+        return status
+
+
+def _float_or_nan(response) -> float:
+    if response.status != E_SUCCESS or len(response.payload) < FLOAT.size:
+        return float('nan')
+    return FLOAT.unpack_from(response.payload)[0]
+
+
+class WSG50Thread():
+    """Runs an AsyncWSG50 on an event loop in a background thread, for code that is not async itself.
+    The blocking methods have the same names as in wsg50, and the *_nowait methods return a
+    concurrent.futures.Future that can be waited on with result() after the robot has moved.
+    """
+
+    def __init__(self, server_ip='192.168.1.22', server_port=1000, metrics=None):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name='wsg50', daemon=True)
+        self._thread.start()
+        self.client = self._submit(AsyncWSG50.connect(server_ip, server_port, metrics=metrics)).result()
+
+    def _submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def preposition_nowait(self, width, speed):
+        """Start prepositioning the gripper and return a future of the final status."""
+
+        return self._submit(self.client.preposition(width, speed))
+
+    def grasp_nowait(self, width, speed):
+        """Start grasping and return a future of the final status."""
+
+        return self._submit(self.client.grasp(width, speed))
+
+    def release_nowait(self, width, speed):
+        """Start releasing and return a future of the final status."""
+
+        return self._submit(self.client.release(width, speed))
+
+    def start_telemetry(self, rate=20.0, capacity=1024):
+        """Start polling the gripper state in the background, see AsyncWSG50.start_telemetry."""
+
+        return self._submit(self.client.start_telemetry(rate, capacity)).result()
+
+    def stop_telemetry(self):
+        self._submit(self.client.stop_telemetry()).result()
+
+    def latest(self):
+        """Returns the newest telemetry sample from memory, without a round trip to the gripper."""
+
+        return self.client.latest()
+
+    def fresh_sample(self, timeout=1.0):
+        """Waits for a telemetry sample newer than the last finished motion, see AsyncWSG50.fresh_sample."""
+
+        return self._submit(self.client.fresh_sample(timeout)).result()
+
+    def homing(self):
+        return self._submit(self.client.homing()).result()
+
+    def preposition_gripper(self, width, speed):
+        return self.preposition_nowait(width, speed).result()
+
+    def grasp_part(self, width, speed):
+        return self.grasp_nowait(width, speed).result()
+
+    def release_part(self, width, speed):
+        return self.release_nowait(width, speed).result()
+
+    def end_connection(self):
+        """Close the connection to the gripper and stop the background thread.
+        """
+
+        try:
+            return self._submit(self.client.close()).result()
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
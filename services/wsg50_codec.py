@@ -0,0 +1,344 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import struct
+from typing import NamedTuple
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+# Every WSG50 message is: preamble (3 x 0xAA), command id (1 byte), payload size (2 bytes),
+# payload, CRC16 (2 bytes). Everything is little endian. Responses start their payload with a 2 byte status code.
+# For more information see: WSG50 Command Set Reference Manual, chapter 2
+
+PREAMBLE = b'\xaa\xaa\xaa'
+HEADER = struct.Struct('<3sBH')  # preamble, command id, payload size
+STATUS = struct.Struct('<H')
+CRC = struct.Struct('<H')
+FLOAT = struct.Struct('<f')
+HEADER_SIZE = HEADER.size
+CRC_SIZE = CRC.size
+MAX_PAYLOAD_SIZE = 0xFFFF
+
+# command ids
+DISCONNECT_ID = 7
+HOMING_ID = 32
+PREPOSITION_ID = 33
+ACK_FAULT_ID = 36
+GRASP_ID = 37
+RELEASE_ID = 38
+SYSTEM_STATE_ID = 64
+GET_WIDTH_ID = 67
+GET_FORCE_ID = 69
+
+# status codes the driver acts on
+E_SUCCESS = 0
+E_CMD_FAILED = 18
+E_CMD_PENDING = 26
+
+# names of all status codes
+ERROR_CODES_WSG = {0: 'SUCCESS', 1: 'E_NOT_AVAILABLE', 2: 'E_NO_SENSOR',
+                   3: 'E_NOT_INITIALIZED', 4: 'E_ALREADY_RUNNING', 5: 'E_FEATURE_NOT_SUPPORTED',
+                   6: 'E_INCONSISTENT_DATA', 7: 'E_TIMEOUT', 8: 'E_READ_ERROR', 9: 'E_WRITE_ERROR',
+                   10: 'E_INSUFFICIENT_RESOURCES', 11: 'E_CHECKSUM_ERROR', 12: 'E_NO_PARAM_EXPECTED',
+                   13: 'E_NOT_ENOUGH_PARAMS', 14: 'E_CMD_UNKNOWN', 15: 'E_CMD_FORMAT_ERROR',
+                   16: 'E_ACCESS_DENIED', 17: 'E_ALREADY_OPEN', 18: 'E_CMD_FAILED', 19: 'E_CMD_ABORTED',
+                   20: 'E_INVALID_HANDLE', 21: 'E_NOT_FOUND', 22: 'E_NOT_OPEN', 23: 'E_IO_ERROR',
+                   24: 'E_INVALID_PARAMETER', 25: 'E_INDEX_OUT_OF_BOUNDS', 26: 'E_CMD_PENDING',
+                   27: 'E_OVERRUN', 28: 'E_RANGE_ERROR', 29: 'E_AXIS_BLOCKED', 30: 'E_FILE_EXISTS'}
+
+COMMAND_NAMES = {DISCONNECT_ID: 'DISCONNECT', HOMING_ID: 'HOMING', PREPOSITION_ID: 'PREPOSITION',
+                 ACK_FAULT_ID: 'ACK_FAULT', GRASP_ID: 'GRASP', RELEASE_ID: 'RELEASE', SYSTEM_STATE_ID: 'SYSTEM_STATE',
+                 GET_WIDTH_ID: 'GET_WIDTH', GET_FORCE_ID: 'GET_FORCE'}
+
+# payload layout of the commands sent by the driver
+COMMAND_PAYLOADS = {
+    DISCONNECT_ID: struct.Struct('<'),
+    HOMING_ID: struct.Struct('<B'),  # direction, 0 = default
+    PREPOSITION_ID: struct.Struct('<Bff'),  # flags, width (mm), speed (mm/s)
+    ACK_FAULT_ID: struct.Struct('<3s'),  # the string "ack"
+    GRASP_ID: struct.Struct('<ff'),  # width (mm), speed (mm/s)
+    RELEASE_ID: struct.Struct('<ff'),  # width (mm), speed (mm/s)
+    SYSTEM_STATE_ID: struct.Struct('<BH'),  # update flags, update period (ms)
+    GET_WIDTH_ID: struct.Struct('<BH'),  # update flags, update period (ms)
+    GET_FORCE_ID: struct.Struct('<BH'),  # update flags, update period (ms)
+}
+
+
+def _crc_table() -> tuple:
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) & 0xFFFF if crc & 0x8000 else (crc << 1) & 0xFFFF
+        table.append(crc)
+    return tuple(table)
+
+
+CRC_TABLE = _crc_table()  # CCITT polynomial 0x1021, as in the checksum code of the WSG manual
+
+
+class WSGProtocolError(Exception):
+    """Raised when a frame from the gripper is malformed or fails its checksum."""
+
+
+class Frame(NamedTuple):
+    """A decoded frame. payload is a view into the receive buffer."""
+    command_id: int
+    payload: memoryview
+
+
+class Response(NamedTuple):
+    """A decoded response frame. payload is a view into the receive buffer, holding the parameters after the status code."""
+    command_id: int
+    status: int
+    payload: memoryview
+
+
+def crc16(data, crc: int = 0xFFFF) -> int:
+    """Calculates the WSG checksum of a message.
+
+    Args:
+        data (bytes-like): Bytes to calculate the checksum of, including the preamble.
+        crc (int, optional): Checksum to continue from. Defaults to 0xFFFF, the start value.
+
+    Returns:
+        int: The checksum. Calculated over a whole frame including its checksum, it is 0.
+    """
+
+    table = CRC_TABLE
+    for byte in data:
+        crc = table[(crc ^ byte) & 0xFF] ^ (crc >> 8)
+    return crc
+
+
+def encode_frame(command_id: int, payload=b'') -> bytes:
+    """Builds a complete frame with header and checksum around a raw payload.
+    Use this for static messages that are built once, and FrameEncoder for messages on the hot path.
+
+    Args:
+        command_id (int): Command id of the message.
+        payload (bytes-like, optional): Raw payload. Defaults to no payload.
+
+    Returns:
+        bytes: The frame, ready to be sent.
+    """
+
+    frame = bytearray(HEADER.pack(PREAMBLE, command_id, len(payload)))
+    frame += payload
+    frame += CRC.pack(crc16(frame))
+    return bytes(frame)
+
+
+class FrameEncoder():
+    """Packs command frames into one reusable buffer with precompiled structs.
+    The returned view is only valid until the next call of encode, so send it before encoding the next command.
+    """
+
+    def __init__(self, max_payload_size: int = 64):
+        self._buffer = bytearray(HEADER_SIZE + max_payload_size + CRC_SIZE)
+        self._view = memoryview(self._buffer)
+
+    def encode(self, command_id: int, *values, layout: struct.Struct = None) -> memoryview:
+        """Packs a command frame.
+
+        Args:
+            command_id (int): Command id of the message.
+            *values: Values of the payload fields.
+            layout (struct.Struct, optional): Payload layout. Defaults to COMMAND_PAYLOADS[command_id].
+
+        Returns:
+            memoryview: The frame, a view into the internal buffer.
+        """
+
+        if layout is None:
+            layout = COMMAND_PAYLOADS[command_id]
+        size = layout.size
+        end = HEADER_SIZE + size
+        if end + CRC_SIZE > len(self._buffer):
+            raise ValueError(f'payload of {size} bytes does not fit the {len(self._buffer)} byte frame buffer')
+
+        HEADER.pack_into(self._buffer, 0, PREAMBLE, command_id, size)
+        layout.pack_into(self._buffer, HEADER_SIZE, *values)
+        CRC.pack_into(self._buffer, end, crc16(self._view[:end]))
+        return self._view[:end + CRC_SIZE]
+
+
+def frame_size(buffer, offset: int = 0):
+    """Returns the size of the frame that starts at offset, or None if the header is not complete yet.
+    """
+
+    if len(buffer) - offset < HEADER_SIZE:
+        return None
+    _, _, size = HEADER.unpack_from(buffer, offset)
+    return HEADER_SIZE + size + CRC_SIZE
+
+
+def decode_frame(buffer, offset: int = 0) -> Frame:
+    """Decodes the frame that starts at offset, without copying the payload. Used for commands sent to a gripper.
+
+    Args:
+        buffer (bytes-like): Buffer holding at least one complete frame from offset on.
+        offset (int, optional): Index of the first preamble byte. Defaults to 0.
+
+    Raises:
+        WSGProtocolError: If the frame is incomplete, has no valid preamble or fails the checksum.
+
+    Returns:
+        Frame: Command id and a view of the payload.
+    """
+
+    view = memoryview(buffer)
+    size = frame_size(view, offset)
+    if size is None or len(view) - offset < size:
+        raise WSGProtocolError('incomplete frame')
+    preamble, command_id, _ = HEADER.unpack_from(view, offset)
+    if preamble != PREAMBLE:
+        raise WSGProtocolError('frame does not start with a preamble')
+    if crc16(view[offset:offset + size]) != 0:
+        raise WSGProtocolError('checksum error')
+    return Frame(command_id, view[offset + HEADER_SIZE:offset + size - CRC_SIZE])
+
+
+def decode_response(buffer, offset: int = 0) -> Response:
+    """Decodes the response frame that starts at offset, without copying the payload.
+
+    Args:
+        buffer (bytes-like): Buffer holding at least one complete frame from offset on.
+        offset (int, optional): Index of the first preamble byte. Defaults to 0.
+
+    Raises:
+        WSGProtocolError: If the frame is incomplete, has no valid preamble, fails the checksum or has no status code.
+
+    Returns:
+        Response: Command id, status code and a view of the remaining payload.
+    """
+
+    command_id, payload = decode_frame(buffer, offset)
+    if len(payload) < STATUS.size:
+        raise WSGProtocolError('response has no status code')
+    return Response(command_id, STATUS.unpack_from(payload)[0], payload[STATUS.size:])
+
+
+class FrameDecoder():
+    """Incremental decoder for the byte stream from the gripper. Bytes are received into one fixed buffer,
+    and every complete frame in it is yielded when iterating, however the stream was split or coalesced.
+    Bytes in front of a preamble and frames that fail the checksum are skipped.
+    The payload views of yielded responses are only valid until the next call of receive or feed.
+    Responses are decoded with decode_response, pass decode=decode_frame to decode the commands sent to a gripper.
+    """
+
+    def __init__(self, capacity: int = 4096, decode=decode_response):
+        self._decode = decode
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+        self._start = 0 # first byte that has not been decoded yet
+        self._end = 0 # end of the received bytes
+        self.checksum_errors = 0
+        self.skipped_bytes = 0
+
+    def _compact(self) -> None:
+        """Moves the undecoded bytes to the front of the buffer, so there is room to receive more."""
+
+        if self._start:
+            remaining = self._end - self._start
+            self._view[:remaining] = self._view[self._start:self._end]
+            self._start = 0
+            self._end = remaining
+        if self._end == len(self._buffer):
+            raise WSGProtocolError(f'frame does not fit the {len(self._buffer)} byte receive buffer')
+
+    def writable(self) -> memoryview:
+        """Returns the free part of the buffer to receive into, call commit with the number of bytes written."""
+
+        self._compact()
+        return self._view[self._end:]
+
+    def commit(self, nbytes: int) -> None:
+        """Marks nbytes written into the view from writable as received."""
+
+        self._end += nbytes
+
+    def receive(self, sckt) -> int:
+        """Receives whatever the socket has ready (blocking until at least one byte arrives) into the buffer.
+
+        Raises:
+            ConnectionError: If the gripper closed the connection.
+
+        Returns:
+            int: Number of bytes received.
+        """
+
+        received = sckt.recv_into(self.writable())
+        if received == 0:
+            raise ConnectionError('connection to the gripper was closed')
+        self.commit(received)
+        return received
+
+    def feed(self, data) -> None:
+        """Appends bytes to the buffer, for streams that do not come from a socket.
+        Iterate over the decoder in between, the decoded frames are what makes room in the buffer.
+        """
+
+        data = memoryview(data)
+        while len(data):
+            self._compact()
+            chunk = min(len(data), len(self._buffer) - self._end)
+            self._view[self._end:self._end + chunk] = data[:chunk]
+            self._end += chunk
+            data = data[chunk:]
+
+    def _valid_frame_after(self, sync: int) -> bool:
+        """Returns True if a complete frame with a valid checksum starts after sync in the buffer."""
+
+        candidate = self._buffer.find(PREAMBLE, sync + 1, self._end)
+        while candidate >= 0:
+            try:
+                self._decode(self._view[:self._end], candidate)
+                return True
+            except WSGProtocolError:
+                candidate = self._buffer.find(PREAMBLE, candidate + 1, self._end)
+        return False
+
+    def __iter__(self):
+        while True:
+            response = self.next_response()
+            if response is None:
+                return
+            yield response
+
+    def next_response(self):
+        """Returns the next complete response in the buffer, or None if more bytes are needed."""
+
+        while True:
+            sync = self._buffer.find(PREAMBLE, self._start, self._end)
+            if sync < 0:
+                # keep a possible partial preamble at the end of the buffer
+                keep = max(self._start, self._end - (len(PREAMBLE) - 1))
+                self.skipped_bytes += keep - self._start
+                self._start = keep
+                return None
+            # a run of more than three 0xAA is leading garbage, the frame starts at the last three
+            while sync + len(PREAMBLE) < self._end and self._buffer[sync + len(PREAMBLE)] == PREAMBLE[0]:
+                sync += 1
+            self.skipped_bytes += sync - self._start
+            self._start = sync
+
+            size = frame_size(self._view[:self._end], sync)
+            if size is not None and size > len(self._buffer):
+                # no frame from the gripper is that large, so this was not a real preamble
+                self.skipped_bytes += 1
+                self._start = sync + 1
+                continue
+            if size is None or self._end - sync < size:
+                if self._valid_frame_after(sync):
+                    # a corrupted header must not hold back the complete frames behind it
+                    self.skipped_bytes += 1
+                    self._start = sync + 1
+                    continue
+                return None
+            try:
+                response = self._decode(self._view[:self._end], sync)
+            except WSGProtocolError:
+                # not a real frame or corrupted, resynchronise on the next preamble
+                self.checksum_errors += 1
+                self._start = sync + 1
+                continue
+            self._start = sync + size
+            return response
@@ -0,0 +1,110 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import bisect
+import collections
+import time
+
+from wsg50_codec import COMMAND_NAMES, ERROR_CODES_WSG, E_CMD_PENDING, STATUS, encode_frame
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+# upper bounds of the latency histogram buckets in seconds, the last bucket counts everything slower
+LATENCY_BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+
+class _CommandStats():
+    __slots__ = ('sent', 'completed', 'intermediate', 'statuses', 'buckets', 'latency_sum', 'latency_min', 'latency_max')
+
+    def __init__(self, bucket_count):
+        self.sent = 0
+        self.completed = 0
+        self.intermediate = 0 # E_CMD_PENDING replies before the final status
+        self.statuses = collections.Counter()
+        self.buckets = [0] * (bucket_count + 1)
+        self.latency_sum = 0.0
+        self.latency_min = float('inf') # only exported once a command completed
+        self.latency_max = 0.0
+
+
+class GripperMetrics():
+    """Counters and latency histograms per command id, measured from sending a command to its final status.
+    Pass it to the gripper driver to enable it, drivers without one skip every measurement.
+
+    Args:
+        trace_size (int, optional): Number of raw frames to keep in the trace, 0 disables tracing. Defaults to 0.
+        buckets (tuple, optional): Upper bounds of the latency buckets in seconds. Defaults to LATENCY_BUCKETS.
+    """
+
+    def __init__(self, trace_size: int = 0, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.trace = collections.deque(maxlen=trace_size) if trace_size > 0 else None # (time, 'tx' or 'rx', frame)
+        self.reset()
+
+    def reset(self) -> None:
+        self._stats = {}
+        self._started = collections.defaultdict(collections.deque) # command id -> send times of unfinished commands
+        self.unsolicited = 0 # final replies without a command waiting for them, e.g. automatic state updates
+
+    def _command(self, command_id) -> _CommandStats:
+        stats = self._stats.get(command_id)
+        if stats is None:
+            stats = self._stats[command_id] = _CommandStats(len(self.buckets))
+        return stats
+
+    def sent(self, command_id: int, frame) -> None:
+        """Records a command frame that was just sent."""
+
+        now = time.perf_counter()
+        self._command(command_id).sent += 1
+        self._started[command_id].append(now)
+        if self.trace is not None:
+            self.trace.append((now, 'tx', bytes(frame)))
+
+    def received(self, response) -> None:
+        """Records a response, before its payload view becomes invalid."""
+
+        now = time.perf_counter()
+        if self.trace is not None:
+            self.trace.append((now, 'rx', encode_frame(response.command_id, STATUS.pack(response.status) + response.payload)))
+        stats = self._command(response.command_id)
+        if response.status == E_CMD_PENDING:
+            stats.intermediate += 1
+            return
+        started = self._started[response.command_id]
+        if not started:
+            self.unsolicited += 1
+            return
+        latency = now - started.popleft()
+        stats.completed += 1
+        stats.statuses[response.status] += 1
+        stats.buckets[bisect.bisect_left(self.buckets, latency)] += 1
+        stats.latency_sum += latency
+        stats.latency_min = min(stats.latency_min, latency)
+        stats.latency_max = max(stats.latency_max, latency)
+
+    def as_dict(self) -> dict:
+        """Returns all counters, histograms and the trace as plain values, e.g. to dump as JSON.
+
+        Returns:
+            dict: 'commands' maps command names to their counters and latency histogram in seconds,
+                'unsolicited' counts replies nothing waited for and 'trace' lists the raw frames as hex.
+                The upper bound of the last bucket, which counts everything slower, is the string '+Inf' like in
+                Prometheus, so the dict is valid JSON. min, max and mean are None until a command completed.
+        """
+
+        commands = {}
+        for command_id, stats in sorted(self._stats.items()):
+            commands[COMMAND_NAMES.get(command_id, str(command_id))] = {
+                'sent': stats.sent,
+                'completed': stats.completed,
+                'intermediate': stats.intermediate,
+                'statuses': {ERROR_CODES_WSG.get(status, str(status)): count for status, count in stats.statuses.items()},
+                'latency': {
+                    'buckets': list(self.buckets) + ['+Inf'],
+                    'counts': list(stats.buckets),
+                    'sum': stats.latency_sum,
+                    'min': stats.latency_min if stats.completed else None,
+                    'max': stats.latency_max if stats.completed else None,
+                    'mean': stats.latency_sum / stats.completed if stats.completed else None,
+                },
+            }
+        trace = [{'time': t, 'direction': direction, 'frame': frame.hex(' ')} for t, direction, frame in self.trace or ()]
+        return {'commands': commands, 'unsolicited': self.unsolicited, 'trace': trace}
@@ -0,0 +1,324 @@
+"""Stand-alone WSG50 gripper simulator that speaks the binary protocol of wsg50.py over TCP.
+
+It models finger travel time from the requested width and speed, and can add network latency and jitter,
+split frames into several TCP segments, coalesce frames into one segment and reply with injected errors.
+Run it and point the driver at it, e.g. wsg50.wsg50('127.0.0.1', 1000):
+    python wsg50_sim.py --port 1000 --latency 0.002 --jitter 0.001 --split 0.2 --coalesce 0.2
+"""
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import argparse
+import asyncio
+import collections
+import random
+import struct
+import threading
+from dataclasses import dataclass, field
+
+from wsg50_codec import (DISCONNECT_ID, HOMING_ID, PREPOSITION_ID, ACK_FAULT_ID, GRASP_ID, RELEASE_ID,
+                         SYSTEM_STATE_ID, GET_WIDTH_ID, GET_FORCE_ID, COMMAND_PAYLOADS, FLOAT, E_SUCCESS, E_CMD_FAILED, E_CMD_PENDING,
+                         FrameDecoder, STATUS, decode_frame, encode_frame)
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+E_ALREADY_RUNNING = 4
+E_CMD_UNKNOWN = 14
+E_AXIS_BLOCKED = 29
+
+# bits of the system state flags, see SYSTEM_STATE_FLAGS in wsg50.py
+SF_REFERENCED = 1 << 0
+SF_MOVING = 1 << 1
+SF_TARGET_POS_REACHED = 1 << 7
+SF_FINGER_FAULT = 1 << 17
+SF_CMD_FAILURE = 1 << 18
+
+MOTION_COMMANDS = (HOMING_ID, PREPOSITION_ID, GRASP_ID, RELEASE_ID)
+
+
+@dataclass
+class SimulatorConfig:
+    """Behaviour of the simulated gripper and network. Times are in seconds, widths in mm."""
+    latency: float = 0.0 # one way delay added to every frame sent to the client
+    jitter: float = 0.0 # random extra delay, uniform between 0 and jitter
+    split_probability: float = 0.0 # chance that a frame is sent in several TCP segments
+    coalesce_probability: float = 0.0 # chance that a frame is held back and sent together with the next one
+    command_time: float = 0.002 # time the gripper needs before it starts a motion
+    time_scale: float = 1.0 # divides every simulated motion time, e.g. 10 runs the fingers ten times as fast
+    max_width: float = 110.0
+    part_width: float = 60.0 # width of the part between the fingers when grasping, None if there is no part
+    grasp_force: float = 20.0 # force in N reported while a part is held
+    random_faults: dict = field(default_factory=dict) # status code -> chance that a motion ends with it
+    seed: int = None
+
+
+class WSG50Simulator():
+    """Simulated WSG50. One instance is one gripper, connections share its finger state."""
+
+    def __init__(self, config: SimulatorConfig = None):
+        self.config = config or SimulatorConfig()
+        self.width = self.config.max_width
+        self.force = 0.0
+        self.flags = 0
+        self.finger_fault = False
+        self._motion = None # task of the running motion
+        self._faults = collections.defaultdict(collections.deque) # command id -> statuses to reply with
+        self._random = random.Random(self.config.seed)
+        self._server = None
+        self.received = collections.Counter() # command id -> number of commands received
+
+    ################ PUBLIC METHODS #####################
+    def inject_fault(self, command_id, status, count=1):
+        """Make the next count commands with this id end with status instead of SUCCESS.
+        Injecting E_CMD_PENDING sends an extra pending reply before the normal final reply.
+
+        Args:
+            command_id (int): Command id the fault applies to.
+            status (int): Status code to reply with, e.g. 18 E_CMD_FAILED or 29 E_AXIS_BLOCKED.
+            count (int, optional): Number of commands the fault applies to. Defaults to 1.
+        """
+
+        self._faults[command_id].extend([status] * count)
+
+    async def start(self, host='127.0.0.1', port=0):
+        """Start listening. Port 0 picks a free port.
+
+        Returns:
+            tuple: The host and port the simulator listens on.
+        """
+
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def start_in_thread(self, host='127.0.0.1', port=0):
+        """Run the simulator on an event loop in a daemon thread, for testing blocking clients like wsg50.
+
+        Returns:
+            tuple: The host and port the simulator listens on.
+        """
+
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name='wsg50-sim', daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(self.start(host, port), loop).result()
+
+    ################ PRIVATE METHODS #####################
+    async def _serve(self, reader, writer):
+        connection = _Connection(self, writer)
+        decoder = FrameDecoder(decode=decode_frame)
+        try:
+            while True:
+                view = decoder.writable()
+                data = await reader.read(len(view))
+                if not data:
+                    break
+                view[:len(data)] = data
+                decoder.commit(len(data))
+                for frame in decoder:
+                    self.received[frame.command_id] += 1
+                    if not self._handle(connection, frame.command_id, bytes(frame.payload)):
+                        await connection.drain()
+                        return
+        except ConnectionError:
+            pass
+        finally:
+            connection.close()
+
+    def _next_status(self, command_id):
+        if self._faults[command_id]:
+            return self._faults[command_id].popleft()
+        for status, chance in self.config.random_faults.items():
+            if self._random.random() < chance:
+                return status
+        return E_SUCCESS
+
+    def _handle(self, connection, command_id, payload) -> bool:
+        """Handles one command, returns False when the connection should close."""
+
+        if command_id in MOTION_COMMANDS:
+            if self._motion is not None and not self._motion.done():
+                connection.send(command_id, E_ALREADY_RUNNING)
+                return True
+            connection.send(command_id, E_CMD_PENDING)
+            self._motion = asyncio.ensure_future(self._move(connection, command_id, payload))
+        elif command_id == SYSTEM_STATE_ID:
+            update_flags, period = COMMAND_PAYLOADS[SYSTEM_STATE_ID].unpack(payload)
+            connection.send(command_id, E_SUCCESS, struct.pack('<I', self.state_flags()))
+            if update_flags & 1:
+                connection.start_updates(period / 1000)
+        elif command_id == GET_WIDTH_ID:
+            connection.send(command_id, E_SUCCESS, FLOAT.pack(self.width))
+        elif command_id == GET_FORCE_ID:
+            connection.send(command_id, E_SUCCESS, FLOAT.pack(self.force))
+        elif command_id == ACK_FAULT_ID:
+            self.finger_fault = False
+            self.flags &= ~SF_CMD_FAILURE
+            connection.send(command_id, E_SUCCESS)
+        elif command_id == DISCONNECT_ID:
+            connection.send(command_id, E_SUCCESS)
+            return False
+        else:
+            connection.send(command_id, E_CMD_UNKNOWN)
+        return True
+
+    def state_flags(self) -> int:
+        flags = self.flags
+        if self._motion is not None and not self._motion.done():
+            flags |= SF_MOVING
+        if self.finger_fault:
+            flags |= SF_FINGER_FAULT
+        return flags
+
+    async def _move(self, connection, command_id, payload):
+        status = self._next_status(command_id)
+        if status == E_CMD_PENDING:
+            connection.send(command_id, E_CMD_PENDING)
+            status = self._next_status(command_id)
+
+        if command_id == HOMING_ID:
+            target, speed = self.config.max_width, 100.0
+        elif command_id == PREPOSITION_ID:
+            _, target, speed = COMMAND_PAYLOADS[command_id].unpack(payload)
+        elif command_id == GRASP_ID:
+            _, speed = COMMAND_PAYLOADS[command_id].unpack(payload)
+            target = self.config.part_width
+            if target is None: # nothing between the fingers, they close completely and the grasp fails
+                target = 0.0
+                if status == E_SUCCESS:
+                    status = E_CMD_FAILED
+        else:
+            target, speed = COMMAND_PAYLOADS[command_id].unpack(payload)
+        target = min(max(target, 0.0), self.config.max_width)
+        if status == E_AXIS_BLOCKED: # the fingers stop half way
+            target = (self.width + target) / 2
+
+        self.flags &= ~(SF_TARGET_POS_REACHED | SF_CMD_FAILURE)
+        self.force = 0.0
+        travel = abs(target - self.width) / max(speed, 1e-3)
+        await asyncio.sleep((self.config.command_time + travel) / self.config.time_scale)
+        self.width = target
+        if command_id == GRASP_ID and status == E_SUCCESS:
+            self.force = self.config.grasp_force
+        if command_id == HOMING_ID and status == E_SUCCESS:
+            self.flags |= SF_REFERENCED
+        self.flags |= SF_TARGET_POS_REACHED if status == E_SUCCESS else SF_CMD_FAILURE
+        connection.send(command_id, status)
+
+
+class _Connection():
+    """Sends frames to one client with the configured latency, jitter, splitting and coalescing, in order."""
+
+    def __init__(self, simulator, writer):
+        self.simulator = simulator
+        self.writer = writer
+        self.config = simulator.config
+        self._random = simulator._random
+        self._queue = asyncio.Queue()
+        self._held = b'' # frame waiting to be coalesced with the next one
+        self._busy = False # the sender took a frame from the queue and has not written it yet
+        self._sender = asyncio.ensure_future(self._send_loop())
+        self._updates = None
+
+    def send(self, command_id, status, payload=b''):
+        loop = asyncio.get_running_loop()
+        due = loop.time() + self.config.latency + self._random.uniform(0, self.config.jitter)
+        self._queue.put_nowait((due, encode_frame(command_id, STATUS.pack(status) + payload)))
+
+    def start_updates(self, period):
+        if self._updates is not None:
+            self._updates.cancel()
+        if period > 0:
+            self._updates = asyncio.ensure_future(self._update_loop(period))
+
+    async def _update_loop(self, period):
+        while True:
+            await asyncio.sleep(period / self.config.time_scale)
+            self.send(SYSTEM_STATE_ID, E_SUCCESS, struct.pack('<I', self.simulator.state_flags()))
+
+    async def _send_loop(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                due, frame = await self._queue.get()
+                self._busy = True
+                await asyncio.sleep(max(0.0, due - loop.time())) # frames never overtake each other, like on TCP
+                data = frame
+                if self._random.random() < self.config.coalesce_probability and self._queue.qsize() == 0:
+                    self._held = data # wait for the next frame and send both in one segment
+                    try:
+                        due, frame = await asyncio.wait_for(self._queue.get(), timeout=0.05)
+                    except asyncio.TimeoutError:
+                        self._flush_held()
+                        self._busy = False
+                        continue
+                    await asyncio.sleep(max(0.0, due - loop.time()))
+                    data = self._held + frame
+                    self._held = b''
+                if self._random.random() < self.config.split_probability and len(data) > 1:
+                    cut = self._random.randint(1, len(data) - 1)
+                    self._write(data[:cut])
+                    await asyncio.sleep(0.001)
+                    data = data[cut:]
+                self._write(data)
+                await self.writer.drain()
+                self._busy = False
+        finally:
+            self._flush_held() # a frame held back for coalescing is still sent when the sender stops
+
+    def _flush_held(self):
+        if self._held:
+            self._write(self._held)
+            self._held = b''
+
+    def _write(self, data):
+        if not self.writer.is_closing():
+            self.writer.write(data)
+
+    async def drain(self):
+        """Waits until every queued frame, including one held back for coalescing, is written."""
+
+        while not self._queue.empty() or self._busy or self._held:
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(self.config.latency + self.config.jitter + 0.01)
+
+    def close(self):
+        self._sender.cancel()
+        self._flush_held()
+        if self._updates is not None:
+            self._updates.cancel()
+        self.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate a WSG50 gripper on a TCP port.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1000)
+    parser.add_argument('--latency', type=float, default=0.0, help='one way network delay in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random extra delay in seconds')
+    parser.add_argument('--split', type=float, default=0.0, help='chance that a frame is split')
+    parser.add_argument('--coalesce', type=float, default=0.0, help='chance that frames are coalesced')
+    parser.add_argument('--time-scale', type=float, default=1.0, help='speed up finger motion by this factor')
+    parser.add_argument('--no-part', action='store_true', help='grasps fail because there is no part')
+    parser.add_argument('--blocked', type=float, default=0.0, help='chance that a motion ends with E_AXIS_BLOCKED')
+    parser.add_argument('--failed', type=float, default=0.0, help='chance that a motion ends with E_CMD_FAILED')
+    args = parser.parse_args()
+
+    config = SimulatorConfig(latency=args.latency, jitter=args.jitter, split_probability=args.split,
+                             coalesce_probability=args.coalesce, time_scale=args.time_scale,
+                             part_width=None if args.no_part else 60.0,
+                             random_faults={E_AXIS_BLOCKED: args.blocked, E_CMD_FAILED: args.failed})
+
+    async def serve():
+        host, port = await WSG50Simulator(config).start(args.host, args.port)
+        print(f'WSG50 simulator listening on {host}:{port}')
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#################################### MODULES AND IMPORTED CLASSES ###########################################
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from wsg50 import SYSTEM_STATE_FLAGS
+
+#################################### CONSTANTS AND GLOBAL VARIABLES #########################################
+# one row per poll, flags is the SYSTEM_STATE_FLAGS bitmask
+TELEMETRY_DTYPE = np.dtype([('time', 'f8'), ('flags', 'u4'), ('width', 'f4'), ('force', 'f4')])
+
+FLAG_NAMES = np.array(SYSTEM_STATE_FLAGS + ['UNKNOWN'] * (32 - len(SYSTEM_STATE_FLAGS)))
+FLAG_BITS = {name: 1 << i for i, name in enumerate(SYSTEM_STATE_FLAGS) if name != 'RESERVED'}
+_BIT_SHIFTS = np.arange(32, dtype=np.uint32)
+
+
+def decode_state_flags(flags) -> np.ndarray:
+    """Splits state flag bitmasks into booleans, bit i is SYSTEM_STATE_FLAGS[i].
+
+    Args:
+        flags (int | np.ndarray): One bitmask or an array of them, e.g. the flags column of the telemetry history.
+
+    Returns:
+        np.ndarray: Booleans of shape (..., 32).
+    """
+
+    return (np.asarray(flags, dtype=np.uint32)[..., None] >> _BIT_SHIFTS & 1).astype(bool)
+
+
+class GripperSample(NamedTuple):
+    """One telemetry sample. time is from time.monotonic(), width is in mm and force in N."""
+    time: float
+    flags: int
+    width: float
+    force: float
+
+    @property
+    def states(self) -> list[str]:
+        """Names of the present state flags, like gripper_state returns them."""
+
+        return FLAG_NAMES[decode_state_flags(self.flags)].tolist()
+
+    def has(self, name: str) -> bool:
+        return bool(self.flags & FLAG_BITS[name])
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.time
+
+    def ready(self, max_age: float = 0.5) -> bool:
+        """True if the sample is recent, the last motion reached its target and no finger reports a fault."""
+
+        return (self.age <= max_age and self.has('SF_TARGET_POS_REACHED')
+                and not self.flags & (FLAG_BITS['SF_FINGER_FAULT'] | FLAG_BITS['SF_MOVING']))
+
+
+class TelemetryRing():
+    """Fixed size ring buffer of gripper samples. One thread appends, any thread can read without locking,
+    the newest row is never overwritten while it is the newest.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._data = np.zeros(capacity, dtype=TELEMETRY_DTYPE)
+        self._count = 0 # samples appended in total, the newest is at (count - 1) % capacity
+
+    def __len__(self):
+        return min(self._count, len(self._data))
+
+    @property
+    def capacity(self) -> int:
+        return len(self._data)
+
+    def append(self, timestamp: float, flags: int, width: float, force: float) -> None:
+        self._data[self._count % len(self._data)] = (timestamp, flags, width, force)
+        self._count += 1 # published after the row is written
+
+    def latest(self):
+        """Returns the newest sample, or None if nothing was polled yet."""
+
+        count = self._count
+        if count == 0:
+            return None
+        row = self._data[(count - 1) % len(self._data)]
+        return GripperSample(float(row['time']), int(row['flags']), float(row['width']), float(row['force']))
+
+    def history(self, n: int = None) -> np.ndarray:
+        """Returns a copy of the newest n samples (all if None), oldest first, as a TELEMETRY_DTYPE array."""
+
+        count = self._count
+        n = len(self) if n is None else min(n, len(self))
+        index = np.arange(count - n, count) % len(self._data)
+        return self._data[index]
@@ -0,0 +1,161 @@
+import argparse
+import json
+import math
+
+import numpy as np
+
+from kinematics_ur5 import (UR5_MDH, MDHTable, _jacobian_from_frames, forward_kinematics_frames,
+                            inverse_kinematics, manipulability)
+
+# one record per voxel, written as a plain .npy file so it can be opened with np.load(mmap_mode='r')
+VOXEL_DTYPE = np.dtype([
+    ('reachable', '?'),
+    ('manipulability', '<f4'),  # best translational yoshikawa manipulability seen in the voxel (mm^3)
+    ('branches', 'u1'),  # most inverse kinematic branches seen in the voxel, 0 to 8
+])
+
+UR5_REACH = 1000.0  # mm, slightly more than the fully stretched UR5
+
+
+class WorkspaceMap:
+    """Voxel grid of the positions the end effector can reach, stored as a memory-mappable .npy file
+    with a .json file next to it describing the grid. Lookups are a single index computation per point.
+    """
+
+    def __init__(self, grid: np.ndarray, origin, voxel_size: float):
+        self.grid = grid
+        self.origin = np.asarray(origin, dtype=float)
+        self.voxel_size = float(voxel_size)
+
+    @staticmethod
+    def _metadata_path(path: str) -> str:
+        return path[:-len('.npy')] + '.json' if path.endswith('.npy') else path + '.json'
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'r') -> 'WorkspaceMap':
+        """Open a map written by save or build_workspace_map without reading the grid into memory.
+
+        Args:
+            path (str): Path to the .npy file.
+            mmap_mode (str, optional): Memory map mode passed on to np.load. Defaults to 'r'.
+        """
+
+        with open(cls._metadata_path(path)) as f:
+            metadata = json.load(f)
+        grid = np.load(path, mmap_mode=mmap_mode)
+        return cls(grid, metadata['origin'], metadata['voxel_size'])
+
+    def save(self, path: str, **extra_metadata) -> None:
+        """Write the grid to a .npy file and the grid description to a .json file next to it.
+        """
+
+        np.save(path, self.grid)
+        self._save_metadata(path, **extra_metadata)
+
+    def _save_metadata(self, path: str, **extra_metadata) -> None:
+        metadata = {'origin': self.origin.tolist(), 'voxel_size': self.voxel_size,
+                    'shape': list(self.grid.shape), **extra_metadata}
+        with open(self._metadata_path(path), 'w') as f:
+            json.dump(metadata, f, indent=2)
+
+    def voxel_index(self, points: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Returns the voxel index of every point and a mask of the points inside the grid.
+
+        Args:
+            points (np.ndarray): Positions in the robot base frame in mm, shape (..., 3).
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Integer indices with shape (..., 3) and a mask with shape (...).
+        """
+
+        index = np.floor((np.asarray(points, dtype=float) - self.origin) / self.voxel_size).astype(np.intp)
+        inside = np.all((index >= 0) & (index < self.grid.shape), axis=-1)
+        return np.where(inside[..., None], index, 0), inside
+
+    def lookup(self, points: np.ndarray) -> np.ndarray:
+        """Returns the voxel records for positions in the robot base frame, shape (...) with dtype VOXEL_DTYPE.
+        Points outside of the grid get an unreachable record.
+        """
+
+        index, inside = self.voxel_index(points)
+        records = self.grid[index[..., 0], index[..., 1], index[..., 2]]
+        return np.where(inside, records, np.zeros((), dtype=VOXEL_DTYPE))
+
+    def is_reachable(self, points: np.ndarray) -> np.ndarray:
+        """Returns True for the positions that were reached while the map was built.
+        """
+
+        return self.lookup(points)['reachable']
+
+
+def build_workspace_map(path: str, samples: int = 2_000_000, voxel_size: float = 20.0, reach: float = None,
+                        mdh: MDHTable = UR5_MDH, tool: np.ndarray = None, chunk_size: int = 100_000,
+                        seed: int = 0) -> WorkspaceMap:
+    """Sweeps the joint space with batched forward kinematics and writes the reachability map to path.
+
+    Args:
+        path (str): Path of the .npy file to write, the grid description is written next to it as .json.
+        samples (int, optional): Number of random joint configurations to sample. Defaults to 2000000.
+        voxel_size (float, optional): Edge length of a voxel in mm. Defaults to 20.
+        reach (float, optional): The grid spans +-reach around the base in x and y, and around d1 in z.
+            Defaults to UR5_REACH plus the length of the tool offset.
+        mdh (MDHTable, optional): Parameters of the chain. Defaults to UR5_MDH.
+        tool (np.ndarray, optional): Flange to tool transform, shape (4, 4). Defaults to the flange.
+        chunk_size (int, optional): Configurations evaluated per batch, limits the memory use. Defaults to 100000.
+        seed (int, optional): Seed of the random sampling. Defaults to 0.
+
+    Returns:
+        WorkspaceMap: The map, backed by the written file.
+    """
+
+    if reach is None:
+        reach = UR5_REACH + (0.0 if tool is None else float(np.linalg.norm(np.asarray(tool)[:3, 3])))
+    origin = np.array([-reach, -reach, mdh.d[0] - reach])
+    cells = int(math.ceil(2 * reach / voxel_size))
+    grid = np.lib.format.open_memmap(path, mode='w+', dtype=VOXEL_DTYPE, shape=(cells, cells, cells))
+    grid[...] = np.zeros((), dtype=VOXEL_DTYPE)
+    workspace = WorkspaceMap(grid, origin, voxel_size)
+
+    flat = grid.reshape(-1)
+    best_manipulability = np.zeros(flat.shape, dtype=np.float32)
+    most_branches = np.zeros(flat.shape, dtype=np.uint8)
+    reached = np.zeros(flat.shape, dtype=bool)
+    rng = np.random.default_rng(seed)
+    for start in range(0, samples, chunk_size):
+        joints = rng.uniform(-np.pi, np.pi, (min(chunk_size, samples - start), mdh.joints))
+        frames = forward_kinematics_frames(joints, mdh, tool)
+        index, inside = workspace.voxel_index(frames[:, -1, :3, 3])
+        flat_index = np.ravel_multi_index(index[inside].T, grid.shape)
+
+        reached[flat_index] = True
+        _, valid = inverse_kinematics(frames[inside, -2], mdh)  # closed form works on the flange pose
+        np.maximum.at(best_manipulability, flat_index, manipulability(_jacobian_from_frames(frames[inside])[:, :3]))
+        np.maximum.at(most_branches, flat_index, np.sum(valid, axis=1).astype(np.uint8))
+
+    flat['reachable'] = reached
+    flat['manipulability'] = best_manipulability
+    flat['branches'] = most_branches
+    grid.flush()
+    workspace._save_metadata(path, samples=samples, tool=None if tool is None else np.asarray(tool).tolist())
+    return workspace
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a reachability and manipulability map of the UR5 workspace.')
+    parser.add_argument('--output', default='ur5_workspace.npy', help='path of the .npy file to write')
+    parser.add_argument('--samples', type=int, default=2_000_000, help='number of joint configurations to sample')
+    parser.add_argument('--voxel-size', type=float, default=20.0, help='edge length of a voxel in mm')
+    parser.add_argument('--tool-z', type=float, default=0.0, help='tool offset along the flange z axis in mm')
+    args = parser.parse_args()
+
+    tool = None
+    if args.tool_z:
+        tool = np.eye(4)
+        tool[2, 3] = args.tool_z
+
+    workspace = build_workspace_map(args.output, args.samples, args.voxel_size, tool=tool)
+    print(f"{np.count_nonzero(workspace.grid['reachable'])} of {workspace.grid.size} voxels reachable, written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()